@@ -0,0 +1,13 @@
+"""
+URL configuration for requests served over ASGI (ASGI_URLCONF).
+
+The same URLs as movie_mindread.urls, with the game views routed to their
+async variants; see trivia_game.middleware.
+"""
+from django.contrib import admin
+from django.urls import include, path
+
+urlpatterns = [
+    path('', include('trivia_game.asgi_urls')),
+    path('admin/', admin.site.urls),
+]
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'trivia_game.instrumentation.RequestProfilingMiddleware',  # Inactive unless REQUEST_PROFILING is on
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,10 +49,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'trivia_game.middleware.asgi_urlconf_middleware',
 ]
 
 ROOT_URLCONF = 'movie_mindread.urls'
 
+# Requests served over ASGI use this URLconf, which routes the game views to
+# their async variants; WSGI and runserver keep ROOT_URLCONF. Unset to serve
+# the sync views everywhere.
+ASGI_URLCONF = 'movie_mindread.asgi_urls'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -125,6 +132,63 @@ STATICFILES_DIRS = [
     BASE_DIR / 'trivia_game' / 'static',
 ]
 
+# On-disk cache of IMDb responses used by the fetch_imdb_data command
+
+IMDB_CACHE_DIR = BASE_DIR / '.imdb_cache'
+
+# Guess matching: a guess may be off by GUESS_MATCH_EDIT_RATIO edits per
+# character of the title, but never more than GUESS_MATCH_MAX_EDITS
+
+GUESS_MATCH_MAX_EDITS = 2
+GUESS_MATCH_EDIT_RATIO = 0.2
+
+# Caches. Game state lives in its own file-based cache so it survives a
+# restart and is shared by every worker on the host; point it at Redis or
+# Memcached to share it across hosts. SweepingFileCache, unlike Django's
+# FileBasedCache, does not scan its directory on every write: expired games
+# are swept every SWEEP_INTERVAL seconds, and past MAX_ENTRIES the longest
+# idle ones are dropped.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'game_state': {
+        'BACKEND': 'trivia_game.file_cache.SweepingFileCache',
+        'LOCATION': BASE_DIR / '.game_state_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000, 'SWEEP_INTERVAL': 300},
+    },
+    'catalog': {
+        'BACKEND': 'trivia_game.file_cache.SweepingFileCache',
+        'LOCATION': BASE_DIR / '.catalog_cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'SWEEP_INTERVAL': 300},
+    },
+}
+
+# Game state store: cache alias, games kept in each worker's local LRU, and
+# seconds an idle game is kept
+
+GAME_STATE_CACHE = 'game_state'
+GAME_STATE_LOCAL_SIZE = 1024
+GAME_STATE_TIMEOUT = 24 * 3600
+
+# Cached catalog page fragments: cache alias (must be shared by all worker
+# processes, or a version bump only reaches one of them; `check --deploy`
+# warns about a per-process cache) and seconds a fragment is kept. Saving
+# catalog data bumps a version in the keys, so the timeout only bounds
+# memory use. The file cache is shared by the workers of one host; use Redis
+# or Memcached with several hosts.
+
+CATALOG_CACHE = 'catalog'
+CATALOG_CACHE_TIMEOUT = 3600
+
+# Per-request SQL/latency profiling: adds a Server-Timing header to every
+# response and keeps the last REQUEST_PROFILING_WINDOW requests per endpoint
+# for the staff-only /api/request-stats/ dump. Off by default.
+
+REQUEST_PROFILING = False
+REQUEST_PROFILING_WINDOW = 1000
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
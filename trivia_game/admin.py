@@ -1,7 +1,8 @@
 from django.contrib import admin
+from django.db.models import Count
 from .models import (
     Movie, Actor, Studio, Director,
-    ProductionCompany, EasyTrivia, MediumTrivia, HardTrivia
+    ProductionCompany, Trivia, Genre
 )
 
 # Register your models here.
@@ -21,11 +22,30 @@ class ActorAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    list_display = ('name', 'movie_count')
+    search_fields = ('name',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(movie_count=Count('movies'))
+
+    @admin.display(ordering='movie_count')
+    def movie_count(self, genre):
+        return genre.movie_count
+
+class TriviaInline(admin.TabularInline):
+    model = Trivia
+    fields = ('difficulty', 'trivia_fact')
+    extra = 0
+
 @admin.register(Movie)
 class MovieAdmin(admin.ModelAdmin):
     list_display = ('title', 'release_date', 'genre', 'imdb_rating')
-    list_filter = ('genre', 'release_date')
-    search_fields = ('title', 'genre')
+    list_filter = ('genres', 'release_date')
+    search_fields = ('title', 'genre', 'imdb_id')
+    filter_horizontal = ('genres',)
+    inlines = (TriviaInline,)
 
 @admin.register(ProductionCompany)
 class ProductionCompanyAdmin(admin.ModelAdmin):
@@ -33,23 +53,10 @@ class ProductionCompanyAdmin(admin.ModelAdmin):
     list_filter = ('founding_year',)
     search_fields = ('name', 'movie__title', 'headquarters')
 
-@admin.register(EasyTrivia)
-class EasyTriviaAdmin(admin.ModelAdmin):
-    list_display = ('movie', 'trivia_fact', 'created_at')
-    list_filter = ('movie', 'created_at')
-    search_fields = ('movie__title', 'trivia_fact')
-    readonly_fields = ('created_at', 'updated_at')
-
-@admin.register(MediumTrivia)
-class MediumTriviaAdmin(admin.ModelAdmin):
-    list_display = ('movie', 'trivia_fact', 'created_at')
-    list_filter = ('movie', 'created_at')
-    search_fields = ('movie__title', 'trivia_fact')
-    readonly_fields = ('created_at', 'updated_at')
-
-@admin.register(HardTrivia)
-class HardTriviaAdmin(admin.ModelAdmin):
-    list_display = ('movie', 'trivia_fact', 'created_at')
-    list_filter = ('movie', 'created_at')
+@admin.register(Trivia)
+class TriviaAdmin(admin.ModelAdmin):
+    list_display = ('movie', 'difficulty', 'trivia_fact', 'created_at')
+    list_filter = ('difficulty', 'created_at')
+    list_select_related = ('movie',)
     search_fields = ('movie__title', 'trivia_fact')
     readonly_fields = ('created_at', 'updated_at')
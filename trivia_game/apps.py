@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TriviaGameConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trivia_game'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
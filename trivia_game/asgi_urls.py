@@ -0,0 +1,22 @@
+"""trivia_game.urls with the async variants of the views that have one.
+
+Requests served over ASGI are routed here by asgi_urlconf_middleware; the
+URLs and their names are the same, so reverse() works with either.
+"""
+from django.urls import path
+
+from . import views
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    views.movie_search: views.amovie_search,
+    views.autocomplete_titles: views.aautocomplete_titles,
+    views.start_game: views.astart_game,
+    views.play_game: views.aplay_game,
+    views.make_guess: views.amake_guess,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.callback, pattern.callback), name=pattern.name)
+    for pattern in sync_urlpatterns
+]
@@ -0,0 +1,112 @@
+"""In-memory prefix index behind the guess autocomplete endpoint."""
+import bisect
+import threading
+
+from asgiref.sync import sync_to_async
+
+from .catalog_cache import acatalog_version, catalog_version
+from .matching import normalize_title
+
+MAX_SUGGESTIONS = 20
+
+
+class PrefixIndex:
+    """Sorted array of (normalized title, title, movie id) searched with bisect.
+
+    A lookup is a binary search to the first entry starting with the prefix
+    followed by a walk over at most a handful of neighbours, so it never
+    touches the database. Movies are inserted and removed in place as the
+    catalog changes.
+    """
+    def __init__(self, movies=()):
+        self.lock = threading.Lock()
+        self.entries = sorted((normalize_title(title), title, movie_id) for movie_id, title in movies)
+        self.entry_by_id = {entry[2]: entry for entry in self.entries}
+
+    def add(self, movie_id, title):
+        entry = (normalize_title(title), title, movie_id)
+        with self.lock:
+            if self.entry_by_id.get(movie_id) == entry:
+                return
+            self._remove(movie_id)
+            bisect.insort(self.entries, entry)
+            self.entry_by_id[movie_id] = entry
+
+    def remove(self, movie_id):
+        with self.lock:
+            self._remove(movie_id)
+
+    def _remove(self, movie_id):
+        entry = self.entry_by_id.pop(movie_id, None)
+        if entry is not None:
+            del self.entries[bisect.bisect_left(self.entries, entry)]
+
+    def complete(self, prefix, limit=8):
+        """Up to `limit` distinct titles whose normalized form starts with the normalized prefix."""
+        prefix = normalize_title(prefix)
+        if not prefix:
+            return []
+        suggestions = []
+        with self.lock:
+            position = bisect.bisect_left(self.entries, (prefix,))
+            while position < len(self.entries) and len(suggestions) < limit:
+                normalized, title, _ = self.entries[position]
+                if not normalized.startswith(prefix):
+                    break
+                if title not in suggestions:
+                    suggestions.append(title)
+                position += 1
+        return suggestions
+
+
+_index = None
+_index_version = None  # Catalog version the index was built at
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The process-wide prefix index, rebuilt from the catalog whenever the catalog version moves.
+
+    Saves in this process patch the index at once (movie_changed), but bulk
+    writes send no signals and other workers' saves never reach this
+    process; the catalog version catches both. While one thread rebuilds,
+    the others keep answering from the old index.
+    """
+    global _index, _index_version
+    version = catalog_version()
+    if _index is not None and _index_version == version:
+        return _index
+    if not _index_lock.acquire(blocking=_index is None):
+        return _index
+    try:
+        if _index is None or _index_version != version:
+            from .models import Movie
+            # Read after the version, so a write in between leaves the index behind and it is rebuilt again
+            _index = PrefixIndex(Movie.objects.order_by().values_list('id', 'title').iterator())
+            _index_version = version
+    finally:
+        _index_lock.release()
+    return _index
+
+
+async def aget_index():
+    """get_index() for async views: building the index happens in a worker thread."""
+    if _index is not None and _index_version == await acatalog_version():
+        return _index
+    return await sync_to_async(get_index)()
+
+
+def reset_index():
+    global _index, _index_version
+    _index = _index_version = None
+
+
+def movie_changed(movie):
+    """Patch the index after a movie is saved; a no-op until it has been built."""
+    if _index is not None:
+        _index.add(movie.id, movie.title)
+
+
+def movie_removed(movie_id):
+    if _index is not None:
+        _index.remove(movie_id)
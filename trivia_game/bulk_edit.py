@@ -0,0 +1,176 @@
+"""Applying field patches to many movies at once, for the manage page's bulk editor.
+
+A patch names a movie id and the fields to change:
+
+    {"id": 12, "imdb_rating": "7.9", "genre": "Crime, Drama", "director": "Michael Mann",
+     "studio": null, "hard_trivia": "...", "easy_trivia": ""}
+
+Missing fields are left alone. An empty director or studio unlinks it, and
+an empty trivia field deletes that difficulty's facts. Patches are checked
+one by one and an invalid patch is reported without stopping the others.
+The valid ones are written in one transaction with a fixed number of bulk
+queries, however many movies the batch holds.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import hints
+from .catalog_cache import bump_catalog_version
+from .catalog_import import rating, text
+from .importer import BulkMovieWriter, resolve_names, split_genres
+from .models import Director, Genre, Movie, Studio, Trivia
+
+MAX_PATCHES = 1000
+TRIVIA_FIELDS = {'easy_trivia': Trivia.EASY, 'medium_trivia': Trivia.MEDIUM, 'hard_trivia': Trivia.HARD}
+PATCH_FIELDS = ('imdb_rating', 'genre', 'director', 'studio', *TRIVIA_FIELDS)
+CREDITS = {'director': Director, 'studio': Studio}
+
+
+def validate_patch(patch):
+    """(movie id, {field: cleaned value}) for a patch, or ValueError"""
+    if not isinstance(patch, dict):
+        raise ValueError('expected an object')
+    try:
+        movie_id = int(patch.get('id'))
+    except (TypeError, ValueError):
+        raise ValueError('id must be a movie id')
+    unknown = set(patch) - {'id', *PATCH_FIELDS}
+    if unknown:
+        raise ValueError(f'cannot edit {", ".join(sorted(unknown))}')
+    changes = {}
+    if 'imdb_rating' in patch:
+        changes['imdb_rating'] = rating(patch)
+    if 'genre' in patch:
+        changes['genre'] = text(patch, 'genre', 100, required=True)
+    for field in CREDITS:
+        if field in patch:
+            changes[field] = text(patch, field, 200) or None
+    for field in TRIVIA_FIELDS:
+        if field in patch:
+            changes[field] = text(patch, field, 10000)
+    if not changes:
+        raise ValueError('nothing to change')
+    return movie_id, changes
+
+
+def write_trivia(facts):
+    """Apply {movie_id: {difficulty: fact}}: one fact per difficulty, an empty fact deletes that difficulty's facts.
+
+    A difficulty that already has facts gets its first (oldest) one
+    rewritten. Everything is read in one query and written as at most one
+    delete, one insert and one update. Returns the ids of the movies whose
+    trivia changed.
+    """
+    current = {}
+    for trivia in Trivia.objects.filter(movie_id__in=facts):
+        current.setdefault((trivia.movie_id, trivia.difficulty), []).append(trivia)
+    now = timezone.now()
+    new, changed, deleted = [], [], []
+    touched = set()
+    for movie_id, by_difficulty in facts.items():
+        for difficulty, trivia_fact in by_difficulty.items():
+            existing = current.get((movie_id, difficulty), [])
+            if not trivia_fact and existing:
+                deleted.extend(trivia.pk for trivia in existing)
+            elif trivia_fact and not existing:
+                new.append(Trivia(movie_id=movie_id, difficulty=difficulty, trivia_fact=trivia_fact))
+            elif trivia_fact and existing[0].trivia_fact != trivia_fact:
+                existing[0].trivia_fact = trivia_fact
+                existing[0].updated_at = now  # bulk_update() skips auto_now
+                changed.append(existing[0])
+            else:
+                continue
+            touched.add(movie_id)
+    if deleted:
+        Trivia.objects.filter(pk__in=deleted).delete()
+    if new:
+        Trivia.objects.bulk_create(new)
+    if changed:
+        Trivia.objects.bulk_update(changed, ['trivia_fact', 'updated_at'])
+    # Bulk writes send no signals
+    for movie_id in touched:
+        hints.movie_changed(movie_id)
+    return touched
+
+
+def apply_patches(patches):
+    """Validate and write a batch of patches. Returns one result per patch, in order:
+
+    {"id": 12, "ok": true, "changed": ["genre", "imdb_rating"]} or {"id": 12, "ok": false, "error": "..."}
+    """
+    results, valid = [], {}
+    for patch in patches:
+        try:
+            movie_id, changes = validate_patch(patch)
+        except ValueError as e:
+            results.append({'id': patch.get('id') if isinstance(patch, dict) else None, 'ok': False, 'error': str(e)})
+            continue
+        if movie_id in valid:
+            results.append({'id': movie_id, 'ok': False, 'error': 'the batch already patches this movie'})
+            continue
+        valid[movie_id] = changes
+        results.append({'id': movie_id, 'ok': True, 'changed': []})
+    if not valid:
+        return results
+
+    with transaction.atomic():
+        # Locked until the batch commits, so concurrent edits cannot interleave with it
+        movies = Movie.objects.select_for_update().in_bulk(list(valid))
+
+        ids = {model: {} for model in CREDITS.values()}
+        for field, model in CREDITS.items():
+            names = {changes[field] for changes in valid.values() if changes.get(field)}
+            resolve_names(model, list(names), ids[model], BulkMovieWriter.entity_defaults[model])
+
+        changed = {}  # movie id -> fields that changed
+        fields = set()
+        for movie_id, changes in valid.items():
+            movie = movies.get(movie_id)
+            if movie is None:
+                continue
+            for field, value in changes.items():
+                if field in CREDITS:
+                    attname, value = f'{field}_id', ids[CREDITS[field]][value] if value else None
+                elif field in TRIVIA_FIELDS:
+                    continue
+                else:
+                    attname = field
+                if getattr(movie, attname) != value:
+                    setattr(movie, attname, value)
+                    changed.setdefault(movie_id, []).append(field)
+                    fields.add(field)
+
+        trivia = {
+            movie_id: {difficulty: changes[field] for field, difficulty in TRIVIA_FIELDS.items() if field in changes}
+            for movie_id, changes in valid.items()
+            if movie_id in movies and any(field in changes for field in TRIVIA_FIELDS)
+        }
+        for movie_id in write_trivia(trivia) if trivia else ():
+            changed.setdefault(movie_id, []).append('trivia')
+
+        now = timezone.now()
+        for movie_id in changed:
+            movies[movie_id].updated_at = now  # bulk_update() skips auto_now
+        Movie.objects.bulk_update([movies[movie_id] for movie_id in changed], [*fields, 'updated_at'])
+
+        relinked = [movies[movie_id] for movie_id, names in changed.items() if 'genre' in names]
+        if relinked:
+            genre_ids = {}
+            resolve_names(Genre, list({name for movie in relinked for name in split_genres(movie.genre)}), genre_ids)
+            GenreLink = Movie.genres.through
+            GenreLink.objects.filter(movie_id__in=[movie.pk for movie in relinked]).delete()
+            GenreLink.objects.bulk_create([
+                GenreLink(movie_id=movie.pk, genre_id=genre_ids[name])
+                for movie in relinked for name in split_genres(movie.genre)
+            ])
+        if changed:
+            bump_catalog_version()
+
+    for result in results:
+        if not result['ok']:
+            continue
+        if result['id'] not in movies:
+            result.update(ok=False, error='no such movie')
+        else:
+            result['changed'] = sorted(changed.get(result['id'], []))
+    return results
@@ -0,0 +1,169 @@
+"""Catalog queries that have to stay fast as the movie table grows."""
+import base64
+import json
+import random
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from .models import Genre, Movie
+
+# Each sort is a list of (field, descending) pairs ending in the primary key,
+# so every row has a unique position and can serve as a keyset cursor.
+SORT_ORDERS = {
+    'title': [('title', False), ('id', False)],
+    'highest': [('imdb_rating', True), ('title', False), ('id', False)],
+    'lowest': [('imdb_rating', False), ('title', False), ('id', False)],
+}
+SEARCH_FIELDS = ('id', 'title', 'release_date', 'genre', 'imdb_rating')
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+# Filtered random picks choose uniformly among the matches when there are at most this many
+FEW_MATCHES = 500
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, order):
+    """Turn a cursor back into the sort key values of the last row seen."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(order):
+            raise ValueError
+        return [
+            Decimal(value) if field == 'imdb_rating' else int(value) if field == 'id' else str(value)
+            for (field, _), value in zip(order, values)
+        ]
+    except (ValueError, TypeError, InvalidOperation):
+        raise ValueError('Invalid cursor')
+
+
+def after(order, values):
+    """Q matching rows that sort strictly after `values` in `order`.
+
+    (a, b, id) > (x, y, z) expands to a > x OR (a = x AND (b > y OR (b = y AND id > z))),
+    which the (a, b, id) index can answer with a range scan.
+    """
+    (field, descending), value = order[0], values[0]
+    q = Q(**{f'{field}__{"lt" if descending else "gt"}': value})
+    if len(order) > 1:
+        q |= Q(**{field: value}) & after(order[1:], values[1:])
+    return q
+
+
+def genre_counts():
+    """(name, movie count) for every genre with movies, counted from the genre side of the link table."""
+    return list(
+        Genre.objects.annotate(movie_count=Count('movies')).filter(movie_count__gt=0)
+        .order_by('name').values_list('name', 'movie_count')
+    )
+
+
+def search_page(query, match, sort, genre, limit, cursor):
+    """The query set behind one page of search_movies(), and the function that turns its rows into the result.
+
+    The query set reads one row past the page, to tell whether there is a
+    next one. Split so the rows can be fetched through the sync or the
+    async ORM.
+    """
+    order = SORT_ORDERS.get(sort, SORT_ORDERS['title'])
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    movies = Movie.objects.all()
+    if query:
+        lookup = 'title__istartswith' if match == 'prefix' else 'title__icontains'
+        movies = movies.filter(**{lookup: query})
+    if genre:
+        movies = movies.filter(genres__name=genre)
+    if cursor:
+        movies = movies.filter(after(order, decode_cursor(cursor, order)))
+    movies = movies.order_by(*[f'-{field}' if descending else field for field, descending in order])
+
+    def paginate(rows):
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor([str(last[field]) if field == 'imdb_rating' else last[field] for field, _ in order])
+        return rows, next_cursor
+
+    return movies.values(*SEARCH_FIELDS)[:limit + 1], paginate
+
+
+def search_movies(query='', match='contains', sort='title', genre='', limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """Return one page of movies as dicts plus the cursor for the next page (None on the last page).
+
+    match='prefix' is answered from the title index; match='contains' has to
+    scan titles but still only reads one page of rows. `genre` filters
+    through the genres link table, never the display string.
+    """
+    rows, paginate = search_page(query, match, sort, genre, limit, cursor)
+    return paginate(list(rows))
+
+
+async def asearch_movies(query='', match='contains', sort='title', genre='', limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """search_movies() for async views, through the async ORM"""
+    rows, paginate = search_page(query, match, sort, genre, limit, cursor)
+    return paginate([row async for row in rows])
+
+
+def random_movie_id(genre='', decade=None, min_rating=None, exclude=()):
+    """Id of a random movie matching the filters, avoiding `exclude` unless nothing else matches.
+
+    When at most FEW_MATCHES movies match the filters, their ids are read in
+    one query (through whichever index suits the filters) and one of them is
+    chosen uniformly. Otherwise the pick is a random point in the id range
+    and the first matching movie at or after it, wrapping around to the
+    start, which is a couple of primary-key range lookups instead of a scan.
+    That walk is biased: a movie is picked in proportion to the gap before
+    it back to the previous match, so with filters, matches that follow a
+    long run of non-matching ids come up far more often than the others. It
+    also reads about one row per match density (a filter matching one movie
+    in k reads about k rows), which is why sparse filters take the first
+    path instead of scanning much of the table.
+    """
+    if genre or decade is not None or min_rating is not None:
+        matching = Movie.objects.order_by()
+        if genre:
+            matching = matching.filter(genres__name=genre)
+        if decade is not None:
+            matching = matching.filter(release_date__gte=decade, release_date__lt=decade + 10)
+        if min_rating is not None:
+            matching = matching.filter(imdb_rating__gte=min_rating)
+        few = list(matching.values_list('id', flat=True)[:FEW_MATCHES + 1])
+        if len(few) <= FEW_MATCHES:
+            if not few:
+                return None
+            fresh = set(few).difference(exclude)
+            return random.choice(sorted(fresh or few))
+
+    # Two index-end lookups; a combined MIN/MAX aggregate is a full scan on some backends
+    ids = Movie.objects.order_by().values_list('id', flat=True)
+    low, high = ids.order_by('id').first(), ids.order_by('-id').first()
+    if low is None:
+        return None
+
+    # The filters are written so they are checked row by row while walking the
+    # primary key from the pivot. Left to itself the planner would rather range
+    # scan the release_date or genre indexes and sort every match by id.
+    movies = Movie.objects.order_by('id')
+    if genre:
+        movies = movies.filter(Exists(
+            Movie.genres.through.objects.filter(movie_id=OuterRef('id'), genre__name=genre)
+        ))
+    if decade is not None:
+        movies = movies.alias(year=F('release_date') + 0).filter(year__gte=decade, year__lt=decade + 10)
+    if min_rating is not None:
+        movies = movies.alias(rating=F('imdb_rating') + 0).filter(rating__gte=min_rating)
+
+    pivot = random.randint(low, high)
+    for candidates in (movies.exclude(id__in=exclude), movies) if exclude else (movies,):
+        candidates = candidates.values_list('id', flat=True)
+        movie_id = candidates.filter(id__gte=pivot).first()
+        if movie_id is None:
+            movie_id = candidates.filter(id__lt=pivot).first()
+        if movie_id is not None:
+            return movie_id
+    return None
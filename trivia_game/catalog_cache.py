@@ -0,0 +1,123 @@
+"""Catalog-versioned caching of rendered template fragments.
+
+Every save or delete of catalog data bumps one version number (signals.py,
+and BulkMovieWriter for its bulk writes). Fragments are cached under keys
+that include the version, so a bump makes every older fragment unreachable
+at once: nothing stale is served and nothing has to be found and deleted.
+Entries of old versions simply age out of the cache. The version and the
+time of the last bump also serve as the ETag and Last-Modified of catalog
+pages (see views.catalog_etag).
+
+With several worker processes, CATALOG_CACHE must name a cache they all
+share (Redis, Memcached, file; a file cache is the default). A per-process
+locmem cache would keep a bump from reaching the other workers, and
+`check --deploy` warns about one.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_KEY = 'catalog:version'
+MODIFIED_KEY = 'catalog:modified'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE', 'default')]
+
+
+def initial_version():
+    # Past any version handed out before the key was evicted or the cache restarted
+    return time.time_ns() // 1000
+
+
+def catalog_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, initial_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def acatalog_version():
+    """catalog_version() for async views"""
+    version = await get_cache().aget(VERSION_KEY)
+    return version if version is not None else await sync_to_async(catalog_version)()
+
+
+def catalog_modified():
+    """When the catalog last changed (or when this cache first saw it, if it forgot)"""
+    cache = get_cache()
+    timestamp = cache.get(MODIFIED_KEY)
+    if timestamp is None:
+        cache.add(MODIFIED_KEY, time.time(), None)
+        timestamp = cache.get(MODIFIED_KEY)
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def _bump():
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, initial_version(), None)
+    cache.set(MODIFIED_KEY, time.time(), None)
+
+
+def bump_catalog_version():
+    """Invalidate every cached fragment, now and again once the current transaction commits.
+
+    The second bump covers a request that read the old rows between the
+    first bump and the commit, and cached them under the new version.
+    """
+    _bump()
+    transaction.on_commit(_bump)
+
+
+class FragmentStats:
+    """Hits and misses of each cached fragment since startup (or the last reset)."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}  # fragment name -> [hits, misses]
+
+    def record(self, name, hit):
+        with self.lock:
+            self.counts.setdefault(name, [0, 0])[0 if hit else 1] += 1
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+
+    def summary(self):
+        with self.lock:
+            counts = {name: tuple(pair) for name, pair in self.counts.items()}
+        return {
+            name: {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / (hits + misses), 3)}
+            for name, (hits, misses) in sorted(counts.items())
+        }
+
+
+stats = FragmentStats()
+
+
+def fragment_key(name, vary_on, version):
+    digest = hashlib.md5(':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    return f'catalog:{version}:{name}:{digest}'
+
+
+def cached_fragment(name, vary_on, render):
+    """The fragment's HTML from the cache, or render()'s, stored under the current catalog version"""
+    cache = get_cache()
+    key = fragment_key(name, vary_on, catalog_version())
+    html = cache.get(key)
+    stats.record(name, html is not None)
+    if html is None:
+        html = render()
+        cache.set(key, html, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 3600))
+    return html
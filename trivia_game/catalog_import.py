@@ -0,0 +1,410 @@
+"""Bulk import of curated movies, trivia and production companies from JSON Lines or CSV.
+
+Input rows are validated by pure functions (no database access), so the
+import command can spread validation over a process pool. Valid rows are
+written by the BatchWriter subclasses below, a chunk per transaction, and a
+row that fails validation or writing is reported with its line number
+instead of aborting the import.
+
+The movie format is the one export_catalog writes, so an export can be
+edited and imported back. Movies are keyed by imdb_id, trivia and
+production companies by the imdb_id of their movie.
+"""
+import csv
+import gzip
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import hints
+from .catalog_cache import bump_catalog_version
+from .export import TRIVIA_COLUMNS
+from .importer import BatchWriter, BulkMovieWriter, normalize_imdb_id, split_genres
+from .models import Movie, ProductionCompany, Trivia
+
+KINDS = ('movies', 'trivia', 'companies')
+DIFFICULTIES = {
+    'e': Trivia.EASY, 'easy': Trivia.EASY,
+    'm': Trivia.MEDIUM, 'medium': Trivia.MEDIUM,
+    'h': Trivia.HARD, 'hard': Trivia.HARD,
+}
+
+
+# Reading
+
+def open_text(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def detect_format(path):
+    name = str(path).removesuffix('.gz').lower()
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+
+def read_rows(path, format):
+    """(line number, raw row) pairs: unparsed text for JSON Lines, a dict per CSV record.
+
+    JSON is left unparsed so the decoding happens in the validation workers.
+    """
+    with open_text(path) as f:
+        if format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                # A record ends on the line the reader has reached (cells may hold newlines)
+                yield reader.line_num, row
+        else:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield number, line
+
+
+# Validation (runs in worker processes)
+
+def text(record, key, max_length, required=False):
+    value = record.get(key)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f'{key} is required')
+    if len(value) > max_length:
+        raise ValueError(f'{key} is longer than {max_length} characters')
+    return value
+
+
+def integer(record, key, low, high, required=False):
+    value = record.get(key)
+    if value in (None, ''):
+        if required:
+            raise ValueError(f'{key} is required')
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} must be a whole number, not {value!r}')
+    if not low <= value <= high:
+        raise ValueError(f'{key} must be between {low} and {high}')
+    return value
+
+
+def text_list(value, max_length, key):
+    """A JSON list, or newline-separated CSV cell, of non-empty strings"""
+    if value in (None, ''):
+        return []
+    items = value.split('\n') if isinstance(value, str) else value
+    if not isinstance(items, list):
+        raise ValueError(f'{key} must be a list')
+    items = [str(item).strip() for item in items]
+    for item in items:
+        if len(item) > max_length:
+            raise ValueError(f'{key} entry is longer than {max_length} characters')
+    return list(dict.fromkeys(item for item in items if item))
+
+
+def imdb_id(record):
+    value = text(record, 'imdb_id', 12, required=True)
+    value = normalize_imdb_id(value)
+    if not value[2:].isdigit():
+        raise ValueError(f'imdb_id {record["imdb_id"]!r} is not an IMDb title id')
+    return value
+
+
+def difficulty(value):
+    try:
+        return DIFFICULTIES[str(value).strip().lower()]
+    except KeyError:
+        raise ValueError(f'difficulty must be easy, medium or hard, not {value!r}')
+
+
+def trivia_fact(record, key='trivia_fact'):
+    return text(record, key, 10000, required=True)
+
+
+def company(record):
+    return {
+        'name': text(record, 'name', 200, required=True),
+        'founding_year': integer(record, 'founding_year', 1800, 2100),
+        'headquarters': text(record, 'headquarters', 200),
+    }
+
+
+def rating(record):
+    raw = record.get('imdb_rating')
+    try:
+        value = Decimal(str(raw)).quantize(Decimal('0.1'))
+    except (InvalidOperation, ValueError):
+        value = None
+    # NaN survives quantize(), and comparing it raises InvalidOperation
+    if value is None or not value.is_finite():
+        raise ValueError(f'imdb_rating must be a number, not {raw!r}')
+    if not 0 <= value <= 10:
+        raise ValueError('imdb_rating must be between 0 and 10')
+    return value
+
+
+def validate_movie(record, from_csv):
+    genres = text_list(record.get('genres'), 50, 'genres')
+    genre = text(record, 'genre', 100) or ', '.join(genres)[:100]
+    # A row without the genre(s) or actors keys (or columns) leaves the movie's as they are (None)
+    has_genres = 'genre' in record or 'genres' in record
+    parsed = {
+        'imdb_id': imdb_id(record),
+        'title': text(record, 'title', 200, required=True),
+        'release_date': integer(record, 'release_date', 1888, 2030, required=True),
+        'genre': genre if has_genres else None,
+        'genres': (genres or split_genres(genre)) if has_genres else None,
+        'imdb_rating': rating(record),
+        'studio': text(record, 'studio', 200) or None,
+        'director': text(record, 'director', 200) or None,
+        'actors': text_list(record['actors'], 200, 'actors') if 'actors' in record else None,
+    }
+
+    # Trivia and production companies are only replaced when the row has them
+    if from_csv:
+        if any(column in record for column in TRIVIA_COLUMNS.values()):
+            parsed['trivia'] = [
+                (code, fact)
+                for code, column in TRIVIA_COLUMNS.items()
+                for fact in text_list(record.get(column), 10000, column)
+            ]
+        if 'production_companies' in record:
+            parsed['production_companies'] = [
+                {'name': name, 'founding_year': None, 'headquarters': ''}
+                for name in text_list(record['production_companies'], 200, 'production_companies')
+            ]
+    else:
+        if 'trivia' in record:
+            if not isinstance(record['trivia'], list):
+                raise ValueError('trivia must be a list')
+            parsed['trivia'] = [(difficulty(item.get('difficulty')), trivia_fact(item)) for item in record['trivia']]
+        if 'production_companies' in record:
+            if not isinstance(record['production_companies'], list):
+                raise ValueError('production_companies must be a list')
+            parsed['production_companies'] = [
+                company({'name': item} if isinstance(item, str) else item) for item in record['production_companies']
+            ]
+    return parsed
+
+
+def validate_trivia(record, from_csv):
+    return {
+        'imdb_id': imdb_id(record),
+        'difficulty': difficulty(record.get('difficulty')),
+        'trivia_fact': trivia_fact(record),
+    }
+
+
+def validate_company(record, from_csv):
+    return {'imdb_id': imdb_id(record), **company(record)}
+
+
+VALIDATORS = {'movies': validate_movie, 'trivia': validate_trivia, 'companies': validate_company}
+
+
+def validate(kind, line, raw):
+    """(line, row, None) for a valid input row, (line, None, message) for an invalid one"""
+    try:
+        from_csv = isinstance(raw, dict)
+        record = raw if from_csv else json.loads(raw)
+        if not isinstance(record, dict):
+            raise ValueError('expected a JSON object')
+        row = VALIDATORS[kind](record, from_csv)
+    except (ValueError, TypeError, AttributeError) as e:  # json.JSONDecodeError is a ValueError
+        return line, None, str(e)
+    row['line'] = line
+    return line, row, None
+
+
+# Writing
+
+# Key in a parsed movie -> (model, field a row is matched on, fields rewritten in place, item -> field values)
+DETAILS = {
+    'trivia': (Trivia, 'difficulty', ['trivia_fact'], lambda item: {'difficulty': item[0], 'trivia_fact': item[1]}),
+    'production_companies': (ProductionCompany, 'name', ['founding_year', 'headquarters'], dict),
+}
+
+
+def write_movie_rows(model, slot, fields, wanted):
+    """Make the rows of each movie in {movie_id: [field values]} match its list. Returns the ids of the movies that changed.
+
+    Games in progress refer to trivia by id, so rows are diffed rather than
+    replaced: a row that is already there is left alone, a changed one
+    rewrites a leftover row with the same slot value (difficulty, company
+    name), and only what remains is inserted or deleted. Everything is read
+    in one query and written as at most one delete, one insert and one
+    update.
+    """
+    current = {}
+    for row in model.objects.filter(movie_id__in=wanted).order_by('pk'):
+        current.setdefault((row.movie_id, getattr(row, slot)), []).append(row)
+    stamped = [field.name for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+    now = timezone.now()
+    new, changed = [], []
+    touched = set()
+    for movie_id, items in wanted.items():
+        unmatched = []
+        for values in items:
+            rows = current.get((movie_id, values[slot]), [])
+            same = next((row for row in rows if all(getattr(row, name) == values[name] for name in fields)), None)
+            if same:
+                rows.remove(same)
+            else:
+                unmatched.append(values)
+        for values in unmatched:
+            rows = current.get((movie_id, values[slot]))
+            if rows:
+                row = rows.pop(0)
+                for name in fields:
+                    setattr(row, name, values[name])
+                for name in stamped:
+                    setattr(row, name, now)  # bulk_update() skips auto_now
+                changed.append(row)
+            else:
+                new.append(model(movie_id=movie_id, **values))
+            touched.add(movie_id)
+    deleted = [row.pk for rows in current.values() for row in rows]
+    touched.update(movie_id for (movie_id, _), rows in current.items() if rows)
+    if deleted:
+        model.objects.filter(pk__in=deleted).delete()
+    if new:
+        model.objects.bulk_create(new)
+    if changed:
+        model.objects.bulk_update(changed, fields + stamped)
+    return touched
+
+
+class ImportErrors:
+    """Mixin reporting failed rows by input line instead of by title"""
+    def record_error(self, row, error):
+        self.errors.append((row['line'], str(error)))
+
+
+class CatalogMovieWriter(ImportErrors, BulkMovieWriter):
+    """BulkMovieWriter for curated files: also writes trivia and production companies.
+
+    With upsert=False a movie whose imdb_id is already in the catalog is
+    reported as an error instead of being updated. fetched_at is left alone,
+    since the data does not come from IMDb.
+    """
+    update_fields = ['title', 'release_date', 'genre', 'imdb_rating', 'studio', 'director', 'updated_at']
+
+    def __init__(self, chunk_size=500, upsert=False):
+        super().__init__(chunk_size)
+        self.upsert = upsert
+
+    def write_chunk(self, chunk):
+        chunk = list({parsed['imdb_id']: parsed for parsed in chunk}.values())
+        rejected = []
+        with transaction.atomic():
+            if not self.upsert:
+                existing = set(
+                    Movie.objects.filter(imdb_id__in=[parsed['imdb_id'] for parsed in chunk])
+                    .values_list('imdb_id', flat=True)
+                )
+                rejected = [parsed for parsed in chunk if parsed['imdb_id'] in existing]
+                chunk = [parsed for parsed in chunk if parsed['imdb_id'] not in existing]
+            movies = super().write_chunk(chunk) if chunk else []
+            self.write_details(chunk, movies)
+        # Only once the chunk is committed, so a retried chunk does not report its rows twice
+        for parsed in rejected:
+            self.record_error(parsed, f'{parsed["imdb_id"]} is already in the catalog (use --upsert to update it)')
+        return movies
+
+    def write_details(self, chunk, movies):
+        """Bring the trivia and production companies of the movies whose rows carry them in line with the rows"""
+        touched = set()
+        for key, (model, slot, fields, values) in DETAILS.items():
+            wanted = {movie.pk: [values(item) for item in parsed[key]] for movie, parsed in zip(movies, chunk) if key in parsed}
+            if wanted:
+                touched |= write_movie_rows(model, slot, fields, wanted)
+        # Bulk writes send no signals
+        for movie_id in touched:
+            hints.movie_changed(movie_id)
+
+
+class MovieRowWriter(ImportErrors, BatchWriter):
+    """Base for rows that attach to an existing movie through its imdb_id."""
+    def __init__(self, chunk_size=500, upsert=False):
+        super().__init__(chunk_size)
+        self.upsert = upsert
+        self.written = self.updated = self.unchanged = 0
+
+    def write_chunk(self, chunk):
+        movie_ids = dict(
+            Movie.objects.filter(imdb_id__in={row['imdb_id'] for row in chunk}).values_list('imdb_id', 'pk')
+        )
+        rows = []
+        rejected = [row for row in chunk if row['imdb_id'] not in movie_ids]
+        for row in chunk:
+            if row['imdb_id'] in movie_ids:
+                row['movie_id'] = movie_ids[row['imdb_id']]
+                rows.append(row)
+        counts = (0, 0, 0)
+        if rows:
+            with transaction.atomic():
+                counts = self.write_rows(rows)
+                # Bulk writes send no signals: refresh the info pages' validators and fragments
+                Movie.objects.filter(pk__in={row['movie_id'] for row in rows}).update(updated_at=timezone.now())
+                bump_catalog_version()
+        for row in rejected:
+            self.record_error(row, f'no movie with imdb_id {row["imdb_id"]}')
+        self.written += counts[0]
+        self.updated += counts[1]
+        self.unchanged += counts[2]
+        return rows
+
+    def write_rows(self, rows):
+        """Write rows that have a movie_id; returns (inserted, updated, unchanged)"""
+        raise NotImplementedError
+
+
+class TriviaRowWriter(MovieRowWriter):
+    """Adds trivia facts, skipping facts the movie already has. Insert and upsert behave the same."""
+    def write_rows(self, rows):
+        existing = set(
+            Trivia.objects.filter(movie_id__in={row['movie_id'] for row in rows})
+            .values_list('movie_id', 'difficulty', 'trivia_fact')
+        )
+        new = {}
+        for row in rows:
+            key = (row['movie_id'], row['difficulty'], row['trivia_fact'])
+            if key not in existing:
+                new.setdefault(key, row)
+        Trivia.objects.bulk_create([Trivia(movie_id=key[0], difficulty=key[1], trivia_fact=key[2]) for key in new])
+        return len(new), 0, len(rows) - len(new)
+
+
+class CompanyRowWriter(MovieRowWriter):
+    """Adds production companies; with upsert=True, updates a movie's company of the same name."""
+    def write_rows(self, rows):
+        existing = {
+            (movie_id, name): pk
+            for pk, movie_id, name in ProductionCompany.objects.filter(movie_id__in={row['movie_id'] for row in rows})
+            .values_list('pk', 'movie_id', 'name')
+        }
+        latest = {(row['movie_id'], row['name']): row for row in rows}
+        new, updated = [], []
+        for key, row in latest.items():
+            company = ProductionCompany(
+                pk=existing.get(key), movie_id=row['movie_id'], name=row['name'],
+                founding_year=row['founding_year'], headquarters=row['headquarters'],
+            )
+            if company.pk is None:
+                new.append(company)
+            elif self.upsert:
+                updated.append(company)
+            else:
+                raise ValueError(f'{row["name"]} is already a production company of {row["imdb_id"]} (use --upsert to update it)')
+        ProductionCompany.objects.bulk_create(new)
+        ProductionCompany.objects.bulk_update(updated, ['founding_year', 'headquarters'])
+        return len(new), len(updated), len(rows) - len(latest)
+
+
+WRITERS = {'movies': CatalogMovieWriter, 'trivia': TriviaRowWriter, 'companies': CompanyRowWriter}
+
+
+def validate_batch(kind, rows):
+    """validate() over a list of (line, raw row) pairs: the unit of work sent to a worker process"""
+    return [validate(kind, line, raw) for line, raw in rows]
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PER_PROCESS_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_catalog_cache(app_configs, **kwargs):
+    """The catalog version must be shared, or a save only invalidates the pages of the worker that made it"""
+    alias = getattr(settings, 'CATALOG_CACHE', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend in PER_PROCESS_BACKENDS:
+        return [Warning(
+            f'CATALOG_CACHE names the per-process cache "{alias}" ({backend.rsplit(".", 1)[-1]}).',
+            hint='With several workers, the others keep serving stale pages (and 304s) after a catalog change. '
+                 'Point CATALOG_CACHE at a file, Redis or Memcached cache.',
+            id='trivia_game.W001',
+        )]
+    return []
@@ -0,0 +1,57 @@
+"""File cache backend for the game state store."""
+import os
+import threading
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+_next_sweep = {}  # cache directory -> time.monotonic() of its next sweep in this process
+_sweep_lock = threading.Lock()
+
+
+class SweepingFileCache(FileBasedCache):
+    """FileBasedCache for many small entries that are written often.
+
+    Django's FileBasedCache lists its whole directory on every write to
+    count the entries, which makes a write cost O(entries), and once
+    MAX_ENTRIES is reached it deletes a random third of them, live games
+    included. Expired files are only ever removed when read again.
+
+    Here the directory is swept at most once every SWEEP_INTERVAL seconds
+    (an OPTIONS key, default 300) per process: expired files are deleted,
+    and if more than MAX_ENTRIES remain, the least recently written are
+    deleted until 90% of MAX_ENTRIES are left, so it is the longest idle
+    games that go. Between sweeps a write touches only its own file.
+    """
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._sweep_interval = float(params.get('OPTIONS', {}).get('SWEEP_INTERVAL', 300))
+
+    def _cull(self):
+        with _sweep_lock:
+            now = time.monotonic()
+            if now < _next_sweep.get(self._dir, 0):
+                return
+            _next_sweep[self._dir] = now + self._sweep_interval
+        self.sweep()
+
+    def sweep(self):
+        """Delete expired entries, then the oldest ones beyond MAX_ENTRIES. Returns how many were deleted."""
+        deleted = 0
+        live = []  # (mtime, path) of unexpired entries
+        for fname in self._list_cache_files():
+            try:
+                with open(fname, 'rb') as f:
+                    if self._is_expired(f):
+                        deleted += 1
+                        continue
+                live.append((os.path.getmtime(fname), fname))
+            except FileNotFoundError:
+                pass  # Deleted by another process meanwhile
+        excess = len(live) - int(self._max_entries * 0.9)
+        if len(live) > self._max_entries and excess > 0:
+            live.sort()
+            for _, fname in live[:excess]:
+                self._delete(fname)
+            deleted += excess
+        return deleted
@@ -0,0 +1,174 @@
+"""Game state kept in Django's cache framework instead of the session table.
+
+The session only holds a game id, written once when the game starts.
+Guesses read and write the state through GameStateStore, so a guess costs
+no django_session write.
+"""
+import copy
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class GameStateStore:
+    """Cache-backed game states with a process-local LRU in front.
+
+    Each game is stored as two cache keys: the state with its version
+    number, and the version number alone. A read fetches only the small
+    version key and serves the state from the local LRU when this process
+    already holds that version, so a worker that keeps seeing the same
+    player (the common case) never transfers or unpickles the whole state
+    again. A write stores both keys with one set_many round trip and is
+    skipped when the state has not changed since it was loaded.
+
+    The local LRU is only ever a copy. Point GAME_STATE_CACHE at a cache
+    that outlives the worker (file, Redis, Memcached) and games survive
+    restarts and move freely between workers.
+    """
+    def __init__(self, cache_alias='default', local_size=1024, timeout=None):
+        self.cache_alias = cache_alias
+        self.local_size = local_size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.local = OrderedDict()  # game id -> (version, state)
+        self.local_hits = self.cache_reads = self.writes = self.skipped_writes = 0
+
+    @property
+    def cache(self):
+        # Looked up per call: Django cache handles are per thread
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def keys(game_id):
+        return f'game:{game_id}', f'game:{game_id}:version'
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    def get(self, game_id):
+        """A private copy of the game's state, or None if it does not exist (or expired)."""
+        state_key, version_key = self.keys(game_id)
+        found, state = self.local_state(game_id, self.cache.get(version_key))
+        if found:
+            return state
+        return self.loaded(game_id, self.cache.get(state_key))
+
+    async def aget(self, game_id):
+        """get() for async views, through the cache's async API."""
+        state_key, version_key = self.keys(game_id)
+        found, state = self.local_state(game_id, await self.cache.aget(version_key))
+        if found:
+            return state
+        return self.loaded(game_id, await self.cache.aget(state_key))
+
+    def set(self, game_id, state):
+        entries = self.entries(game_id, state)
+        if entries:
+            self.cache.set_many(entries, self.timeout)
+
+    async def aset(self, game_id, state):
+        entries = self.entries(game_id, state)
+        if entries:
+            await self.cache.aset_many(entries, self.timeout)
+
+    def delete(self, game_id):
+        self.cache.delete_many(self.keys(game_id))
+        self.forget(game_id)
+
+    async def adelete(self, game_id):
+        await self.cache.adelete_many(self.keys(game_id))
+        self.forget(game_id)
+
+    def local_state(self, game_id, version):
+        """(True, state) if the cached version settles the read without fetching the state, else (False, None).
+
+        No version means the game is gone; a version the local LRU holds is
+        served from there.
+        """
+        if version is None:
+            self.forget(game_id)
+            return True, None
+        with self.lock:
+            entry = self.local.get(game_id)
+            if entry and entry[0] == version:
+                self.local.move_to_end(game_id)
+                self.local_hits += 1
+                return True, copy.deepcopy(entry[1])
+        return False, None
+
+    def loaded(self, game_id, stored):
+        """A copy of the state fetched from the cache, remembered locally"""
+        with self.lock:
+            self.cache_reads += 1
+        if stored is None:
+            return None
+        version, state = stored
+        self.remember(game_id, version, state)
+        return copy.deepcopy(state)
+
+    def entries(self, game_id, state):
+        """The cache entries storing a new state, or None when it equals the one already stored."""
+        with self.lock:
+            entry = self.local.get(game_id)
+            if entry and entry[1] == state:
+                self.skipped_writes += 1
+                return None
+            self.writes += 1
+        # Versions only need to differ from the previous one for the same game
+        version = uuid.uuid4().hex[:12]
+        state = copy.deepcopy(state)
+        # Remembered before the write: if the write fails, the cache's older
+        # version no longer matches and the next read goes to the cache
+        self.remember(game_id, version, state)
+        state_key, version_key = self.keys(game_id)
+        return {state_key: (version, state), version_key: version}
+
+    def remember(self, game_id, version, state):
+        with self.lock:
+            self.local[game_id] = (version, state)
+            self.local.move_to_end(game_id)
+            while len(self.local) > self.local_size:
+                self.local.popitem(last=False)
+
+    def forget(self, game_id):
+        with self.lock:
+            self.local.pop(game_id, None)
+
+    def clear_local(self):
+        with self.lock:
+            self.local.clear()
+
+    def stats(self):
+        reads = self.local_hits + self.cache_reads
+        ratio = self.local_hits / reads if reads else 0
+        return (
+            f'{reads} reads ({ratio:.0%} from the local LRU), '
+            f'{self.writes} writes, {self.skipped_writes} unchanged writes skipped'
+        )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide game state store, configured from settings on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = GameStateStore(
+                    cache_alias=getattr(settings, 'GAME_STATE_CACHE', 'default'),
+                    local_size=getattr(settings, 'GAME_STATE_LOCAL_SIZE', 1024),
+                    timeout=getattr(settings, 'GAME_STATE_TIMEOUT', 24 * 3600),
+                )
+    return _store
+
+
+def reset_store():
+    global _store
+    _store = None
@@ -0,0 +1,66 @@
+"""Compact references to game hints, and a process-local memo of their texts.
+
+A game's hint deck is stored as [kind, value] pairs instead of sentences:
+kind indexes HINT_KINDS and value is a Trivia row id (kind TRIVIA) or the
+index of one of that kind's sentence templates (FALLBACK for the kind's
+last-resort fact). The sentences are rebuilt from the movie when they are
+shown, so a game state stays a few dozen bytes however long the trivia is.
+
+Rebuilding needs the movie with its trivia, actors and production companies.
+The memo keeps the texts of recently played movies so a wrong guess does not
+reload all of that; saving or deleting a movie or its trivia drops the
+movie's entry (see signals.py).
+"""
+import threading
+from collections import OrderedDict
+
+HINT_KINDS = (
+    'trivia', 'first', 'release_year', 'studio', 'medium_trivia', 'production',
+    'genre', 'easy_trivia', 'actors', 'director', 'final',
+)
+TRIVIA = 0
+FALLBACK = -1
+
+
+class HintTextMemo:
+    """LRU of hint texts per movie, keyed by hint reference."""
+    def __init__(self, size=1024):
+        self.size = size
+        self.lock = threading.Lock()
+        self.movies = OrderedDict()  # movie id -> {(kind, value): text}
+
+    def get(self, movie_id, refs):
+        """The texts of refs, or None unless every one of them is memoized"""
+        with self.lock:
+            texts = self.movies.get(movie_id)
+            if texts is None:
+                return None
+            self.movies.move_to_end(movie_id)
+            try:
+                return [texts[tuple(ref)] for ref in refs]
+            except KeyError:
+                return None
+
+    def put(self, movie_id, refs, texts):
+        with self.lock:
+            known = self.movies.setdefault(movie_id, {})
+            known.update((tuple(ref), text) for ref, text in zip(refs, texts))
+            self.movies.move_to_end(movie_id)
+            while len(self.movies) > self.size:
+                self.movies.popitem(last=False)
+
+    def forget(self, movie_id):
+        with self.lock:
+            self.movies.pop(movie_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.movies.clear()
+
+
+memo = HintTextMemo()
+
+
+def movie_changed(movie_id):
+    """Drop the memoized hint texts of a movie whose data changed"""
+    memo.forget(movie_id)
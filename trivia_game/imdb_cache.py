@@ -0,0 +1,142 @@
+"""Persistent on-disk cache for Cinemagoer lookups made by the import commands."""
+import contextlib
+import hashlib
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+
+
+class ResponseCache:
+    """Content-addressed response cache with a TTL and LRU eviction by total size.
+
+    Each entry is a pickle file named after the SHA-256 of its key and
+    fanned out over 256 subdirectories. A file's mtime records when it was
+    written (for the TTL) and its atime is bumped on every hit (for LRU),
+    so the cache needs no index and survives between runs.
+    """
+    def __init__(self, directory, ttl=7 * 24 * 3600, max_bytes=512 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.expired = self.evictions = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.size = sum(stat.st_size for _, stat in self.entry_stats())
+
+    def entries(self):
+        return self.directory.glob('*/*.pickle')
+
+    def entry_stats(self):
+        """(path, stat) of every entry, skipping files another process removed after they were listed."""
+        for path in self.entries():
+            with contextlib.suppress(FileNotFoundError):
+                yield path, path.stat()
+
+    def path_for(self, key):
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return self.directory / digest[:2] / f'{digest}.pickle'
+
+    def get(self, key, default=None):
+        path = self.path_for(key)
+        try:
+            stat = path.stat()
+            if time.time() - stat.st_mtime > self.ttl:
+                with self.lock:
+                    self.expired += 1
+                    self.misses += 1
+                self.remove(path)
+                return default
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            with self.lock:
+                self.misses += 1
+            return default
+        # Record the access for LRU ordering, keeping the write time as mtime
+        # (the file may have been evicted by another thread since it was read)
+        with contextlib.suppress(OSError):
+            os.utime(path, (time.time(), stat.st_mtime))
+        with self.lock:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        path = self.path_for(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        previous = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.size += path.stat().st_size - previous
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def remove(self, path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self.lock:
+            self.size -= size
+
+    def evict(self):
+        """Drop least recently used entries until the cache is back under 90% of max_bytes."""
+        target = self.max_bytes * 0.9
+        by_access = sorted((stat.st_atime, path) for path, stat in self.entry_stats())
+        for _, path in by_access:
+            if self.size <= target:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError:
+                continue
+            self.size -= size
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        ratio = self.hits / lookups if lookups else 0
+        return (
+            f'{self.hits} hits, {self.misses} misses ({ratio:.0%} hit rate), '
+            f'{self.expired} expired, {self.evictions} evicted, {self.size / 1024 / 1024:.1f} MB on disk'
+        )
+
+
+class CachedCinemagoer:
+    """Wraps a Cinemagoer client so get_movie() and get_top250_movies() go through a ResponseCache.
+
+    `throttle`, if given, is called before every request that actually goes
+    out to IMDb, so cache hits never wait on a rate limiter. Pass cache=None
+    to keep the throttling but bypass the cache.
+    """
+    def __init__(self, client, cache, throttle=None):
+        self.client = client
+        self.cache = cache
+        self.throttle = throttle
+
+    def get_movie(self, movie_id, *args, **kwargs):
+        return self.cached(('get_movie', str(movie_id), args, sorted(kwargs.items())),
+                           self.client.get_movie, movie_id, *args, **kwargs)
+
+    def get_top250_movies(self, *args, **kwargs):
+        return self.cached(('get_top250_movies', args, sorted(kwargs.items())),
+                           self.client.get_top250_movies, *args, **kwargs)
+
+    def cached(self, key, fetch, *args, **kwargs):
+        value = self.cache.get(key) if self.cache else None
+        if value is None:
+            if self.throttle:
+                self.throttle()
+            value = fetch(*args, **kwargs)
+            if self.cache:
+                self.cache.set(key, value)
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
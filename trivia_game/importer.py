@@ -0,0 +1,286 @@
+"""Batched write path shared by the movie import commands."""
+import math
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+from .catalog_cache import bump_catalog_version
+from .models import Movie, Actor, Director, Genre, Studio
+
+
+def normalize_imdb_id(value):
+    """Return the canonical tt-prefixed form of an IMDb title id ('111161' -> 'tt0111161')."""
+    value = str(value).strip()
+    if value.startswith('tt'):
+        value = value[2:]
+    return f'tt{value.zfill(7)}'
+
+
+def quantize_rating(value):
+    """8.7 -> Decimal('8.7'), the value Movie.imdb_rating reads back, so an unchanged row compares equal"""
+    return Decimal(str(value)).quantize(Decimal('0.1'))
+
+
+def split_genres(text):
+    """'Crime, Drama' (or IMDb's 'Crime,Drama') -> ['Crime', 'Drama']; 'Unknown' means none."""
+    names = (name.strip()[:50] for name in str(text).split(','))
+    return list(dict.fromkeys(name for name in names if name and name.lower() != 'unknown'))
+
+
+def parse_imdb_movie(movie_data, imdb_id):
+    """Normalize a Cinemagoer movie into the plain dict BulkMovieWriter consumes."""
+    studio_name = "Unknown Studio"
+    companies = movie_data.get('production companies', [])
+    if companies:
+        studio_name = str(companies[0])[:200]
+
+    director_name = "Unknown Director"
+    directors = movie_data.get('directors', [])
+    if directors:
+        director_name = str(directors[0])[:200]
+
+    year = movie_data.get('year', 2000)
+    if not isinstance(year, int):
+        year = 2000
+
+    genres = movie_data.get('genres', ['Unknown'])[:3]
+
+    rating = movie_data.get('rating', 0.0)
+    if not isinstance(rating, (int, float)) or not math.isfinite(rating):
+        rating = 0.0
+
+    return {
+        'imdb_id': normalize_imdb_id(imdb_id),
+        'title': str(movie_data.get('title', 'Unknown Title'))[:200],
+        'release_date': year,
+        'genre': ', '.join(str(g) for g in genres)[:100],
+        'genres': split_genres(','.join(str(g) for g in genres)),
+        'imdb_rating': quantize_rating(rating),
+        'studio': studio_name,
+        'director': director_name,
+        'actors': [str(actor)[:200] for actor in movie_data.get('cast', [])[:6]],  # Limit to top 6 actors
+    }
+
+
+def load_ids(model, names, ids):
+    for name, pk in model.objects.filter(name__in=names).order_by('pk').values_list('name', 'pk'):
+        ids.setdefault(name, pk)
+
+
+def resolve_names(model, names, ids, defaults=None):
+    """Add the id of every name to ids (name -> id), creating the missing rows in bulk.
+
+    Costs one query when every name exists and three when some do not, however
+    many names there are. Returns how many rows were created.
+    """
+    if not names:
+        return 0
+    load_ids(model, names, ids)
+    missing = [name for name in names if name not in ids]
+    if not missing:
+        return 0
+
+    # Names are unique, so rows another request created in the meantime are
+    # skipped here and picked up by the read-back below
+    model.objects.bulk_create([model(name=name, **(defaults or {})) for name in missing], ignore_conflicts=True)
+    load_ids(model, missing, ids)
+    for name in missing:
+        if name not in ids:
+            # Stored under a spelling the database's collation treats as equal (e.g. by case)
+            ids[name] = model.objects.filter(name=name).values_list('pk', flat=True).first()
+    return len(missing)
+
+
+class QueryCounter:
+    """Execute wrapper that counts SQL statements, for use with connection.execute_wrapper()."""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class BatchWriter:
+    """Queues rows and hands them to write_chunk() a chunk at a time.
+
+    write_chunk() is expected to write a chunk in its own transaction. If a
+    chunk fails, its rows are retried one by one so a single bad row does
+    not sink the rest; the failures are collected in errors.
+    """
+    def __init__(self, chunk_size=100):
+        self.chunk_size = max(1, chunk_size)
+        self.pending = []
+        self.errors = []
+
+    def add(self, row):
+        """Queue a row. Returns what write_chunk() wrote if this filled a chunk."""
+        self.pending.append(row)
+        if len(self.pending) >= self.chunk_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """Write everything queued so far. Returns what write_chunk() wrote."""
+        chunk, self.pending = self.pending, []
+        if not chunk:
+            return []
+        try:
+            return self.write_chunk(chunk)
+        except Exception as e:
+            self.rolled_back()
+            if len(chunk) == 1:
+                self.record_error(chunk[0], e)
+                return []
+        written = []
+        for row in chunk:
+            try:
+                written.extend(self.write_chunk([row]))
+            except Exception as e:
+                self.rolled_back()
+                self.record_error(row, e)
+        return written
+
+    def write_chunk(self, chunk):
+        raise NotImplementedError
+
+    def rolled_back(self):
+        """Called after a chunk's transaction failed, to drop state that referred to its rows"""
+
+    def record_error(self, row, error):
+        self.errors.append((row.get('title'), error))
+
+
+class BulkMovieWriter(BatchWriter):
+    """Collects parsed movies and writes them a chunk at a time.
+
+    Studio, director, actor and genre names are resolved against an in-memory
+    name -> id map that persists across chunks, so each chunk costs a
+    handful of queries no matter how many movies or cast members it holds.
+    Movies are upserted on imdb_id: a title that is already in the catalog
+    has its fields, cast and genres replaced instead of being inserted again.
+    A movie whose genre, genres or actors are None keeps its current ones.
+    Every chunk is written in its own transaction; if a chunk fails, its
+    movies are retried one by one so a single bad row does not sink the rest.
+    """
+    update_fields = ['title', 'release_date', 'genre', 'imdb_rating', 'studio', 'director', 'fetched_at', 'updated_at']
+    timestamp_fields = ('fetched_at', 'updated_at')
+    entity_defaults = {
+        Studio: {'address': 'Address not available'},
+        Director: {'debut_movie': 'Unknown'},
+        Actor: {},
+        Genre: {},
+    }
+
+    def __init__(self, chunk_size=100):
+        super().__init__(chunk_size)
+        self.name_ids = {model: {} for model in self.entity_defaults}
+        self.created = {model: 0 for model in self.entity_defaults}
+        self.written = 0
+        self.updated = 0
+
+    def rolled_back(self):
+        # Ids created inside a rolled-back transaction no longer exist
+        for ids in self.name_ids.values():
+            ids.clear()
+
+    def write_chunk(self, chunk):
+        # A title listed twice in one chunk is only written once, with its latest data
+        chunk = list({parsed['imdb_id']: parsed for parsed in chunk}.values())
+        with transaction.atomic():
+            self.resolve(Studio, {parsed['studio'] for parsed in chunk if parsed['studio']})
+            self.resolve(Director, {parsed['director'] for parsed in chunk if parsed['director']})
+            self.resolve(Actor, {name for parsed in chunk for name in parsed['actors'] or ()})
+            self.resolve(Genre, {name for parsed in chunk for name in parsed['genres'] or ()})
+
+            now = timezone.now()
+            movies = [
+                Movie(
+                    imdb_id=parsed['imdb_id'],
+                    # Only stamped by writers that load from IMDb (fetched_at in update_fields)
+                    fetched_at=now if 'fetched_at' in self.update_fields else None,
+                    updated_at=now,  # bulk_update() skips auto_now
+                    title=parsed['title'],
+                    release_date=parsed['release_date'],
+                    genre=parsed['genre'] or '',
+                    imdb_rating=parsed['imdb_rating'],
+                    studio_id=self.name_ids[Studio][parsed['studio']] if parsed['studio'] else None,
+                    director_id=self.name_ids[Director][parsed['director']] if parsed['director'] else None,
+                )
+                for parsed in chunk
+            ]
+            compared = [
+                Movie._meta.get_field(name).attname
+                for name in self.update_fields if name not in self.timestamp_fields
+            ]
+            existing = {
+                imdb_id: (pk, values)
+                for imdb_id, pk, *values in Movie.objects.filter(imdb_id__in=[movie.imdb_id for movie in movies])
+                .values_list('imdb_id', 'pk', *compared)
+            }
+            new_movies, updated_movies, changed_movies = [], [], []
+            relinked = {'actors': [], 'genres': []}  # Ids of updated movies whose links the rows replace
+            for movie, parsed in zip(movies, chunk):
+                if movie.imdb_id not in existing:
+                    new_movies.append(movie)
+                    continue
+                movie.pk, values = existing[movie.imdb_id]
+                updated_movies.append(movie)
+                if parsed['genre'] is None:
+                    movie.genre = values[compared.index('genre')]
+                for key, ids in relinked.items():
+                    if parsed[key] is not None:
+                        ids.append(movie.pk)
+                if values != [getattr(movie, attname) for attname in compared]:
+                    changed_movies.append(movie)
+
+            self.insert_movies(new_movies)
+            ActorLink, GenreLink = Movie.actors.through, Movie.genres.through
+            if updated_movies:
+                # bulk_update() builds a CASE per field and row, which costs far more
+                # than the UPDATE itself, so rows whose fields are unchanged only get
+                # their timestamps moved, in one statement
+                Movie.objects.bulk_update(changed_movies, self.update_fields)
+                changed_ids = {movie.pk for movie in changed_movies}
+                Movie.objects.filter(pk__in=[movie.pk for movie in updated_movies if movie.pk not in changed_ids]).update(
+                    **{name: now for name in self.update_fields if name in self.timestamp_fields}
+                )
+                ActorLink.objects.filter(movie_id__in=relinked['actors']).delete()
+                GenreLink.objects.filter(movie_id__in=relinked['genres']).delete()
+
+            actor_ids, genre_ids = self.name_ids[Actor], self.name_ids[Genre]
+            ActorLink.objects.bulk_create([
+                ActorLink(movie_id=movie.pk, actor_id=actor_id)
+                for movie, parsed in zip(movies, chunk)
+                for actor_id in dict.fromkeys(actor_ids[name] for name in parsed['actors'] or ())
+            ])
+            GenreLink.objects.bulk_create([
+                GenreLink(movie_id=movie.pk, genre_id=genre_id)
+                for movie, parsed in zip(movies, chunk)
+                for genre_id in dict.fromkeys(genre_ids[name] for name in parsed['genres'] or ())
+            ])
+            # Bulk writes send no signals
+            bump_catalog_version()
+
+        self.written += len(new_movies)
+        self.updated += len(updated_movies)
+        return movies
+
+    def resolve(self, model, names):
+        """Make sure every name has an id in the map, creating missing rows in bulk."""
+        ids = self.name_ids[model]
+        self.created[model] += resolve_names(model, [name for name in names if name not in ids], ids, self.entity_defaults[model])
+
+    def insert_movies(self, movies):
+        if not movies:
+            return
+        Movie.objects.bulk_create(movies)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # MySQL does not return auto-increment ids from a multi-row INSERT,
+            # so read them back through the unique imdb_id
+            ids = dict(
+                Movie.objects.filter(imdb_id__in=[movie.imdb_id for movie in movies])
+                .values_list('imdb_id', 'pk')
+            )
+            for movie in movies:
+                movie.pk = ids[movie.imdb_id]
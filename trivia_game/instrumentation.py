@@ -0,0 +1,138 @@
+"""Opt-in per-request SQL and latency profiling.
+
+With REQUEST_PROFILING on, every request records its wall time, SQL query
+count, SQL time and duplicate queries. The numbers go back to the browser
+as a Server-Timing header and are kept in a rolling window per endpoint,
+which staff can read as JSON from the request_stats view. With it off, the
+middleware removes itself at startup and costs nothing.
+"""
+import bisect
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+
+class QueryRecorder:
+    """execute_wrapper that counts and times the queries of one request."""
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            self.statements[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        """Queries that repeated an earlier one in the same request, parameters included."""
+        return self.count - len(self.statements)
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def histogram(values):
+    counts = [0] * len(BUCKETS_MS)
+    for value in values:
+        counts[bisect.bisect_left(BUCKETS_MS, value)] += 1
+    return {('+Inf' if bound == float('inf') else f'<={bound:g}'): n for bound, n in zip(BUCKETS_MS, counts)}
+
+
+class EndpointStats:
+    """The last `window` samples of every endpoint, summarized on demand."""
+    def __init__(self, window=1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}  # endpoint -> deque of (wall_ms, sql_ms, queries, duplicates)
+        self.totals = Counter()  # endpoint -> requests seen since startup
+
+    def record(self, endpoint, wall_ms, sql_ms, queries, duplicates):
+        with self.lock:
+            if endpoint not in self.samples:
+                self.samples[endpoint] = deque(maxlen=self.window)
+            self.samples[endpoint].append((wall_ms, sql_ms, queries, duplicates))
+            self.totals[endpoint] += 1
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.totals.clear()
+
+    def summary(self):
+        with self.lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self.samples.items()}
+            totals = dict(self.totals)
+        return {endpoint: self.summarize(samples, totals[endpoint]) for endpoint, samples in sorted(snapshot.items())}
+
+    @staticmethod
+    def summarize(samples, total):
+        wall, sql, queries, duplicates = (sorted(column) for column in zip(*samples))
+        return {
+            'requests': total,
+            'window': len(samples),
+            'wall_ms': {
+                'p50': round(percentile(wall, 0.50), 2),
+                'p95': round(percentile(wall, 0.95), 2),
+                'p99': round(percentile(wall, 0.99), 2),
+                'max': round(wall[-1], 2),
+                'histogram': histogram(wall),
+            },
+            'sql_ms': {
+                'p50': round(percentile(sql, 0.50), 2),
+                'p95': round(percentile(sql, 0.95), 2),
+                'max': round(sql[-1], 2),
+            },
+            'queries': {'mean': round(sum(queries) / len(queries), 2), 'max': queries[-1]},
+            'duplicate_queries': {'mean': round(sum(duplicates) / len(duplicates), 2), 'max': duplicates[-1]},
+        }
+
+
+stats = EndpointStats(getattr(settings, 'REQUEST_PROFILING_WINDOW', 1000))
+
+
+class RequestProfilingMiddleware:
+    """Records what each request cost and reports it in a Server-Timing header.
+
+    Put it first in MIDDLEWARE so session and auth queries are counted too.
+    Requests are grouped by URL name (make_guess, play_game, ...), falling
+    back to the path for URLs that do not resolve.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - start) * 1000
+        sql_ms = recorder.seconds * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.view_name if match else request.path
+        stats.record(endpoint, wall_ms, sql_ms, recorder.count, recorder.duplicates)
+
+        response['Server-Timing'] = ', '.join([
+            f'sql;dur={sql_ms:.2f};desc="{recorder.count} queries, {recorder.duplicates} duplicate"',
+            f'app;dur={wall_ms - sql_ms:.2f}',
+            f'total;dur={wall_ms:.2f}',
+        ])
+        return response
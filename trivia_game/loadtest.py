@@ -0,0 +1,564 @@
+"""Simulated players for benchmarking the game flow, shared by the load_test and compare_wsgi_asgi commands.
+
+A player is a generator that yields Requests and is sent back each
+Response, so the same game can be replayed through Django's WSGI handler
+(one thread per player), its ASGI handler (one task per player) or a
+running server over HTTP without the drivers knowing what the game looks
+like. In-process requests go through the full handler stack, middleware
+and CSRF checks included, the way a server would pass them in.
+"""
+import asyncio
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from http.cookies import SimpleCookie
+from io import BytesIO
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections, router, transaction
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+from . import hints, matching
+from .catalog_cache import bump_catalog_version
+from .catalog_import import CatalogMovieWriter
+from .importer import load_ids
+from .models import Actor, Director, Genre, Movie, ProductionCompany, Studio, Trivia
+
+Request = namedtuple('Request', 'endpoint method path data', defaults=[None])
+Response = namedtuple('Response', 'status headers body')  # headers: [(lowercase name, value)]
+
+GUESSES = 9  # Attempts a game allows
+IDEMPOTENT_METHODS = ('GET', 'HEAD')  # Requests http_call() may send twice
+
+
+def header(response, name):
+    return next((value for key, value in response.headers if key == name), None)
+
+
+class Client:
+    """One player's cookies, and the headers a browser would send with them."""
+    def __init__(self, host, scheme='http'):
+        self.host = host
+        self.scheme = scheme
+        self.cookies = {}
+
+    def headers(self, request):
+        headers = [('host', self.host)]
+        if self.cookies:
+            headers.append(('cookie', '; '.join(f'{name}={value}' for name, value in self.cookies.items())))
+        if request.method == 'POST':
+            headers.append(('content-type', 'application/x-www-form-urlencoded'))
+            if 'csrftoken' in self.cookies:
+                headers.append(('x-csrftoken', self.cookies['csrftoken']))
+            # CSRF checks the referer of HTTPS requests
+            headers.append(('referer', f'{self.scheme}://{self.host}/'))
+        return headers
+
+    @staticmethod
+    def body(request):
+        return urlencode(request.data).encode() if request.data else b''
+
+    def received(self, response):
+        for key, value in response.headers:
+            if key != 'set-cookie':
+                continue
+            for name, morsel in SimpleCookie(value).items():
+                if morsel['max-age'] == '0':
+                    self.cookies.pop(name, None)  # delete_cookie()
+                else:
+                    self.cookies[name] = morsel.value
+        return response
+
+
+def default_host():
+    """A host name ALLOWED_HOSTS accepts, for the Host header of in-process requests"""
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if '*' not in host]
+    return hosts[0] if hosts else 'localhost'
+
+
+def wsgi_call(handler, client, request):
+    body = client.body(request)
+    path, _, query = request.path.partition('?')
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': client.host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in client.headers(request):
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        else:
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(key.lower(), value) for key, value in headers]
+
+    result = handler(environ, start_response)
+    try:
+        content = b''.join(result)
+    finally:
+        result.close()  # Sends request_finished, which closes the request's database connection
+    return client.received(Response(started['status'], started['headers'], content))
+
+
+async def asgi_call(handler, client, request):
+    path, _, query = request.path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': request.method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(name.encode(), value.encode()) for name, value in client.headers(request)],
+        'client': ('127.0.0.1', 0),
+        'server': (client.host, 80),
+    }
+    messages = [{'type': 'http.request', 'body': client.body(request), 'more_body': False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Future()  # Never disconnects; the handler cancels this once it has responded
+
+    response = {'body': []}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = [(key.decode().lower(), value.decode()) for key, value in message['headers']]
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+
+    await handler(scope, receive, send)
+    return client.received(Response(response['status'], response['headers'], b''.join(response['body'])))
+
+
+def http_call(connection, client, request):
+    """Send a request over a player's keep-alive connection, reconnecting once if the server closed it.
+
+    Only idempotent requests are sent again: a POST may have reached the
+    server before the connection dropped, and repeating a guess would use
+    up another attempt.
+    """
+    for attempt in range(2):
+        try:
+            connection.request(request.method, request.path, body=client.body(request) or None,
+                               headers=dict(client.headers(request)))
+            response = connection.getresponse()
+            content = response.read()
+        except (ConnectionError, http.client.HTTPException):
+            connection.close()
+            if attempt or request.method not in IDEMPOTENT_METHODS:
+                raise
+            continue
+        headers = [(key.lower(), value) for key, value in response.getheaders()]
+        return client.received(Response(response.status, headers, content))
+
+
+def game_player(titles, ids, rng, games=1):
+    """A player who plays `games` games in a row. Returns each game's outcome: 'won', 'lost' or 'failed'.
+
+    titles maps movie ids to titles (ids lists them), so the player knows
+    the answer and decides up front how many wrong guesses to make first
+    (all of them, sometimes, to lose).
+    """
+    outcomes = []
+    for _ in range(games):
+        outcomes.append((yield from one_game(titles, ids, rng)))
+    return outcomes
+
+
+def one_game(titles, ids, rng):
+    # The chooser, and a search typed into its search box
+    yield Request('choose_movie', 'GET', reverse('choose_movie'))
+    query = titles[rng.choice(ids)]
+    yield Request('movie_search', 'GET', f"{reverse('movie_search')}?{urlencode({'q': query[:3]})}")
+    yield Request('autocomplete', 'GET', f"{reverse('autocomplete_titles')}?{urlencode({'q': query[:2]})}")
+
+    # Half the players pick a movie from the list, the others ask for a random one
+    path = reverse('start_game', args=[rng.choice(ids)]) if rng.random() < 0.5 else reverse('start_game_random')
+    response = yield Request('start_game', 'GET', path)
+    location = header(response, 'location') or ''
+    movie_id = location.rstrip('/').rsplit('/', 1)[-1]
+    if response.status != 302 or not movie_id.isdigit() or int(movie_id) not in titles:
+        return 'failed'
+    title = titles[int(movie_id)]
+    response = yield Request('play_game', 'GET', location)
+    if response.status != 200:
+        return 'failed'
+
+    decoys = [titles[decoy] for decoy in rng.sample(ids, min(len(ids), GUESSES)) if decoy != int(movie_id)]
+    wrong = rng.randint(0, GUESSES)
+    outcome = 'failed'
+    for attempt in range(GUESSES):
+        guess = title if attempt >= wrong or attempt >= len(decoys) else decoys[attempt]
+        response = yield Request('make_guess', 'POST', reverse('make_guess'), {'guess': guess})
+        if response.status != 200:
+            return 'failed'
+        result = json.loads(response.body)
+        if result.get('correct') or result.get('game_over'):
+            outcome = 'won' if result.get('correct') else 'lost'
+            break
+    yield Request('game_over', 'GET', reverse('game_over'))
+    return outcome
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Stats:
+    """Response times and error counts per endpoint."""
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.games = {'won': 0, 'lost': 0, 'failed': 0}
+
+    def record(self, request, seconds, response):
+        self.timings[request.endpoint].append(seconds)
+        if response.status >= 400:
+            self.errors[request.endpoint] += 1
+
+    def finished(self, outcomes):
+        for outcome in outcomes or ():
+            self.games[outcome] += 1
+
+    @staticmethod
+    def latencies(timings):
+        timings = sorted(timings)
+        return {
+            'mean_ms': round(1000 * sum(timings) / len(timings), 2) if timings else 0.0,
+            'p50_ms': round(1000 * percentile(timings, 0.50), 2),
+            'p95_ms': round(1000 * percentile(timings, 0.95), 2),
+            'p99_ms': round(1000 * percentile(timings, 0.99), 2),
+        }
+
+    def summary(self, seconds):
+        """Totals, throughput and latency percentiles, overall and per endpoint, as JSON-able dicts"""
+        every = [timing for timings in self.timings.values() for timing in timings]
+        return {
+            'requests': len(every),
+            'errors': sum(self.errors.values()),
+            'seconds': round(seconds, 3),
+            'requests_per_second': round(len(every) / seconds, 1) if seconds else 0.0,
+            **self.latencies(every),
+            'games': dict(self.games),
+            'endpoints': {
+                endpoint: {
+                    'requests': len(timings),
+                    'errors': self.errors[endpoint],
+                    'requests_per_second': round(len(timings) / seconds, 1) if seconds else 0.0,
+                    **self.latencies(timings),
+                }
+                for endpoint, timings in sorted(self.timings.items())
+            },
+        }
+
+
+def play(player, call, stats):
+    response = None
+    try:
+        while True:
+            request = player.send(response)
+            start = time.perf_counter()
+            response = call(request)
+            stats.record(request, time.perf_counter() - start, response)
+    except StopIteration as stop:
+        stats.finished(stop.value)
+
+
+async def aplay(player, call, stats):
+    response = None
+    try:
+        while True:
+            request = player.send(response)
+            start = time.perf_counter()
+            response = await call(request)
+            stats.record(request, time.perf_counter() - start, response)
+    except StopIteration as stop:
+        stats.finished(stop.value)
+
+
+class FairSemaphore:
+    """Semaphore that lets waiting threads in in the order they arrived, like a server's accept queue.
+
+    threading.Semaphore wakes an arbitrary waiter, and a thread that releases
+    and at once acquires again usually wins, so some players would starve.
+    """
+    def __init__(self, value):
+        self.lock = threading.Lock()
+        self.value = value
+        self.waiters = deque()
+
+    def __enter__(self):
+        with self.lock:
+            if self.value and not self.waiters:
+                self.value -= 1
+                return
+            turn = threading.Event()
+            self.waiters.append(turn)
+        turn.wait()
+
+    def __exit__(self, *exc_info):
+        with self.lock:
+            if self.waiters:
+                self.waiters.popleft().set()  # The slot passes straight to the longest waiter
+            else:
+                self.value += 1
+
+
+class ThreadSampler:
+    """Tracks the most threads alive at once while in use as a context manager."""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self.done = threading.Event()
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.done.set()
+        self.thread.join()
+
+
+def run_threads(players, player_call):
+    """Play every player at once, one thread each; player_call() returns a player's request function"""
+    stats = Stats()
+    with ThreadSampler() as sampler, ThreadPoolExecutor(max(1, len(players))) as pool:
+        start = time.perf_counter()
+        for future in [pool.submit(play, player, player_call(), stats) for player in players]:
+            future.result()
+        seconds = time.perf_counter() - start
+    return stats, seconds, sampler.peak
+
+
+def run_wsgi(players, threads, host=None):
+    """Play every player at once through WSGIHandler, as a server with `threads` worker threads would.
+
+    Each player gets its own thread, but only `threads` requests are let into
+    the handler at a time; the rest wait in line, and that wait counts
+    towards their response time. Returns (Stats, seconds, peak threads).
+    """
+    handler, host = WSGIHandler(), host or default_host()
+    workers = FairSemaphore(max(1, threads))
+
+    def player_call():
+        client = Client(host)
+
+        def call(request):
+            with workers:
+                return wsgi_call(handler, client, request)
+        return call
+
+    return run_threads(players, player_call)
+
+
+def run_asgi(players, host=None):
+    """Play every player at once through ASGIHandler, one task per player on a single event loop.
+
+    Returns (Stats, seconds, peak threads). The threads are the ones the
+    sync parts of a request (sync middleware, the ORM behind the async
+    API) hop to.
+    """
+    handler, stats, host = ASGIHandler(), Stats(), host or default_host()
+
+    def player_call(client):
+        return lambda request: asgi_call(handler, client, request)
+
+    async def main():
+        await asyncio.gather(*(aplay(player, player_call(Client(host)), stats) for player in players))
+
+    with ThreadSampler() as sampler:
+        start = time.perf_counter()
+        asyncio.run(main())
+        seconds = time.perf_counter() - start
+    return stats, seconds, sampler.peak
+
+
+def run_http(players, url, timeout=30):
+    """Play every player at once against the server at url, one thread and keep-alive connection each.
+
+    Returns (Stats, seconds, peak threads); the threads are the driver's own.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        raise ValueError(f'{url} is not an http:// or https:// URL')
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+
+    def player_call():
+        client = Client(parts.netloc, parts.scheme)
+        connection = connection_class(parts.netloc, timeout=timeout)
+        return lambda request: http_call(connection, client, request)
+
+    return run_threads(players, player_call)
+
+
+def players(titles, count, games=1, seed=None):
+    rng = random.Random(seed)
+    ids = list(titles)
+    return [game_player(titles, ids, random.Random(rng.random()), games) for _ in range(count)]
+
+
+@contextmanager
+def query_latency(seconds):
+    """Make every SQL statement take `seconds` longer, as if the database were across a network.
+
+    Applies to the connections opened while the block runs, in any thread.
+    """
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    if seconds <= 0:
+        yield
+        return
+    connection_created.connect(install)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(install)
+        for connection in connections.all(initialized_only=True):
+            if delay in connection.execute_wrappers:
+                connection.execute_wrappers.remove(delay)
+
+
+SEED_PREFIX = 'ttload'  # imdb_id prefix of synthetic movies; no real IMDb id has letters after "tt"
+ADJECTIVES = ['Silent', 'Crimson', 'Last', 'Broken', 'Golden', 'Hidden', 'Midnight', 'Wild', 'Distant', 'Iron',
+              'Frozen', 'Electric', 'Lonely', 'Burning', 'Secret', 'Hollow', 'Velvet', 'Savage', 'Paper', 'Endless']
+NOUNS = ['Harbor', 'Empire', 'Witness', 'Garden', 'Frontier', 'Signal', 'Orchard', 'Voyage', 'Kingdom', 'Mirror',
+         'Canyon', 'Promise', 'Lantern', 'Requiem', 'Highway', 'Island', 'Protocol', 'Carnival', 'Tide', 'Summit']
+FIRST_NAMES = ['Ava', 'Noah', 'Mia', 'Liam', 'Zoe', 'Omar', 'Ines', 'Kenji', 'Lena', 'Raj', 'Sofia', 'Tomas']
+LAST_NAMES = ['Hale', 'Moreau', 'Okafor', 'Lindqvist', 'Tanaka', 'Reyes', 'Novak', 'Brennan', 'Costa', 'Adler']
+GENRES = ['Drama', 'Comedy', 'Thriller', 'Crime', 'Sci-Fi', 'Horror', 'Romance', 'Adventure', 'Animation', 'War']
+
+
+def synthetic_movie(number, rng):
+    """A made-up movie shaped like a validated import_catalog row, with trivia of every difficulty"""
+    title = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {number}'
+    genres = rng.sample(GENRES, rng.randint(1, 3))
+    director = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+    year = rng.randint(1950, 2024)
+    return {
+        'line': number,
+        'imdb_id': f'{SEED_PREFIX}{number:06d}',
+        'title': title,
+        'release_date': year,
+        'genre': ', '.join(genres),
+        'genres': genres,
+        'imdb_rating': Decimal(rng.randint(30, 95)) / 10,
+        'studio': f'{rng.choice(NOUNS)} Pictures',
+        'director': director,
+        'actors': list(dict.fromkeys(f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' for _ in range(4))),
+        'trivia': [
+            (Trivia.HARD, f'{director} shot it in {rng.randint(20, 90)} days.'),
+            (Trivia.MEDIUM, f'It premiered in {year} to a {rng.choice(["warm", "mixed", "rapturous"])} reception.'),
+            (Trivia.EASY, f'The title mentions a {title.split()[1].lower()}.'),
+        ],
+        'production_companies': [{'name': f'{rng.choice(LAST_NAMES)} Films', 'founding_year': year - 10, 'headquarters': ''}],
+    }
+
+
+class SeedWriter(CatalogMovieWriter):
+    """CatalogMovieWriter that remembers the ids of the actors, directors, studios and genres it created"""
+    def __init__(self, chunk_size=500):
+        super().__init__(chunk_size, upsert=True)
+        self.created_ids = defaultdict(set)
+
+    def resolve(self, model, names):
+        missing = [name for name in names if name not in self.name_ids[model]]
+        existing = {}
+        load_ids(model, missing, existing)
+        super().resolve(model, names)
+        self.created_ids[model].update(self.name_ids[model][name] for name in missing if name not in existing)
+
+
+def seed_catalog(count, seed=0):
+    """Add (or refresh) `count` synthetic movies, numbered from 1.
+
+    Returns the ids of the actors, directors, studios and genres the movies
+    brought into the catalog ({model: ids}), for remove_seeded().
+    """
+    rng = random.Random(seed)
+    writer = SeedWriter(chunk_size=500)
+    for number in range(1, count + 1):
+        writer.add(synthetic_movie(number, rng))
+    writer.flush()
+    if writer.errors:
+        number, error = writer.errors[0]
+        raise ValueError(f'could not write {len(writer.errors)} synthetic movies, the first (#{number}): {error}')
+    return dict(writer.created_ids)
+
+
+def raw_delete(queryset):
+    """Delete the rows of a queryset in one statement, without loading them or sending signals"""
+    return queryset._raw_delete(router.db_for_write(queryset.model))
+
+
+def remove_seeded(created=None):
+    """Delete every synthetic movie, and the entities in `created` (from seed_catalog) no other movie uses.
+
+    Returns how many movies there were. Rows are deleted in bulk, without
+    the per-row signals that would bump the catalog version once per row;
+    the version is bumped once at the end instead.
+    """
+    movies = Movie.objects.filter(imdb_id__startswith=SEED_PREFIX)
+    with transaction.atomic():
+        ids = list(movies.values_list('pk', flat=True))
+        for model in (Trivia, ProductionCompany, Movie.actors.through, Movie.genres.through):
+            raw_delete(model.objects.filter(movie__imdb_id__startswith=SEED_PREFIX))
+        raw_delete(movies)
+        # Left alone if a movie imported meanwhile uses them
+        for model, movies_of in ((Actor, 'movies'), (Genre, 'movies'), (Director, 'movie'), (Studio, 'movie')):
+            if (created or {}).get(model):
+                raw_delete(model.objects.filter(pk__in=created[model], **{f'{movies_of}__isnull': True}))
+        if ids or created:
+            bump_catalog_version()
+    for movie_id in ids:
+        matching.movie_removed(movie_id)
+        hints.movie_changed(movie_id)
+    return len(ids)
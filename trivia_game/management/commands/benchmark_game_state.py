@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import connection
+from trivia_game.game_store import GameStateStore
+from trivia_game.importer import QueryCounter
+import statistics
+import time
+
+
+def sample_state(game):
+    """A game state shaped like the ones the views keep: nine hint references, one revealed."""
+    return {
+        'v': 2,
+        'movie_id': game,
+        'deck': [[0, 1000 + game], [2, 1], [3, 0], [0, 2000 + game], [5, 2], [6, 1], [0, 3000 + game], [8, 0], [9, 2]],
+        'shown': [0],
+        'attempts_left': 9,
+        'won': False,
+        'game_over': False,
+    }
+
+
+def guess(state):
+    state['attempts_left'] -= 1
+    state['shown'].append(9 - state['attempts_left'])
+
+
+class Command(BaseCommand):
+    help = 'Compare the cost of a guess (read + write of game state) in DB sessions and the game state store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=50, help='Concurrent games to interleave')
+        parser.add_argument('--guesses', type=int, default=8, help='Guesses per game (at most 8)')
+        parser.add_argument('--cache', action='append', dest='caches',
+                            help='Cache alias to benchmark the store on (repeatable, default GAME_STATE_CACHE)')
+
+    def handle(self, *args, **options):
+        games = max(1, options['games'])
+        guesses = max(1, min(options['guesses'], 8))
+        aliases = options['caches'] or [getattr(settings, 'GAME_STATE_CACHE', 'default')]
+
+        self.stdout.write(f'{games} games x {guesses} guesses, interleaved\n')
+        self.report('db sessions', *self.run_sessions(games, guesses))
+        for alias in aliases:
+            self.report(f'store on cache "{alias}"', *self.run_store(GameStateStore(alias), games, guesses))
+
+    def run_sessions(self, games, guesses):
+        keys = []
+        for game in range(games):
+            session = SessionStore()
+            session['game_state'] = sample_state(game)
+            session.create()
+            keys.append(session.session_key)
+        try:
+            return self.measure(games, guesses, lambda game: self.session_guess(keys[game]))
+        finally:
+            SessionStore.get_model_class().objects.filter(session_key__in=keys).delete()
+
+    @staticmethod
+    def session_guess(key):
+        # What SessionMiddleware does around make_guess
+        session = SessionStore(key)
+        state = session['game_state']
+        guess(state)
+        session.modified = True
+        session.save()
+
+    def run_store(self, store, games, guesses):
+        ids = [f'benchmark-{game}' for game in range(games)]
+        for game, game_id in enumerate(ids):
+            store.set(game_id, sample_state(game))
+        try:
+            return self.measure(games, guesses, lambda game: self.store_guess(store, ids[game]))
+        finally:
+            for game_id in ids:
+                store.delete(game_id)
+
+    @staticmethod
+    def store_guess(store, game_id):
+        state = store.get(game_id)
+        guess(state)
+        store.set(game_id, state)
+
+    def measure(self, games, guesses, one_guess):
+        timings = []
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            for _ in range(guesses):
+                for game in range(games):
+                    start = time.perf_counter()
+                    one_guess(game)
+                    timings.append((time.perf_counter() - start) * 1000)
+        return timings, counter.count
+
+    def report(self, label, timings, queries):
+        timings.sort()
+        self.stdout.write(
+            f'{label:28s} mean {statistics.fmean(timings):7.3f} ms  '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:7.3f} ms  '
+            f'{queries / len(timings):.1f} queries/guess'
+        )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from trivia_game.loadtest import players, query_latency, run_asgi, run_wsgi
+from trivia_game.models import Movie
+
+
+class Command(BaseCommand):
+    help = 'Play the same concurrent games through the WSGI and the ASGI handler and compare throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=100, help='Games played at the same time')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Worker threads of the simulated WSGI server (requests it serves at once)')
+        parser.add_argument('--query-latency', type=float, default=0.0,
+                            help='Milliseconds added to every SQL statement, to mimic a database over the network')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for how many wrong guesses each player makes')
+
+    def handle(self, *args, **options):
+        titles = dict(Movie.objects.values_list('id', 'title'))
+        if not titles:
+            self.stderr.write('The catalog is empty; import some movies first.')
+            return
+        count = max(1, options['players'])
+        threads = max(1, options['threads'])
+        self.stdout.write(
+            f'{count} concurrent games (chooser, search, start, play, guesses until the game ends, result), '
+            f'{options["query_latency"]:g} ms added per query\n'
+        )
+        self.stdout.write(f'{"interface":<22}{"requests":>9}{"errors":>8}{"req/s":>9}'
+                          f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"threads":>9}')
+        # Builds the autocomplete index and title matcher, so neither run pays for it
+        run_wsgi(players(titles, 1), 1)
+        with query_latency(options['query_latency'] / 1000):
+            # Same seed, so players guess the same way through both interfaces
+            self.report(f'wsgi, {threads} threads', *run_wsgi(players(titles, count, seed=options['seed']), threads))
+            self.report('asgi', *run_asgi(players(titles, count, seed=options['seed'])))
+
+    def report(self, label, stats, seconds, peak_threads):
+        summary = stats.summary(seconds)
+        self.stdout.write(
+            f'{label:<22}{summary["requests"]:>9}{summary["errors"]:>8}{summary["requests_per_second"]:>9.1f}'
+            f'{summary["p50_ms"]:>9.1f}{summary["p95_ms"]:>9.1f}{summary["p99_ms"]:>9.1f}{peak_threads:>9}'
+        )
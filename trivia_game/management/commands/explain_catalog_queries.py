@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+from trivia_game.models import Actor, Director, Movie, Studio
+
+
+def hot_queries():
+    """The catalog lookups that run on every import, edit and chooser page, by label."""
+    movie = Movie.objects.order_by('pk').values('title', 'imdb_id').first() or {'title': '', 'imdb_id': ''}
+    return [
+        ('actor by name (get_or_create)', Actor.objects.filter(name='Tom Hanks')),
+        ('director by name (get_or_create)', Director.objects.filter(name='Steven Spielberg')),
+        ('studio by name (get_or_create)', Studio.objects.filter(name='Warner Bros.')),
+        ('movie by imdb_id', Movie.objects.filter(imdb_id=movie['imdb_id'])),
+        ('first page by title', Movie.objects.order_by('title', 'id')[:25]),
+        ('first page by highest rating', Movie.objects.order_by('-imdb_rating', 'title', 'id')[:25]),
+        ('title prefix search', Movie.objects.filter(title__startswith=movie['title'][:3]).order_by('title', 'id')[:25]),
+        ('default ordering (newest first)', Movie.objects.all()[:25]),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Print the database query plan of the hot catalog lookups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true',
+                            help='Run the queries and include actual timings (MySQL 8.0.18+, PostgreSQL)')
+
+    def handle(self, *args, **options):
+        for label, queryset in hot_queries():
+            try:
+                plan = queryset.explain(analyze=True) if options['analyze'] else queryset.explain()
+            except (NotSupportedError, ValueError) as e:
+                raise CommandError(f'Cannot explain on this database: {e}')
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(plan)
+            self.stdout.write('')
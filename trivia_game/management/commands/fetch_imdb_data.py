@@ -1,23 +1,154 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.db import transaction
-from trivia_game.models import Movie, Actor, Director, Studio
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from trivia_game.imdb_cache import CachedCinemagoer, ResponseCache
+from trivia_game.importer import BulkMovieWriter, QueryCounter, normalize_imdb_id, parse_imdb_movie
+from trivia_game.models import Actor, Director, Movie, Studio
 import imdb
+import json
+import os
+import threading
 import time
-import sys
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by all fetch workers.
+
+    Tokens refill at `rate` per second up to `burst`. A rate of 0 or less
+    disables limiting entirely.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available. Returns the seconds spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class StageTimer:
+    """Accumulates time spent per pipeline stage across threads."""
+    def __init__(self):
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+
+    def get(self, stage):
+        return self.totals.get(stage, 0.0)
+
 
 class Command(BaseCommand):
     help = 'Fetches movie data from IMDb and populates the database'
 
     def add_arguments(self, parser):
         parser.add_argument('--count', type=int, default=25, help='Number of top movies to fetch')
+        parser.add_argument('--workers', type=int, default=1, help='Number of concurrent IMDb fetch threads')
+        parser.add_argument('--rate', type=float, default=1.0, help='Maximum IMDb requests per second shared by all workers (0 disables limiting)')
+        parser.add_argument('--burst', type=int, default=1, help='Number of requests allowed back-to-back before the rate limit applies')
+        parser.add_argument('--chunk-size', type=int, default=50, help='Number of movies written per database transaction')
+        parser.add_argument('--checkpoint', help='Checkpoint file used to resume an interrupted run; removed once the run completes')
+        parser.add_argument('--refresh-older-than', type=float, metavar='DAYS', help='Refetch movies already imported more than DAYS days ago (default: never refetch)')
+        parser.add_argument('--cache-dir', default=settings.IMDB_CACHE_DIR, help='Directory of the on-disk IMDb response cache')
+        parser.add_argument('--cache-ttl', type=float, default=7, metavar='DAYS', help='How long cached IMDb responses stay valid')
+        parser.add_argument('--cache-max-mb', type=int, default=512, help='Size limit of the response cache; least recently used entries are evicted beyond it')
+        parser.add_argument('--no-cache', action='store_true', help='Always fetch from IMDb, neither reading nor writing the cache')
 
     def handle(self, *args, **options):
-        ia = imdb.Cinemagoer()
         count = options['count']
-        
+        workers = max(1, options['workers'])
+        self.limiter = TokenBucket(options['rate'], options['burst'])
+        self.timer = StageTimer()
+        self.local = threading.local()
+        self.cache = None
+        if not options['no_cache']:
+            self.cache = ResponseCache(
+                options['cache_dir'],
+                ttl=options['cache_ttl'] * 24 * 3600,
+                max_bytes=options['cache_max_mb'] * 1024 * 1024,
+            )
+        ia = self.get_client()
+        started = time.perf_counter()
+
         self.stdout.write(self.style.SUCCESS(f'Fetching {count} movies from IMDb...'))
-        
 
+        checkpoint_path = self.checkpoint_path = options['checkpoint']
+        checkpoint = self.load_checkpoint(checkpoint_path)
+        if checkpoint:
+            movie_ids = checkpoint['movie_ids']
+            self.stdout.write(f'Resuming from checkpoint {checkpoint_path}: {len(checkpoint["done"])}/{len(movie_ids)} movies already done')
+        else:
+            movie_ids = self.list_top_movies(ia, count)
+            checkpoint = {'movie_ids': movie_ids, 'done': []}
+
+        done = set(checkpoint['done']) | self.fresh_ids(movie_ids, options['refresh_older_than'])
+        skipped = [movie_id for movie_id in movie_ids if movie_id in done]
+        movie_ids = [movie_id for movie_id in movie_ids if movie_id not in done]
+        if skipped:
+            self.stdout.write(f'Skipping {len(skipped)} movies that are already imported and up to date')
+        checkpoint['done'] = skipped
+        self.save_checkpoint(checkpoint_path, checkpoint)
+        self.cinemagoer_ids = {normalize_imdb_id(movie_id): movie_id for movie_id in movie_ids}
+
+        self.stdout.write(f'Processing {len(movie_ids)} movies with {workers} worker(s): {movie_ids}')
+        # Fetch in the thread pool, write from this thread only
+        writer = BulkMovieWriter(chunk_size=options['chunk_size'])
+        queries = QueryCounter()
+        with ThreadPoolExecutor(max_workers=workers) as executor, connection.execute_wrapper(queries):
+            futures = {executor.submit(self.fetch_movie, movie_id): movie_id for movie_id in movie_ids}
+            for future in as_completed(futures):
+                movie_id = futures[future]
+                try:
+                    movie_data = future.result()
+                    self.stdout.write(f'Successfully fetched movie data for ID {movie_id}')
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'Failed to fetch movie {movie_id}: {str(e)}'))
+                    continue
+
+                parsed = parse_imdb_movie(movie_data, movie_id)
+                self.stdout.write(f'Queued movie: {parsed["title"]} ({parsed["release_date"]})')
+                self.write_chunk(writer, checkpoint, parsed)
+            self.write_chunk(writer, checkpoint)
+
+        for title, error in writer.errors:
+            self.stdout.write(self.style.ERROR(f'Error processing movie {title}: {str(error)}'))
+        successful_imports = writer.written + writer.updated
+        self.stdout.write(f'Inserted {writer.written} new movies and refreshed {writer.updated} existing ones')
+        self.stdout.write(
+            f'Created {writer.created[Studio]} studios, {writer.created[Director]} directors '
+            f'and {writer.created[Actor]} actors'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Data import completed. Successfully imported {successful_imports}/{len(movie_ids)} movies.'))
+        if checkpoint_path and len(checkpoint['done']) == len(checkpoint['movie_ids']):
+            os.remove(checkpoint_path)
+        self.report_timings(time.perf_counter() - started, workers, queries.count, successful_imports)
+        if self.cache:
+            self.stdout.write(f'IMDb response cache: {self.cache.stats()}')
+
+    def list_top_movies(self, ia, count):
+        list_started = time.perf_counter()
         top250 = ia.get_top250_movies()
         self.stdout.write(f'Found {len(top250)} movies in Top 250')
         movie_ids = []
@@ -27,89 +158,71 @@ class Command(BaseCommand):
             self.stdout.write(f'Added movie ID: {movie_id} - {movie.get("title", "Unknown Title")}')
             if len(movie_ids) >= count:
                 break
+        self.timer.add('list', time.perf_counter() - list_started)
+        return movie_ids
+
+    def fresh_ids(self, movie_ids, refresh_older_than):
+        """Cinemagoer ids of movies already in the catalog that do not need refetching."""
+        by_imdb_id = {normalize_imdb_id(movie_id): movie_id for movie_id in movie_ids}
+        existing = Movie.objects.filter(imdb_id__in=by_imdb_id)
+        if refresh_older_than is not None:
+            cutoff = timezone.now() - timedelta(days=refresh_older_than)
+            existing = existing.exclude(Q(fetched_at__isnull=True) | Q(fetched_at__lt=cutoff))
+        return {by_imdb_id[imdb_id] for imdb_id in existing.values_list('imdb_id', flat=True)}
+
+    def load_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def save_checkpoint(self, path, checkpoint):
+        if not path:
+            return
+        # Write then rename so a crash mid-write never leaves a truncated checkpoint
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+
+    def get_client(self):
+        """Cinemagoer instances are not shared between threads; give each worker its own."""
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = CachedCinemagoer(imdb.Cinemagoer(), self.cache, throttle=self.throttle)
+        return client
+
+    def throttle(self):
+        """Called before every request that misses the cache and goes out to IMDb."""
+        self.timer.add('wait', self.limiter.acquire())
+
+    def fetch_movie(self, movie_id):
+        """Fetch stage: runs on a worker thread behind the shared rate limiter."""
+        fetch_started = time.perf_counter()
+        try:
+            return self.get_client().get_movie(movie_id)
+        finally:
+            self.timer.add('fetch', time.perf_counter() - fetch_started)
+
+    def write_chunk(self, writer, checkpoint, parsed=None):
+        """Writer stage: queues a movie (or flushes the remainder) and checkpoints what landed."""
+        write_started = time.perf_counter()
+        try:
+            movies = writer.add(parsed) if parsed is not None else writer.flush()
+        finally:
+            self.timer.add('write', time.perf_counter() - write_started)
+        if not movies:
+            return
+        for movie in movies:
+            checkpoint['done'].append(self.cinemagoer_ids[movie.imdb_id])
+            self.stdout.write(self.style.SUCCESS(f'Successfully processed: {movie.title}'))
+        self.save_checkpoint(self.checkpoint_path, checkpoint)
 
-        self.stdout.write(f'Processing {len(movie_ids)} movies: {movie_ids}')
-        # Process movies
-        successful_imports = 0
-        for movie_id in movie_ids:
-            try:
-                with transaction.atomic():
-                    self.stdout.write(f'Processing movie {successful_imports+1}/{count}: ID={movie_id}')
-                    
-                    # Fetch movie details
-                    try:
-                        movie_data = ia.get_movie(movie_id)
-                        self.stdout.write(f'Successfully fetched movie data for ID {movie_id}')
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f'Failed to fetch movie {movie_id}: {str(e)}'))
-                        continue
-
-                    # Create or get studio
-                    studio_name = "Unknown Studio"
-                    companies = movie_data.get('production companies', [])
-                    if companies:
-                        studio_name = str(companies[0])[:200]
-                    
-                    studio, created = Studio.objects.get_or_create(
-                        name=studio_name,
-                        defaults={'address': 'Address not available'}
-                    )
-                    self.stdout.write(f'{"Created" if created else "Using existing"} studio: {studio.name}')
-                    
-                    # Create or get director
-                    director_name = "Unknown Director"
-                    directors = movie_data.get('directors', [])
-                    if directors:
-                        director_name = str(directors[0])[:200]
-                    
-                    director, created = Director.objects.get_or_create(
-                        name=director_name,
-                        defaults={'debut_movie': 'Unknown'}
-                    )
-                    self.stdout.write(f'{"Created" if created else "Using existing"} director: {director.name}')
-                    
-                    # Create movie
-                    title = str(movie_data.get('title', 'Unknown Title'))[:200]
-                    year = movie_data.get('year', 2000)
-                    if not isinstance(year, int):
-                        year = 2000
-                    
-                    genres = movie_data.get('genres', ['Unknown'])[:3]
-                    genre_str = ', '.join(str(g) for g in genres)[:100]
-                    
-                    rating = movie_data.get('rating', 0.0)
-                    if not isinstance(rating, (int, float)):
-                        rating = 0.0
-                    
-                    self.stdout.write(f'Creating movie: {title} ({year})')
-                    
-                    movie = Movie.objects.create(
-                        title=title,
-                        release_date=year,
-                        genre=genre_str,
-                        studio=studio,
-                        director=director,
-                        imdb_rating=float(rating)
-                    )
-                    self.stdout.write(f'Created movie: {movie.title}')
-                    
-                    # Add actors
-                    cast = movie_data.get('cast', [])[:6]  # Limit to top 6 actors
-                    for actor_data in cast:
-                        actor_name = str(actor_data)[:200]
-                        actor, created = Actor.objects.get_or_create(
-                            name=actor_name
-                        )
-                        movie.actors.add(actor)
-                        self.stdout.write(f'{"Created" if created else "Using existing"} actor: {actor.name}')
-                    
-                    successful_imports += 1
-                    self.stdout.write(self.style.SUCCESS(f'Successfully processed: {movie.title}'))
-                    time.sleep(1)  # Rate limiting
-                    
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error processing movie {movie_id}: {str(e)}'))
-                self.stdout.write(self.style.ERROR(f'Full error: {sys.exc_info()}'))
-                continue
-        
-        self.stdout.write(self.style.SUCCESS(f'Data import completed. Successfully imported {successful_imports}/{count} movies.'))
+    def report_timings(self, wall, workers, query_count, imported):
+        self.stdout.write('Stage timings:')
+        self.stdout.write(f'  list:  {self.timer.get("list"):.2f}s')
+        self.stdout.write(f'  fetch: {self.timer.get("fetch"):.2f}s across {workers} worker(s)')
+        self.stdout.write(f'  rate limiter wait: {self.timer.get("wait"):.2f}s (included in list and fetch)')
+        per_movie = query_count / imported if imported else 0
+        self.stdout.write(f'  write: {self.timer.get("write"):.2f}s, {query_count} queries ({per_movie:.1f} per movie)')
+        self.stdout.write(f'  total: {wall:.2f}s')
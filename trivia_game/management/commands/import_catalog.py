@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from trivia_game.catalog_import import KINDS, WRITERS, detect_format, read_rows, validate_batch
+from trivia_game.importer import QueryCounter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import django
+import json
+import os
+import time
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Bulk loads curated movies, trivia or production companies from JSON Lines or CSV files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='.jsonl/.ndjson or .csv files, optionally gzipped')
+        parser.add_argument('--kind', choices=KINDS, default='movies',
+                            help='What each row holds (movies use the export_catalog format)')
+        parser.add_argument('--format', choices=['auto', 'jsonl', 'csv'], default='auto',
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--upsert', action='store_true',
+                            help='Update rows whose key is already in the catalog instead of reporting them')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help='Processes validating rows (1 validates in this process)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Number of rows written per database transaction')
+        parser.add_argument('--errors', help='Write the rejected rows to this file as JSON Lines')
+
+    def handle(self, *args, **options):
+        for path in options['files']:
+            if not os.path.exists(path):
+                raise CommandError(f'{path} not found')
+        started = time.perf_counter()
+        chunk_size = max(1, options['chunk_size'])
+        writer = WRITERS[options['kind']](chunk_size=chunk_size, upsert=options['upsert'])
+        errors = []  # (file, line, message)
+        rows = 0
+        queries = QueryCounter()
+
+        with connection.execute_wrapper(queries):
+            for path in options['files']:
+                format = detect_format(path) if options['format'] == 'auto' else options['format']
+                raw_rows = read_rows(path, format)
+                for line, row, error in self.validated(options['kind'], raw_rows, options['workers'], chunk_size):
+                    rows += 1
+                    if error:
+                        errors.append((path, line, error))
+                    else:
+                        writer.add(row)
+                # Errors are reported by line, so each file's rows are written before the next is read
+                writer.flush()
+                errors.extend((path, line, error) for line, error in writer.errors)
+                writer.errors = []
+
+        errors.sort(key=lambda error: (options['files'].index(error[0]), error[1]))
+        for path, line, error in errors[:20]:
+            self.stdout.write(self.style.ERROR(f'{path}:{line}: {error}'))
+        if len(errors) > 20:
+            self.stdout.write(self.style.ERROR(f'... and {len(errors) - 20} more'))
+        if options['errors']:
+            with open(options['errors'], 'w', encoding='utf-8') as f:
+                for path, line, error in errors:
+                    f.write(json.dumps({'file': path, 'line': line, 'error': error}) + '\n')
+
+        elapsed = time.perf_counter() - started
+        unchanged = getattr(writer, 'unchanged', 0)
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s, {queries.count} queries): '
+            f'inserted {writer.written}, updated {writer.updated}'
+            + (f', {unchanged} already present' if unchanged else '')
+            + f', {len(errors)} rejected.'
+        ))
+
+    @staticmethod
+    def validated(kind, raw_rows, workers, batch_size):
+        """(line, row, error) for every input row, in input order.
+
+        With several workers, at most two batches per worker are in flight,
+        so memory stays bounded however large the file, and validation of
+        the next batches overlaps with writing the current one. Workers set
+        Django up before unpickling a batch, because the validators' module
+        imports the models and, with the spawn start method (macOS,
+        Windows), a worker starts from a fresh interpreter.
+        """
+        if workers <= 1:
+            for batch in batches(raw_rows, batch_size):
+                yield from validate_batch(kind, batch)
+            return
+        with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+            pending = deque()
+            for batch in batches(raw_rows, batch_size):
+                pending.append(pool.submit(validate_batch, kind, batch))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from trivia_game.loadtest import players, remove_seeded, run_asgi, run_http, run_wsgi, seed_catalog
+from trivia_game.models import Movie
+import django
+import json
+import platform
+
+
+class Command(BaseCommand):
+    help = ('Play concurrent games (chooser, search, start, guesses until won or lost, result) '
+            'in-process or against a running server, and report throughput and latency per endpoint as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server to load (default: serve the requests in-process). '
+                                          'It must use this database, which players read the answers from')
+        parser.add_argument('--interface', choices=['wsgi', 'asgi'], default='wsgi',
+                            help='Django handler serving in-process requests')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Requests the in-process WSGI handler serves at once, like a threaded server')
+        parser.add_argument('--players', type=int, default=50, help='Players playing at the same time')
+        parser.add_argument('--games', type=int, default=1, help='Games each player plays in a row')
+        parser.add_argument('--seed-movies', type=int, default=0,
+                            help='Add this many synthetic movies (with trivia) before the run')
+        parser.add_argument('--keep-seeded', action='store_true', help='Leave the synthetic movies in the catalog')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic catalog and the players')
+        parser.add_argument('--label', default='', help='Free text stored in the report, e.g. the release tested')
+        parser.add_argument('--output', '-o', help='File to write the JSON report to (default: standard output)')
+
+    def handle(self, *args, **options):
+        seeded = min(max(0, options['seed_movies']), 999999)
+        created = {}
+        if seeded:
+            try:
+                created = seed_catalog(seeded, options['seed'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        try:
+            report = self.run(options, seeded)
+        finally:
+            if seeded and not options['keep_seeded']:
+                remove_seeded(created)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+        # The summary goes to stderr so it never ends up in the report
+        games = report['games']
+        self.stderr.write(
+            f'{sum(games.values())} games ({games["won"]} won, {games["lost"]} lost, {games["failed"]} failed): '
+            f'{report["requests"]} requests in {report["seconds"]:.1f}s, {report["requests_per_second"]:.1f} req/s, '
+            f'p95 {report["p95_ms"]:.1f} ms, {report["errors"]} errors',
+            style_func=None,
+        )
+
+    def run(self, options, seeded):
+        titles = dict(Movie.objects.values_list('id', 'title'))
+        if not titles:
+            raise CommandError('The catalog is empty; pass --seed-movies or import some movies first.')
+        count, games, threads = max(1, options['players']), max(1, options['games']), max(1, options['threads'])
+        # One unmeasured game first, so the report is not skewed by the empty caches of a fresh process
+        warmup = players(titles, 1, seed=options['seed'])
+        team = players(titles, count, games, options['seed'])
+        started_at = timezone.now()
+        if options['url']:
+            target = options['url']
+            try:
+                run_http(warmup, options['url'])
+                stats, seconds, _ = run_http(team, options['url'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            except OSError as e:
+                raise CommandError(f'Cannot reach {options["url"]}: {e}')
+        elif options['interface'] == 'asgi':
+            target = 'in-process asgi'
+            run_asgi(warmup)
+            stats, seconds, _ = run_asgi(team)
+        else:
+            target = f'in-process wsgi, {threads} threads'
+            run_wsgi(warmup, threads)
+            stats, seconds, _ = run_wsgi(team, threads)
+        return {
+            'label': options['label'],
+            'started_at': started_at.isoformat(),
+            'target': target,
+            'players': count,
+            'games_per_player': games,
+            'catalog_movies': len(titles),
+            'seeded_movies': seeded,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            **stats.summary(seconds),
+        }
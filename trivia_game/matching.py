@@ -0,0 +1,231 @@
+"""Fuzzy matching of guesses against movie titles.
+
+Titles are normalized (case, accents, punctuation and leading articles are
+ignored) and kept in a process-wide trigram index over the catalog. A guess
+counts as correct when the movie being guessed is the closest title in the
+catalog and is within a bounded number of edits, so "godfather" and
+"The Godfathr" both match "The Godfather", while "Alien" still loses to
+"Aliens" if both are in the catalog.
+"""
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .catalog_cache import acatalog_version, catalog_version
+
+ARTICLES = {'the', 'a', 'an'}
+GRAM_SIZE = 3
+
+
+def normalize_title(text):
+    """'The Lord of the Rings: The Two Towers' -> 'lord of the rings the two towers'.
+
+    Letters and digits of any script are kept, so 'Амели' -> 'амели'; a
+    title of punctuation only normalizes to ''.
+    """
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).casefold()
+    text = text.replace('&', ' and ')
+    tokens = re.sub(r'[\W_]+', ' ', text).split()
+    if len(tokens) > 1 and tokens[0] in ARTICLES:
+        tokens = tokens[1:]
+    return ' '.join(tokens)
+
+
+def title_forms(text):
+    """The normalized title plus its tokens in sorted order, so word order mistakes still match."""
+    normalized = normalize_title(text)
+    if not normalized:
+        return set()
+    return {normalized, ' '.join(sorted(normalized.split()))}
+
+
+def grams(text):
+    padded = f'{" " * (GRAM_SIZE - 1)}{text}{" " * (GRAM_SIZE - 1)}'
+    return Counter(padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1))
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 as soon as it must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def allowed_edits(length):
+    """How many typos a title of this (normalized) length tolerates."""
+    max_edits = getattr(settings, 'GUESS_MATCH_MAX_EDITS', 2)
+    ratio = getattr(settings, 'GUESS_MATCH_EDIT_RATIO', 0.2)
+    return min(max_edits, int(length * ratio))
+
+
+class TitleMatcher:
+    """Trigram index over the normalized titles of the catalog.
+
+    Candidates for a guess are the titles sharing enough trigrams to possibly
+    be within the allowed edit distance (the q-gram count filter); only those
+    are checked with a bounded edit distance. Titles can be added, changed and
+    removed one at a time as the catalog changes.
+    """
+    def __init__(self, movies=()):
+        self.lock = threading.Lock()
+        self.ids_by_form = {}  # normalized form -> movie ids
+        self.forms_by_id = {}  # movie id -> normalized forms
+        self.titles_by_id = {}  # movie id -> raw title, to spot stale entries
+        self.index = {}  # trigram -> normalized forms containing it
+        for movie_id, title in movies:
+            self.add(movie_id, title)
+
+    def add(self, movie_id, title):
+        """Index a movie, replacing whatever was indexed for it before."""
+        with self.lock:
+            self._remove(movie_id)
+            forms = title_forms(title)
+            self.forms_by_id[movie_id] = forms
+            self.titles_by_id[movie_id] = title
+            for form in forms:
+                if form not in self.ids_by_form:
+                    self.ids_by_form[form] = set()
+                    for gram in grams(form):
+                        self.index.setdefault(gram, set()).add(form)
+                self.ids_by_form[form].add(movie_id)
+
+    def remove(self, movie_id):
+        with self.lock:
+            self._remove(movie_id)
+
+    def _remove(self, movie_id):
+        self.titles_by_id.pop(movie_id, None)
+        for form in self.forms_by_id.pop(movie_id, ()):
+            ids = self.ids_by_form[form]
+            ids.discard(movie_id)
+            if not ids:
+                del self.ids_by_form[form]
+                for gram in grams(form):
+                    self.index[gram].discard(form)
+                    if not self.index[gram]:
+                        del self.index[gram]
+
+    def within(self, form, limit):
+        """Indexed forms no more than `limit` edits away from `form`.
+
+        Each edit touches at most GRAM_SIZE trigrams of `form`, so any title
+        within `limit` edits must contain at least one of any limit * GRAM_SIZE + 1
+        of its trigrams. Only the posting lists of that many of the rarest
+        trigrams are read, and the few titles found are verified directly.
+        """
+        if limit <= 0:
+            return [form] if form in self.ids_by_form else []
+        query = sorted(grams(form), key=lambda gram: len(self.index.get(gram, ())))
+        needed = limit * GRAM_SIZE + 1
+        if len(query) < needed:
+            pool = self.ids_by_form  # Too short to filter on; compare against everything
+        else:
+            pool = set().union(*(self.index.get(gram, ()) for gram in query[:needed]))
+        return [
+            candidate for candidate in pool
+            if abs(len(candidate) - len(form)) <= limit and edit_distance(form, candidate, limit) <= limit
+        ]
+
+    def matches(self, guess, movie):
+        """True if the guess names `movie` within the allowed edits and no other title is closer."""
+        if guess.strip().casefold() == movie.title.strip().casefold():
+            return True  # Even a title with nothing left to compare once normalized, such as '!!!'
+        # Keep the target current even if it was added or renamed in another process
+        if self.titles_by_id.get(movie.id) != movie.title:
+            self.add(movie.id, movie.title)
+        guess_forms = title_forms(guess)
+        with self.lock:
+            target_forms = self.forms_by_id[movie.id]
+            if guess_forms & target_forms:
+                return True
+
+            distance = None
+            for form in guess_forms:
+                for target in target_forms:
+                    bound = min(allowed_edits(len(form)), allowed_edits(len(target)))
+                    d = edit_distance(form, target, bound)
+                    if d <= bound and (distance is None or d < distance):
+                        distance = d
+            if distance is None:
+                return False
+
+            # A typo of the target is still wrong if it is closer to another title
+            for form in guess_forms:
+                for candidate in self.within(form, distance - 1):
+                    if self.ids_by_form[candidate] - {movie.id}:
+                        return False
+        return True
+
+
+_matcher = None
+_matcher_version = None  # Catalog version the matcher was built at
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    """The process-wide matcher, rebuilt from the catalog whenever the catalog version moves.
+
+    As with the autocomplete index, saves in this process patch it at once,
+    and the version catches bulk writes and other workers' saves, so a
+    closer title written elsewhere is not missed. While one thread
+    rebuilds, the others keep matching against the old index.
+    """
+    global _matcher, _matcher_version
+    version = catalog_version()
+    if _matcher is not None and _matcher_version == version:
+        return _matcher
+    if not _matcher_lock.acquire(blocking=_matcher is None):
+        return _matcher
+    try:
+        if _matcher is None or _matcher_version != version:
+            from .models import Movie
+            # Read after the version, so a write in between leaves the matcher behind and it is rebuilt again
+            _matcher = TitleMatcher(Movie.objects.order_by().values_list('id', 'title').iterator())
+            _matcher_version = version
+    finally:
+        _matcher_lock.release()
+    return _matcher
+
+
+async def aget_matcher():
+    """get_matcher() for async views: building the matcher happens in a worker thread."""
+    if _matcher is not None and _matcher_version == await acatalog_version():
+        return _matcher
+    return await sync_to_async(get_matcher)()
+
+
+def reset_matcher():
+    global _matcher, _matcher_version
+    _matcher = _matcher_version = None
+
+
+def movie_changed(movie):
+    """Patch the matcher after a movie is saved; a no-op until it has been built."""
+    if _matcher is not None:
+        _matcher.add(movie.id, movie.title)
+
+
+def movie_removed(movie_id):
+    if _matcher is not None:
+        _matcher.remove(movie_id)
+
+
+def guess_matches(guess, movie):
+    return get_matcher().matches(guess, movie)
+
+
+async def aguess_matches(guess, movie):
+    return (await aget_matcher()).matches(guess, movie)
@@ -0,0 +1,35 @@
+"""Serve the async variants of the game views to requests that came in over ASGI.
+
+The game views and the JSON catalog endpoints have two versions: the sync
+ones, which WSGI and runserver serve, and async ones (amake_guess, ...)
+that wait on the database, session and game store without holding a
+worker thread. With ASGI_URLCONF set, this middleware routes requests an
+ASGI server handed in through that URLconf, which maps the same URLs and
+names to the async views. Everything else keeps ROOT_URLCONF. With the
+setting unset, the middleware removes itself at startup.
+"""
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.decorators import sync_and_async_middleware
+
+
+@sync_and_async_middleware
+def asgi_urlconf_middleware(get_response):
+    urlconf = getattr(settings, 'ASGI_URLCONF', None)
+    if not urlconf:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if isinstance(request, ASGIRequest):
+                request.urlconf = urlconf
+            return await get_response(request)
+    else:
+        # Under ASGI too when a sync-only middleware sits below this one
+        def middleware(request):
+            if isinstance(request, ASGIRequest):
+                request.urlconf = urlconf
+            return get_response(request)
+    return middleware
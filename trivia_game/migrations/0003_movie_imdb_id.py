@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trivia_game", "0002_easytrivia_hardtrivia_mediumtrivia_productioncompany_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="fetched_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="imdb_id",
+            field=models.CharField(blank=True, max_length=12, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trivia_game", "0003_movie_imdb_id"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(fields=["title", "id"], name="movie_title_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(fields=["imdb_rating", "title", "id"], name="movie_rating_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(fields=["-imdb_rating", "title", "id"], name="movie_rating_desc_idx"),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trivia_game", "0004_movie_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Trivia",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "difficulty",
+                    models.CharField(
+                        choices=[("E", "Easy"), ("M", "Medium"), ("H", "Hard")],
+                        max_length=1,
+                    ),
+                ),
+                ("trivia_fact", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trivia",
+                        to="trivia_game.movie",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Trivia",
+                "ordering": ["created_at", "id"],
+                "indexes": [
+                    models.Index(fields=["movie", "difficulty"], name="trivia_movie_difficulty_idx")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Old per-difficulty table -> difficulty code in the combined table
+SOURCES = [("EasyTrivia", "E"), ("MediumTrivia", "M"), ("HardTrivia", "H")]
+COLUMNS = "movie_id, trivia_fact, created_at, updated_at"
+
+
+def copy_into_trivia(apps, schema_editor):
+    """Copy every row across with one INSERT ... SELECT per table, keeping its timestamps."""
+    quote = schema_editor.quote_name
+    trivia = quote(apps.get_model("trivia_game", "Trivia")._meta.db_table)
+    for model_name, difficulty in SOURCES:
+        source = quote(apps.get_model("trivia_game", model_name)._meta.db_table)
+        schema_editor.execute(
+            f"INSERT INTO {trivia} (difficulty, {COLUMNS}) "
+            f"SELECT %s, {COLUMNS} FROM {source} ORDER BY id",
+            [difficulty],
+        )
+
+
+def copy_back(apps, schema_editor):
+    quote = schema_editor.quote_name
+    trivia = quote(apps.get_model("trivia_game", "Trivia")._meta.db_table)
+    for model_name, difficulty in SOURCES:
+        target = quote(apps.get_model("trivia_game", model_name)._meta.db_table)
+        schema_editor.execute(
+            f"INSERT INTO {target} ({COLUMNS}) "
+            f"SELECT {COLUMNS} FROM {trivia} WHERE difficulty = %s ORDER BY id",
+            [difficulty],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trivia_game", "0005_trivia"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_into_trivia, copy_back),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trivia_game", "0006_copy_trivia"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name="EasyTrivia",
+        ),
+        migrations.DeleteModel(
+            name="HardTrivia",
+        ),
+        migrations.DeleteModel(
+            name="MediumTrivia",
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models import Count
+
+# Models whose names become unique, with the Movie relation pointing at them
+NAMED_MODELS = [("Director", "director"), ("Studio", "studio"), ("Actor", "actors")]
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Fold every group of same-named rows into the oldest one before the unique constraint goes on.
+
+    Duplicates are found with the database's own GROUP BY, so names its
+    collation considers equal (e.g. differing only in case on MySQL) are
+    merged too, exactly as the unique index will treat them.
+    """
+    Movie = apps.get_model("trivia_game", "Movie")
+    for model_name, field_name in NAMED_MODELS:
+        model = apps.get_model("trivia_game", model_name)
+        field = Movie._meta.get_field(field_name)
+        duplicated = (
+            model.objects.values("name").annotate(rows=Count("id")).filter(rows__gt=1)
+            .values_list("name", flat=True)
+        )
+        for name in list(duplicated):
+            keep, *extras = model.objects.filter(name=name).order_by("id").values_list("id", flat=True)
+            if field.many_to_many:
+                through = field.remote_field.through
+                column = field.m2m_reverse_field_name()
+                # A movie linked to several copies keeps only its first link, then
+                # the rest are repointed in place so billing order is unchanged
+                seen, drop = set(), []
+                links = through.objects.filter(**{f"{column}_id__in": [keep, *extras]}).order_by("id")
+                for link_id, movie_id in links.values_list("id", "movie_id"):
+                    if movie_id in seen:
+                        drop.append(link_id)
+                    seen.add(movie_id)
+                through.objects.filter(id__in=drop).delete()
+                through.objects.filter(**{f"{column}_id__in": extras}).update(**{f"{column}_id": keep})
+            else:
+                Movie.objects.filter(**{f"{field_name}_id__in": extras}).update(**{f"{field_name}_id": keep})
+            model.objects.filter(id__in=extras).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trivia_game", "0007_delete_easytrivia_hardtrivia_mediumtrivia"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trivia_game", "0008_merge_duplicate_names"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="actor",
+            name="name",
+            field=models.CharField(max_length=200, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="director",
+            name="name",
+            field=models.CharField(max_length=200, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="studio",
+            name="name",
+            field=models.CharField(max_length=200, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(fields=["-release_date"], name="movie_release_date_idx"),
+        ),
+    ]
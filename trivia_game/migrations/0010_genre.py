@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trivia_game", "0009_unique_names_release_date_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Genre",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="genres",
+            field=models.ManyToManyField(blank=True, related_name="movies", to="trivia_game.genre"),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def split_genres(text):
+    # Frozen copy of importer.split_genres
+    names = (name.strip()[:50] for name in text.split(","))
+    return list(dict.fromkeys(name for name in names if name and name.lower() != "unknown"))
+
+
+def link_genres(apps, schema_editor):
+    """Split every "Crime, Drama" string into rows of the genres relation."""
+    Genre = apps.get_model("trivia_game", "Genre")
+    Movie = apps.get_model("trivia_game", "Movie")
+    Through = Movie.genres.through
+
+    movie_genres = [
+        (movie_id, split_genres(genre))
+        for movie_id, genre in Movie.objects.order_by().values_list("id", "genre").iterator()
+    ]
+    names = {name for _, genre_names in movie_genres for name in genre_names}
+    Genre.objects.bulk_create([Genre(name=name) for name in names], ignore_conflicts=True)
+    # Read ids back case-insensitively, as the unique index may have folded "Sci-Fi" and "sci-fi"
+    genre_ids = {name.lower(): pk for name, pk in Genre.objects.values_list("name", "pk")}
+
+    links = []
+    for movie_id, genre_names in movie_genres:
+        for genre_id in dict.fromkeys(genre_ids[name.lower()] for name in genre_names):
+            links.append(Through(movie_id=movie_id, genre_id=genre_id))
+    Through.objects.bulk_create(links, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trivia_game", "0010_genre"),
+    ]
+
+    operations = [
+        migrations.RunPython(link_genres, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trivia_game", "0011_split_genres"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 class Studio(models.Model):
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, unique=True)
     address = models.TextField(blank=True)  # Made optional
 
     def __str__(self):
@@ -12,19 +12,31 @@ class Studio(models.Model):
         verbose_name_plural = "Studios"
 
 class Director(models.Model):
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, unique=True)
     debut_movie = models.CharField(max_length=200, blank=True)  # Made optional
 
     def __str__(self):
         return self.name
 
 class Actor(models.Model):
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, unique=True)
+
+    def __str__(self):
+        return self.name
+
+class Genre(models.Model):
+    name = models.CharField(max_length=50, unique=True)
 
     def __str__(self):
         return self.name
 
+    class Meta:
+        ordering = ['name']
+
 class Movie(models.Model):
+    imdb_id = models.CharField(max_length=12, unique=True, null=True, blank=True)  # e.g. tt0111161, empty for hand-added movies
+    fetched_at = models.DateTimeField(null=True, blank=True)  # Last time the row was loaded from IMDb
+    updated_at = models.DateTimeField(auto_now=True)  # Last change to anything movie_info shows (see signals.py)
     title = models.CharField(max_length=200)
     release_date = models.IntegerField(
         validators=[
@@ -32,7 +44,8 @@ class Movie(models.Model):
             MaxValueValidator(2030)   # Future releases
         ]
     )
-    genre = models.CharField(max_length=100)
+    genre = models.CharField(max_length=100)  # Display label, e.g. "Crime, Drama"; filter on genres
+    genres = models.ManyToManyField(Genre, related_name='movies', blank=True)
     studio = models.ForeignKey(Studio, on_delete=models.SET_NULL, null=True, blank=True)
     director = models.ForeignKey(Director, on_delete=models.SET_NULL, null=True, blank=True)
     actors = models.ManyToManyField(Actor, related_name='movies', blank=True)
@@ -50,6 +63,14 @@ class Movie(models.Model):
 
     class Meta:
         ordering = ['-release_date']
+        indexes = [
+            # Keyset pagination for the chooser's title and rating sorts
+            models.Index(fields=['title', 'id'], name='movie_title_idx'),
+            models.Index(fields=['imdb_rating', 'title', 'id'], name='movie_rating_idx'),
+            models.Index(fields=['-imdb_rating', 'title', 'id'], name='movie_rating_desc_idx'),
+            # Default ordering
+            models.Index(fields=['-release_date'], name='movie_release_date_idx'),
+        ]
 
 class ProductionCompany(models.Model):
     name = models.CharField(max_length=200)
@@ -63,41 +84,29 @@ class ProductionCompany(models.Model):
     class Meta:
         verbose_name_plural = "Production Companies"
 
-class EasyTrivia(models.Model):
-    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='easy_trivia')
+class Trivia(models.Model):
+    EASY = 'E'
+    MEDIUM = 'M'
+    HARD = 'H'
+    DIFFICULTY_CHOICES = [
+        (EASY, 'Easy'),
+        (MEDIUM, 'Medium'),
+        (HARD, 'Hard'),
+    ]
+
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='trivia')
+    difficulty = models.CharField(max_length=1, choices=DIFFICULTY_CHOICES)
     trivia_fact = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Easy Trivia for {self.movie.title}"
+        return f"{self.get_difficulty_display()} Trivia for {self.movie.title}"
 
     class Meta:
-        verbose_name_plural = "Easy Trivia"
-        ordering = ['created_at']
-
-class MediumTrivia(models.Model):
-    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='medium_trivia')
-    trivia_fact = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-
-    def __str__(self):
-        return f"Medium Trivia for {self.movie.title}"
-
-    class Meta:
-        verbose_name_plural = "Medium Trivia"
-        ordering = ['created_at']
-
-class HardTrivia(models.Model):
-    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='hard_trivia')
-    trivia_fact = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-
-    def __str__(self):
-        return f"Hard Trivia for {self.movie.title}"
-
-    class Meta:
-        verbose_name_plural = "Hard Trivia"
-        ordering = ['created_at']
+        verbose_name_plural = "Trivia"
+        ordering = ['created_at', 'id']
+        indexes = [
+            # All of a movie's trivia, or one difficulty of it, in a single index range
+            models.Index(fields=['movie', 'difficulty'], name='trivia_movie_difficulty_idx'),
+        ]
@@ -0,0 +1,79 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete, hints, matching
+from .catalog_cache import bump_catalog_version
+from .models import Actor, Director, Genre, Movie, ProductionCompany, Studio, Trivia
+
+
+@receiver(post_save, sender=Movie)
+def movie_saved(sender, instance, **kwargs):
+    matching.movie_changed(instance)
+    autocomplete.movie_changed(instance)
+    hints.movie_changed(instance.id)
+
+
+@receiver(post_delete, sender=Movie)
+def movie_deleted(sender, instance, **kwargs):
+    matching.movie_removed(instance.id)
+    autocomplete.movie_removed(instance.id)
+    hints.movie_changed(instance.id)
+
+
+@receiver(post_save, sender=Trivia)
+@receiver(post_delete, sender=Trivia)
+def trivia_changed(sender, instance, **kwargs):
+    hints.movie_changed(instance.movie_id)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Actor)
+@receiver(post_delete, sender=Actor)
+@receiver(post_save, sender=Director)
+@receiver(post_delete, sender=Director)
+@receiver(post_save, sender=Studio)
+@receiver(post_delete, sender=Studio)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=ProductionCompany)
+@receiver(post_delete, sender=ProductionCompany)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.genres.through)
+def catalog_links_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_catalog_version()
+
+
+def touch_movies(movies):
+    """Move the updated_at of movies whose info page shows something that changed elsewhere"""
+    movies.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Director)
+@receiver(pre_delete, sender=Director)
+@receiver(post_save, sender=Studio)
+@receiver(pre_delete, sender=Studio)
+@receiver(post_save, sender=Actor)
+@receiver(pre_delete, sender=Actor)
+def credit_changed(sender, instance, created=False, **kwargs):
+    # pre_delete: the links and foreign keys are still there to find the movies by
+    if not created:
+        touch_movies(instance.movies.all() if sender is Actor else instance.movie_set.all())
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+def movie_actors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch_movies(Movie.objects.filter(pk=instance.pk))
+    elif pk_set is None:  # actor.movies.clear()
+        touch_movies(instance.movies.all())
+    else:
+        touch_movies(Movie.objects.filter(pk__in=pk_set))
@@ -7,6 +7,34 @@ document.addEventListener('DOMContentLoaded', function() {
         // Remove any existing event listeners
         const newForm = form.cloneNode(true);
         form.parentNode.replaceChild(newForm, form);
+
+        // Suggest catalog titles as the guesser types
+        const guessInput = document.getElementById('guess');
+        const suggestions = document.getElementById('guess-suggestions');
+        let latestQuery = '';
+        guessInput.addEventListener('input', async function() {
+            const query = this.value.trim();
+            latestQuery = query;
+            if (!query) {
+                suggestions.innerHTML = '';
+                return;
+            }
+            try {
+                const response = await fetch(`${autocompleteUrl}?q=${encodeURIComponent(query)}`);
+                const data = await response.json();
+                if (query !== latestQuery) {
+                    return;
+                }
+                suggestions.innerHTML = '';
+                data.suggestions.forEach(title => {
+                    const option = document.createElement('option');
+                    option.value = title;
+                    suggestions.appendChild(option);
+                });
+            } catch (error) {
+                console.error('Error:', error);
+            }
+        });
         
         newForm.addEventListener('submit', async function(e) {
             e.preventDefault();
@@ -0,0 +1,41 @@
+from django import template
+
+from ..catalog_cache import cached_fragment
+
+register = template.Library()
+
+
+class CatalogCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        return cached_fragment(self.name.resolve(context), vary_on, lambda: self.nodelist.render(context))
+
+
+@register.tag('catalog_cache')
+def do_catalog_cache(parser, token):
+    """
+    Cache the contents of a template fragment until the catalog changes.
+
+    Usage::
+
+        {% load catalog_cache %}
+        {% catalog_cache 'movie_list' sort genre %}
+            .. some expensive processing ..
+        {% endcatalog_cache %}
+
+    Like {% cache %}, but keyed by the catalog version instead of expiring
+    after a timeout. Lazy context values (querysets, callables) are only
+    evaluated on a miss. Never put a {% csrf_token %} or anything else that
+    depends on the user inside the fragment.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least one argument.")
+    nodelist = parser.parse(('endcatalog_cache',))
+    parser.delete_first_token()
+    return CatalogCacheNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]])
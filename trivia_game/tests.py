@@ -1,3 +1,1568 @@
-from django.test import TestCase
+import csv
+import functools
+import gzip
+import json
+import multiprocessing
+import os
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .autocomplete import PrefixIndex, reset_index
+from .catalog import genre_counts, random_movie_id, search_movies
+from .checks import check_catalog_cache
+from . import catalog_cache, hints, views
+from .export import export_lines
+from .file_cache import SweepingFileCache
+from .game_store import GameStateStore, get_store
+from .imdb_cache import ResponseCache
+from .importer import BulkMovieWriter, load_ids, parse_imdb_movie, split_genres
+from .instrumentation import QueryRecorder, stats as request_stats
+from .loadtest import remove_seeded, seed_catalog
+from .matching import TitleMatcher, guess_matches, normalize_title, reset_matcher
+from .management.commands.fetch_imdb_data import TokenBucket
+from .models import Actor, Director, Genre, Movie, ProductionCompany, Studio, Trivia
+
+
+# Keeps game state and the catalog cache in memory during tests instead of the
+# file caches in the project directory, which would outlive the test database
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'game_state': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'game-state'},
+    'catalog': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'catalog'},
+}
+test_caches = override_settings(CACHES=TEST_CACHES)
+
+
+def setUpModule():
+    test_caches.enable()
+
+
+def tearDownModule():
+    test_caches.disable()
+
+
+def current_game(client):
+    return get_store().get(client.session['game_id'])
+
+
+class FakeTopMovie(dict):
+    def __init__(self, movie_id, title):
+        super().__init__(title=title)
+        self.movie_id = movie_id
+
+    def getID(self):
+        return self.movie_id
+
+
+class FakeCinemagoer:
+    """Stands in for imdb.Cinemagoer so the importer runs without network access."""
+    catalog = {
+        f'{n:07d}': {
+            'title': f'Movie {n}',
+            'year': 1990 + n,
+            'genres': ['Drama', 'Crime'],
+            'rating': 8.0,
+            'production companies': [f'Studio {n % 2}'],
+            'directors': [f'Director {n % 3}'],
+            'cast': [f'Actor {n}', 'Shared Actor'],
+        }
+        for n in range(1, 9)
+    }
+    calls = []
+
+    def get_top250_movies(self):
+        return [FakeTopMovie(movie_id, data['title']) for movie_id, data in self.catalog.items()]
+
+    def get_movie(self, movie_id):
+        self.calls.append(movie_id)
+        return self.catalog[movie_id]
+
+
+@mock.patch('trivia_game.management.commands.fetch_imdb_data.imdb.Cinemagoer', FakeCinemagoer)
+class FetchImdbDataTests(TestCase):
+    def setUp(self):
+        FakeCinemagoer.calls = []
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('fetch_imdb_data', '--cache-dir', self.cache_dir.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_concurrent_fetch_imports_every_movie(self):
+        output = self.run_command('--count', '6', '--workers', '4', '--rate', '0')
+        self.assertEqual(len(FakeCinemagoer.calls), 6)
+        self.assertEqual(Movie.objects.count(), 6)
+        self.assertEqual(Movie.objects.get(title='Movie 3').actors.count(), 2)
+        self.assertIn('Successfully imported 6/6 movies', output)
+        self.assertIn('Stage timings:', output)
+
+    def test_sequential_mode_still_works(self):
+        self.run_command('--count', '2', '--rate', '0')
+        self.assertEqual(Movie.objects.count(), 2)
+
+    def test_batched_writes_reuse_existing_names(self):
+        Actor.objects.create(name='Shared Actor')
+        self.run_command('--count', '8', '--rate', '0', '--chunk-size', '3')
+        self.assertEqual(Actor.objects.filter(name='Shared Actor').count(), 1)
+        self.assertEqual(Studio.objects.count(), 2)
+        self.assertEqual(Director.objects.count(), 3)
+        self.assertEqual(Movie.actors.through.objects.count(), 16)
+
+    def test_query_count_does_not_grow_per_movie(self):
+        counts = []
+        for count in ('4', '8'):
+            for model in (Movie, Actor, Director, Studio, Genre):
+                model.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                self.run_command('--count', count, '--rate', '0', '--chunk-size', '8')
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertLess(counts[1], 8 * 3)
+
+    def test_rerun_upserts_instead_of_duplicating(self):
+        self.run_command('--count', '4', '--rate', '0')
+        output = self.run_command('--count', '4', '--rate', '0')
+        self.assertEqual(Movie.objects.count(), 4)
+        self.assertEqual(len(FakeCinemagoer.calls), 4)
+        self.assertIn('Skipping 4 movies', output)
+
+    def test_refresh_older_than_refetches_only_stale_rows(self):
+        self.run_command('--count', '4', '--rate', '0')
+        Movie.objects.filter(imdb_id='tt0000001').update(
+            fetched_at=timezone.now() - timedelta(days=30), title='Stale'
+        )
+        FakeCinemagoer.calls = []
+        self.run_command('--count', '4', '--rate', '0', '--refresh-older-than', '7', '--no-cache')
+        self.assertEqual(FakeCinemagoer.calls, ['0000001'])
+        self.assertEqual(Movie.objects.get(imdb_id='tt0000001').title, 'Movie 1')
+        self.assertEqual(Movie.objects.count(), 4)
+
+    def test_repeat_fetches_are_served_from_cache(self):
+        self.run_command('--count', '3', '--rate', '0')
+        FakeCinemagoer.calls = []
+        output = self.run_command('--count', '3', '--rate', '0', '--refresh-older-than', '0')
+        self.assertEqual(FakeCinemagoer.calls, [])
+        self.assertIn('IMDb response cache: 4 hits, 0 misses', output)
+
+    def test_no_cache_always_fetches(self):
+        self.run_command('--count', '3', '--rate', '0')
+        FakeCinemagoer.calls = []
+        output = self.run_command('--count', '3', '--rate', '0', '--refresh-older-than', '0', '--no-cache')
+        self.assertEqual(len(FakeCinemagoer.calls), 3)
+        self.assertNotIn('IMDb response cache', output)
+
+    def test_resumes_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'checkpoint.json')
+            with open(path, 'w') as f:
+                json.dump({'movie_ids': ['0000001', '0000002', '0000003'], 'done': ['0000001']}, f)
+            self.run_command('--count', '8', '--rate', '0', '--checkpoint', path)
+            self.assertEqual(sorted(FakeCinemagoer.calls), ['0000002', '0000003'])
+            self.assertFalse(os.path.exists(path))
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_round_trip_and_stats(self):
+        cache = ResponseCache(self.tmp.name)
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', {'title': 'Alpha'})
+        self.assertEqual(ResponseCache(self.tmp.name).get('key'), {'title': 'Alpha'})
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+    def test_expired_entries_are_dropped(self):
+        cache = ResponseCache(self.tmp.name, ttl=-1)
+        cache.set('key', 'value')
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.expired, 1)
+        self.assertEqual(cache.size, 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResponseCache(self.tmp.name, max_bytes=2500)
+        cache.set('old', 'x' * 1000)
+        cache.set('recent', 'x' * 1000)
+        os.utime(cache.path_for('old'), (1, 1))
+        cache.set('new', 'x' * 1000)
+        self.assertIsNone(cache.get('old'))
+        self.assertIsNotNone(cache.get('recent'))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_eviction_skips_entries_removed_after_listing(self):
+        cache = ResponseCache(self.tmp.name, max_bytes=2500)
+        cache.set('old', 'x' * 1000)
+        cache.set('recent', 'x' * 1000)
+        vanished = cache.path_for('gone')  # Listed, then removed by another process
+        listed = [vanished, *cache.entries()]
+        with mock.patch.object(cache, 'entries', return_value=listed):
+            cache.set('new', 'x' * 1000)
+        self.assertEqual(cache.evictions, 1)
+        with mock.patch.object(ResponseCache, 'entries', return_value=[vanished, *cache.entries()]):
+            self.assertEqual(ResponseCache(self.tmp.name).size, cache.size)
+
+    def test_hit_on_entry_evicted_after_reading(self):
+        cache = ResponseCache(self.tmp.name)
+        cache.set('key', 'value')
+        with mock.patch('trivia_game.imdb_cache.os.utime', side_effect=FileNotFoundError):
+            self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.hits, 1)
+
+
+DATASET_FIXTURES = {
+    'title.basics': [
+        ('tconst', 'titleType', 'primaryTitle', 'originalTitle', 'isAdult', 'startYear', 'endYear', 'runtimeMinutes', 'genres'),
+        ('tt0000001', 'movie', 'Alpha', 'Alpha', '0', '1994', '\\N', '142', 'Crime,Drama,Thriller,Mystery'),
+        ('tt0000002', 'tvSeries', 'Beta Show', 'Beta Show', '0', '2001', '2005', '45', 'Comedy'),
+        ('tt0000003', 'movie', 'Gamma', 'Gamma', '0', '\\N', '\\N', '90', 'Drama'),
+        ('tt0000004', 'movie', 'Delta', 'Delta', '0', '2010', '\\N', '100', '\\N'),
+        ('tt0000005', 'movie', 'Obscure', 'Obscure', '0', '2012', '\\N', '80', 'Horror'),
+        ('tt10000001', 'movie', 'Epsilon', 'Epsilon', '0', '2020', '\\N', '120', 'Action'),
+    ],
+    'title.ratings': [
+        ('tconst', 'averageRating', 'numVotes'),
+        ('tt0000001', '9.3', '2500000'),
+        ('tt0000002', '8.0', '90000'),
+        ('tt0000003', '7.0', '5000'),
+        ('tt0000004', '6.5', '1200'),
+        ('tt0000005', '5.0', '10'),
+        ('tt10000001', '7.7', '3000'),
+    ],
+    'title.principals': [
+        ('tconst', 'ordering', 'nconst', 'category', 'job', 'characters'),
+        ('tt0000001', '1', 'nm0000002', 'actor', '\\N', '\\N'),
+        ('tt0000001', '2', 'nm0000003', 'actress', '\\N', '\\N'),
+        ('tt0000001', '3', 'nm0000001', 'director', '\\N', '\\N'),
+        ('tt0000001', '4', 'nm0000004', 'composer', '\\N', '\\N'),
+        ('tt0000004', '1', 'nm0000003', 'actress', '\\N', '\\N'),
+        ('tt10000001', '1', 'nm0000002', 'actor', '\\N', '\\N'),
+    ],
+    'name.basics': [
+        ('nconst', 'primaryName', 'birthYear', 'deathYear', 'primaryProfession', 'knownForTitles'),
+        ('nm0000001', 'Frank Director', '1959', '\\N', 'director', 'tt0000001'),
+        ('nm0000002', 'Tim Lead', '1958', '\\N', 'actor', 'tt0000001'),
+        ('nm0000003', 'Morgan Second', '1937', '\\N', 'actress', 'tt0000001'),
+        ('nm0000004', 'Thomas Composer', '1955', '\\N', 'composer', 'tt0000001'),
+    ],
+}
+
+
+class LoadImdbDatasetsTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for name, rows in DATASET_FIXTURES.items():
+            with gzip.open(os.path.join(self.tmp.name, f'{name}.tsv.gz'), 'wt', encoding='utf-8') as f:
+                f.writelines('\t'.join(row) + '\n' for row in rows)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('load_imdb_datasets', self.tmp.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_loads_filtered_movies(self):
+        output = self.run_command('--min-votes', '1000', '--progress-every', '2')
+        self.assertEqual(
+            sorted(Movie.objects.values_list('imdb_id', flat=True)),
+            ['tt0000001', 'tt0000004', 'tt10000001'],
+        )
+        alpha = Movie.objects.get(imdb_id='tt0000001')
+        self.assertEqual(alpha.genre, 'Crime, Drama, Thriller')
+        self.assertEqual(alpha.release_date, 1994)
+        self.assertEqual(alpha.director.name, 'Frank Director')
+        self.assertEqual(sorted(alpha.actors.values_list('name', flat=True)), ['Morgan Second', 'Tim Lead'])
+        self.assertEqual(Movie.objects.get(imdb_id='tt0000004').genre, 'Unknown')
+        self.assertFalse(Actor.objects.filter(name='Thomas Composer').exists())
+        self.assertIn('rows/s', output)
+
+    def test_title_type_filter_and_rerun(self):
+        self.run_command('--title-type', 'tvSeries', '--min-votes', '0')
+        self.run_command('--title-type', 'tvSeries', '--min-votes', '0')
+        self.assertEqual(list(Movie.objects.values_list('title', flat=True)), ['Beta Show'])
+
+
+class MovieSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for n, (title, rating) in enumerate([
+            ('The Godfather', '9.2'), ('Godzilla', '6.4'), ('Alien', '8.5'), ('Aliens', '8.4'),
+            ('Heat', '8.3'), ('Gladiator', '8.5'), ('Up', '8.3'), ('Zodiac', '7.7'),
+        ]):
+            Movie.objects.create(title=title, release_date=1970 + n, genre='Drama', imdb_rating=rating)
+
+    def fetch_all(self, **params):
+        titles, cursor = [], None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(reverse('movie_search'), {**params, 'limit': 3}).json()
+            titles += [movie['title'] for movie in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                return titles
+
+    def test_pages_through_every_sort_without_gaps(self):
+        self.assertEqual(self.fetch_all(), sorted(Movie.objects.values_list('title', flat=True)))
+        self.assertEqual(
+            self.fetch_all(sort='highest'),
+            list(Movie.objects.order_by('-imdb_rating', 'title').values_list('title', flat=True)),
+        )
+        self.assertEqual(
+            self.fetch_all(sort='lowest'),
+            list(Movie.objects.order_by('imdb_rating', 'title').values_list('title', flat=True)),
+        )
+
+    def test_prefix_and_substring_search(self):
+        self.assertEqual(self.fetch_all(q='god', match='prefix'), ['Godzilla'])
+        self.assertEqual(self.fetch_all(q='god'), ['Godzilla', 'The Godfather'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('movie_search'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_chooser_renders_only_the_first_page(self):
+        Movie.objects.bulk_create(
+            Movie(title=f'Filler {n:02d}', release_date=2000, genre='Drama', imdb_rating='5.0') for n in range(30)
+        )
+        response = self.client.get(reverse('choose_movie'))
+        self.assertEqual(len(response.context['movies']), 25)
+        self.assertTrue(response.context['next_cursor'])
+
+
+class GuessMatchingTests(TestCase):
+    def setUp(self):
+        self.matcher = TitleMatcher()
+        self.movies = {}
+        for movie_id, title in enumerate(['The Godfather', 'Alien', 'Aliens', 'Up', 'Amélie', 'Kill Bill: Vol. 1'], 1):
+            self.matcher.add(movie_id, title)
+            self.movies[title] = Movie(id=movie_id, title=title)
+
+    def assertMatches(self, guess, title, expected=True):
+        self.assertEqual(self.matcher.matches(guess, self.movies[title]), expected, f'{guess!r} vs {title!r}')
+
+    def test_normalization(self):
+        self.assertEqual(normalize_title('  The Lord of the Rings: The Two Towers '), 'lord of the rings the two towers')
+        self.assertEqual(normalize_title('Amélie'), 'amelie')
+        self.assertEqual(normalize_title('Амели'), 'амели')
+        self.assertEqual(normalize_title('!!!'), '')
+
+    def test_matches_titles_in_any_script(self):
+        for movie_id, title in ((10, '千と千尋の神隠し'), (11, 'Амели'), (12, '!!!'), (13, 'Λόγος')):
+            self.matcher.add(movie_id, title)
+            self.movies[title] = Movie(id=movie_id, title=title)
+            self.assertMatches(title, title)
+        self.assertMatches('амели', 'Амели')
+        self.assertMatches('Амелт', 'Амели')
+        self.assertMatches('λογος', 'Λόγος')
+        self.assertMatches('千と千尋', '千と千尋の神隠し', False)
+        self.assertMatches('?', '!!!', False)
+
+    def test_accepts_close_guesses(self):
+        self.assertMatches('godfather', 'The Godfather')
+        self.assertMatches('The Godfathr', 'The Godfather')
+        self.assertMatches('amelie', 'Amélie')
+        self.assertMatches('Vol 1 Kill Bill', 'Kill Bill: Vol. 1')
+
+    def test_rejects_wrong_guesses(self):
+        self.assertMatches('Godzilla', 'The Godfather', False)
+        self.assertMatches('Ux', 'Up', False)
+
+    def test_prefers_a_closer_catalog_title(self):
+        self.assertMatches('Alien', 'Aliens', False)
+        self.assertMatches('Aliens', 'Alien', False)
+        self.assertMatches('Alienss', 'Aliens')
+
+    def test_index_follows_catalog_changes(self):
+        self.matcher.remove(2)
+        self.assertMatches('Alien', 'Aliens')
+        # One typo away from The Godfather, until a title it spells exactly is added
+        self.assertMatches('Godfathers', 'The Godfather')
+        self.matcher.add(7, 'The Godfathers')
+        self.assertMatches('Godfathers', 'The Godfather', False)
+        self.matcher.remove(7)
+        self.assertMatches('Godfathers', 'The Godfather')
+
+    def test_process_matcher_follows_writes_without_signals(self):
+        reset_matcher()
+        movie = Movie.objects.create(title='The Godfather', release_date=1972, genre='Crime', imdb_rating='9.2')
+        self.assertTrue(guess_matches('Godfathers', movie))
+        # As fetch_imdb_data, import_catalog or a save in another worker process
+        Movie.objects.bulk_create([Movie(title='The Godfathers', release_date=2000, genre='Crime', imdb_rating='5.0')])
+        catalog_cache.bump_catalog_version()
+        self.assertFalse(guess_matches('Godfathers', movie))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MakeGuessTests(TestCase):
+    def setUp(self):
+        reset_matcher()
+        self.movie = Movie.objects.create(title='The Shawshank Redemption', release_date=1994, genre='Drama', imdb_rating='9.3')
+        self.client.get(reverse('start_game', args=[self.movie.id]))
+
+    def test_typo_counts_as_correct(self):
+        data = self.client.post(reverse('make_guess'), {'guess': 'shawshank redemtion'}).json()
+        self.assertTrue(data['correct'])
+
+    def test_wrong_guess_uses_an_attempt(self):
+        data = self.client.post(reverse('make_guess'), {'guess': 'Pulp Fiction'}).json()
+        self.assertFalse(data['correct'])
+        self.assertEqual(data['attempts_left'], 8)
+
+    def test_choosing_an_unknown_movie_redirects_to_chooser(self):
+        for movie_id in ('abc', '-1', str(self.movie.id + 1)):
+            response = self.client.post(reverse('choose_movie'), {'movie_id': movie_id}, follow=True)
+            self.assertRedirects(response, reverse('choose_movie'))
+            self.assertContains(response, 'That movie is not in the catalog.')
+        # The game already started is left alone
+        self.assertEqual(current_game(self.client)['movie_id'], self.movie.id)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AsyncViewTests(TestCase):
+    """Over ASGI the game and catalog JSON views have async variants; drive them through the ASGI request path."""
+    def setUp(self):
+        reset_matcher()
+        reset_index()
+
+    async def test_game_flow(self):
+        movie = await Movie.objects.acreate(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+        await Trivia.objects.acreate(movie=movie, difficulty=Trivia.HARD, trivia_fact='Pacino and De Niro share a diner scene.')
+        response = await self.async_client.get(reverse('start_game', args=[movie.id]))
+        self.assertRedirects(response, reverse('play_game', args=[movie.id]), fetch_redirect_response=False)
+
+        response = await self.async_client.get(reverse('play_game_continue'))
+        self.assertContains(response, 'Pacino and De Niro share a diner scene.')
+        data = (await self.async_client.post(reverse('make_guess'), {'guess': 'Alien'})).json()
+        self.assertEqual((data['correct'], data['attempts_left']), (False, 8))
+        self.assertTrue(data['new_trivia'])
+        data = (await self.async_client.post(reverse('make_guess'), {'guess': 'heat'})).json()
+        self.assertTrue(data['correct'])
+        self.assertEqual(await self.async_client.session.aget('recent_movies'), [movie.id])
+
+    async def test_guess_while_the_hint_memo_evicts_the_movie(self):
+        movie = await Movie.objects.acreate(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+        await Trivia.objects.acreate(movie=movie, difficulty=Trivia.HARD, trivia_fact='Pacino and De Niro share a diner scene.')
+        await self.async_client.get(reverse('start_game', args=[movie.id]))
+        memo_get = hints.memo.get
+
+        def get_then_evict(movie_id, refs):
+            texts = memo_get(movie_id, refs)
+            hints.memo.forget(movie_id)  # Other games push the movie out right after
+            return texts
+
+        with mock.patch.object(hints.memo, 'get', get_then_evict):
+            response = await self.async_client.post(reverse('make_guess'), {'guess': 'Alien'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['new_trivia'])
+        # A miss rebuilds the texts from the movie, loaded through the async ORM
+        response = await self.async_client.post(reverse('make_guess'), {'guess': 'Alien'})
+        self.assertEqual((response.status_code, response.json()['attempts_left']), (200, 7))
+
+    async def test_random_start_skips_recent_movies(self):
+        first = await Movie.objects.acreate(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+        second = await Movie.objects.acreate(title='Alien', release_date=1979, genre='Horror', imdb_rating='8.5')
+        await self.async_client.get(reverse('start_game', args=[first.id]))
+        response = await self.async_client.get(reverse('start_game_random'))
+        self.assertRedirects(response, reverse('play_game', args=[second.id]), fetch_redirect_response=False)
+
+    async def test_catalog_endpoints(self):
+        await Movie.objects.acreate(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+        await Movie.objects.acreate(title='Heathers', release_date=1988, genre='Comedy', imdb_rating='7.2')
+        data = (await self.async_client.get(reverse('movie_search'), {'q': 'heat', 'limit': 1})).json()
+        self.assertEqual([movie['title'] for movie in data['results']], ['Heat'])
+        self.assertIsNotNone(data['next_cursor'])
+        data = (await self.async_client.get(reverse('autocomplete_titles'), {'q': 'hea'})).json()
+        self.assertEqual(data['suggestions'], ['Heat', 'Heathers'])
+
+    async def test_asgi_requests_get_the_async_views(self):
+        response = await self.async_client.post(reverse('make_guess'), {'guess': 'Heat'})
+        self.assertIs(response.resolver_match.func, views.amake_guess)
+        response = await self.async_client.get(reverse('autocomplete_titles'), {'q': 'hea'})
+        self.assertIs(response.resolver_match.func, views.aautocomplete_titles)
+
+    def test_wsgi_requests_keep_the_sync_views(self):
+        response = self.client.post(reverse('make_guess'), {'guess': 'Heat'})
+        self.assertIs(response.resolver_match.func, views.make_guess)
+        response = self.client.get(reverse('autocomplete_titles'), {'q': 'hea'})
+        self.assertIs(response.resolver_match.func, views.autocomplete_titles)
+
+    @override_settings(ASGI_URLCONF=None)
+    async def test_asgi_urlconf_unset_serves_the_sync_views(self):
+        response = await self.async_client.get(reverse('autocomplete_titles'), {'q': 'hea'})
+        self.assertIs(response.resolver_match.func, views.autocomplete_titles)
+
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CompareInterfacesTests(TransactionTestCase):
+    """Games played from other threads need committed data, hence TransactionTestCase.
+
+    SQLite's in-memory test database locks whole tables, so the tests keep
+    requests from overlapping: one WSGI thread, one ASGI player.
+    """
+    def setUp(self):
+        reset_matcher()
+        reset_index()
+        for title in ('Heat', 'Alien', 'Ran'):
+            Movie.objects.create(title=title, release_date=1990, genre='Drama', imdb_rating='8.0')
+
+    def test_both_interfaces_play_every_game(self):
+        out = StringIO()
+        call_command('compare_wsgi_asgi', '--players', '1', '--threads', '1', stdout=out)
+        rows = {line.split()[0].rstrip(','): line.split() for line in out.getvalue().splitlines()[2:]}
+        self.assertEqual(set(rows), {'wsgi', 'asgi'})
+        for row in rows.values():
+            requests, errors = (int(value) for value in row[-7:-5])
+            self.assertGreaterEqual(requests, 5)  # The chooser, two searches, start and play come first
+            self.assertEqual(errors, 0)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LoadTestTests(TransactionTestCase):
+    """Requests are kept from overlapping, as in CompareInterfacesTests."""
+    def setUp(self):
+        reset_matcher()
+        reset_index()
+
+    def load_test(self, *args):
+        out = StringIO()
+        call_command('load_test', '--seed-movies', '20', '--games', '2', *args, stdout=out, stderr=StringIO())
+        return json.loads(out.getvalue())
+
+    def test_report(self):
+        Movie.objects.create(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+        for args, players in ((['--interface', 'wsgi', '--players', '3', '--threads', '1'], 3),
+                              (['--interface', 'asgi', '--players', '1'], 1)):
+            report = self.load_test(*args, '--label', 'v1.2')
+            self.assertEqual((report['label'], report['catalog_movies'], report['seeded_movies']), ('v1.2', 21, 20))
+            self.assertEqual(report['errors'], 0)
+            self.assertEqual(report['games']['won'] + report['games']['lost'], players * 2)
+            self.assertEqual(
+                set(report['endpoints']),
+                {'choose_movie', 'movie_search', 'autocomplete', 'start_game', 'play_game', 'make_guess', 'game_over'},
+            )
+            self.assertEqual(report['endpoints']['start_game']['requests'], players * 2)
+            self.assertLessEqual(report['endpoints']['make_guess']['p50_ms'], report['endpoints']['make_guess']['p99_ms'])
+        # Synthetic movies are removed afterwards
+        self.assertQuerySetEqual(Movie.objects.values_list('title', flat=True), ['Heat'])
+
+    def test_seeded_rows_are_removed_in_bulk(self):
+        heat = Movie.objects.create(title='Heat', release_date=1995, genre='Drama', imdb_rating='8.3')
+        heat.genres.add(Genre.objects.create(name='Drama'))
+        Actor.objects.create(name='Ava Hale')  # A synthetic name, but not the seeder's row
+        before = {model: set(model.objects.values_list('pk', flat=True)) for model in (Actor, Director, Studio, Genre)}
+        created = seed_catalog(30)
+        self.assertTrue(Actor.objects.filter(name='Ava Hale', movies__isnull=False).exists())
+        self.assertNotIn(Actor.objects.get(name='Ava Hale').pk, created[Actor])
+
+        with mock.patch('trivia_game.catalog_cache._bump') as bump:
+            self.assertEqual(remove_seeded(created), 30)
+        self.assertEqual(bump.call_count, 2)  # Once, and again on commit: no per-row signals
+        self.assertQuerySetEqual(Movie.objects.values_list('title', flat=True), ['Heat'])
+        for model, pks in before.items():
+            self.assertEqual(set(model.objects.values_list('pk', flat=True)), pks)
+        self.assertFalse(Trivia.objects.exists() or ProductionCompany.objects.exists())
+        self.assertEqual(list(heat.genres.values_list('name', flat=True)), ['Drama'])
+
+    def test_seeded_movies_have_trivia(self):
+        self.load_test('--players', '1', '--keep-seeded')
+        movie = Movie.objects.get(imdb_id='ttload000001')
+        self.assertEqual(sorted(movie.trivia.values_list('difficulty', flat=True)), [Trivia.EASY, Trivia.HARD, Trivia.MEDIUM])
+
+@override_settings(CACHES=TEST_CACHES)
+class HintDeckTests(TestCase):
+    def setUp(self):
+        reset_matcher()
+        director = Director.objects.create(name='Frank Darabont')
+        studio = Studio.objects.create(name='Castle Rock')
+        self.movie = Movie.objects.create(
+            title='The Shawshank Redemption', release_date=1994, genre='Drama',
+            imdb_rating='9.3', director=director, studio=studio
+        )
+        self.movie.actors.add(Actor.objects.create(name='Tim Robbins'))
+        Trivia.objects.create(movie=self.movie, difficulty=Trivia.HARD, trivia_fact='Hard fact')
+        Trivia.objects.create(movie=self.movie, difficulty=Trivia.MEDIUM, trivia_fact='Medium fact')
+        Trivia.objects.create(movie=self.movie, difficulty=Trivia.EASY, trivia_fact='Easy fact')
+
+    def revealed(self):
+        return self.client.get(reverse('play_game_continue')).context['revealed_trivia']
+
+    def test_deck_keeps_hint_order_and_difficulty(self):
+        self.client.get(reverse('start_game', args=[self.movie.id]))
+        for _ in range(8):
+            self.client.post(reverse('make_guess'), {'guess': 'Pulp Fiction'})
+        revealed = self.revealed()
+        self.assertEqual(''.join(hint['difficulty'] for hint in revealed), 'HHHMMMEEE')
+        facts = [hint['trivia_fact'] for hint in revealed]
+        self.assertEqual(facts[0], 'Hard fact')
+        self.assertIn('1994', facts[1])
+        self.assertIn('Castle Rock', facts[2])
+        self.assertEqual(facts[3], 'Medium fact')
+        self.assertEqual(facts[6], 'Easy fact')
+        self.assertIn('Tim Robbins', facts[7])
+        self.assertIn('Frank Darabont', facts[8])
+
+    def test_guesses_do_not_query_trivia(self):
+        self.client.get(reverse('start_game', args=[self.movie.id]))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('make_guess'), {'guess': 'Pulp Fiction'})
+        trivia_tables = ('trivia_game_trivia', 'productioncompany', 'actor')
+        self.assertFalse([q['sql'] for q in queries if any(table in q['sql'] for table in trivia_tables)])
+
+    def test_state_stores_hint_references_not_sentences(self):
+        self.client.get(reverse('start_game', args=[self.movie.id]))
+        self.client.post(reverse('make_guess'), {'guess': 'Pulp Fiction'})
+        state = current_game(self.client)
+        self.assertEqual(state['v'], 2)
+        self.assertEqual(state['shown'], [0, 1])
+        self.assertNotIn('Hard fact', json.dumps(state))
+        self.assertEqual(state['deck'][0], [0, Trivia.objects.get(trivia_fact='Hard fact').id])
+
+    def test_hints_are_rebuilt_from_the_movie_when_not_memoized(self):
+        self.client.get(reverse('start_game', args=[self.movie.id]))
+        for _ in range(2):
+            self.client.post(reverse('make_guess'), {'guess': 'Pulp Fiction'})
+        before = self.revealed()
+        hints.memo.clear()
+        self.assertEqual(self.revealed(), before)
+        Studio.objects.filter(name='Castle Rock').update(name='Castle Rock Entertainment')
+        self.movie.save()
+        self.assertIn('Castle Rock Entertainment', self.revealed()[2]['trivia_fact'])
+
+    def test_version_1_state_still_loads(self):
+        deck = [{'trivia_fact': f'Old hint {n}', 'difficulty': 'HHHMMMEEE'[n]} for n in range(9)]
+        session = self.client.session
+        session['game_state'] = {
+            'movie_id': self.movie.id, 'attempts_left': 8, 'used_trivia': ['Old hint 0', 'Old hint 1'],
+            'revealed_trivia': deck[:2], 'hint_deck': deck, 'won': False, 'game_over': False,
+            'first_trivia_shown': True,
+        }
+        session.save()
+        data = self.client.post(reverse('make_guess'), {'guess': 'Pulp Fiction'}).json()
+        self.assertEqual(data['new_trivia'], 'Old hint 2')
+        self.assertEqual(self.revealed(), deck[:3])
+        self.assertEqual(current_game(self.client)['v'], 2)
+
+
+class TriviaTableTests(TestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+
+    def test_edit_movie_round_trip(self):
+        url = reverse('edit_movie', args=[self.movie.id])
+        self.client.post(url, {
+            'title': 'Heat', 'release_date': 1995, 'genre': 'Crime', 'imdb_rating': '8.3',
+            'easy_trivia': 'Easy fact', 'hard_trivia': 'Hard fact',
+        })
+        self.assertEqual(
+            sorted(self.movie.trivia.values_list('difficulty', 'trivia_fact')),
+            [('E', 'Easy fact'), ('H', 'Hard fact')]
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['hard_trivia'].trivia_fact, 'Hard fact')
+        self.assertIsNone(response.context['medium_trivia'])
+        self.assertEqual(len([q for q in queries if 'trivia_game_trivia' in q['sql']]), 1)
+
+
+class BulkEditTests(TestCase):
+    def setUp(self):
+        self.movies = [
+            Movie.objects.create(title=f'Movie {n}', release_date=2000, genre='Drama', imdb_rating='7.0')
+            for n in range(3)
+        ]
+        Trivia.objects.create(movie=self.movies[0], difficulty=Trivia.HARD, trivia_fact='Old hard fact')
+        Trivia.objects.create(movie=self.movies[1], difficulty=Trivia.EASY, trivia_fact='Old easy fact')
+
+    def post(self, patches):
+        return self.client.post(reverse('bulk_edit_movies'), {'patches': patches}, content_type='application/json')
+
+    def test_patches_apply_and_bad_rows_are_reported(self):
+        first, second, third = self.movies
+        response = self.post([
+            {'id': first.id, 'imdb_rating': '8.1', 'genre': 'Crime, Thriller', 'director': 'Michael Mann', 'hard_trivia': 'New hard fact'},
+            {'id': second.id, 'imdb_rating': '7.0', 'easy_trivia': ''},
+            {'id': third.id, 'imdb_rating': '12'},
+            {'id': 999999, 'genre': 'Horror'},
+            {'id': third.id, 'title': 'Renamed'},
+        ]).json()
+        self.assertFalse(response['success'])
+        self.assertEqual((response['updated'], response['failed']), (2, 3))
+        results = response['results']
+        self.assertEqual(results[0]['changed'], ['director', 'genre', 'imdb_rating', 'trivia'])
+        self.assertEqual(results[1]['changed'], ['trivia'])
+        self.assertIn('between 0 and 10', results[2]['error'])
+        self.assertEqual(results[3]['error'], 'no such movie')
+        self.assertEqual(results[4]['error'], 'cannot edit title')
+
+        first.refresh_from_db()
+        self.assertEqual((str(first.imdb_rating), first.director.name), ('8.1', 'Michael Mann'))
+        self.assertEqual(sorted(first.genres.values_list('name', flat=True)), ['Crime', 'Thriller'])
+        self.assertEqual(list(first.trivia.values_list('trivia_fact', flat=True)), ['New hard fact'])
+        self.assertFalse(second.trivia.exists())
+        third.refresh_from_db()
+        self.assertEqual(str(third.imdb_rating), '7.0')
+
+    def test_non_finite_rating_is_reported(self):
+        response = self.post([
+            {'id': self.movies[0].id, 'imdb_rating': 'NaN'},
+            {'id': self.movies[1].id, 'imdb_rating': 'Infinity'},
+            {'id': self.movies[2].id, 'imdb_rating': '6.0'},
+        ]).json()
+        self.assertEqual((response['updated'], response['failed']), (1, 2))
+        self.assertEqual(response['results'][0]['error'], "imdb_rating must be a number, not 'NaN'")
+        self.assertEqual(response['results'][1]['error'], "imdb_rating must be a number, not 'Infinity'")
+        self.assertEqual(str(Movie.objects.get(pk=self.movies[0].id).imdb_rating), '7.0')
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        def edit(movies, rating):
+            patches = [
+                {'id': movie.id, 'imdb_rating': rating, 'genre': f'Genre {rating}', 'studio': f'Studio {rating}',
+                 'medium_trivia': f'Fact {rating}'}
+                for movie in movies
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(self.post(patches).json()['success'])
+            return len(queries)
+
+        self.movies += [
+            Movie.objects.create(title=f'Movie {n}', release_date=2000, genre='Drama', imdb_rating='7.0')
+            for n in range(3, 30)
+        ]
+        edit(self.movies, '5.0')  # Both measured batches update existing trivia
+        self.assertEqual(edit(self.movies[:3], '6.0'), edit(self.movies, '6.5'))
+        self.assertEqual(Movie.objects.filter(imdb_rating='6.5', studio__name='Studio 6.5').count(), 30)
+
+    def test_manage_page_offers_the_editor(self):
+        response = self.client.get(reverse('manage_movies'))
+        self.assertContains(response, f'class="form-check-input me-3 bulk-select" type="checkbox" value="{self.movies[0].id}"')
+        self.assertContains(response, 'data-field="hard_trivia"')
+        self.assertEqual(self.client.get(reverse('bulk_edit_movies')).status_code, 405)
+        self.assertEqual(self.client.post(reverse('bulk_edit_movies'), 'nope', content_type='application/json').status_code, 400)
+
+
+class MigrationTests(TransactionTestCase):
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('trivia_game', target)])
+        return executor.loader.project_state([('trivia_game', target)]).apps
+
+    def test_rows_are_copied_into_one_table(self):
+        apps = self.migrate('0005_trivia')
+        movie = apps.get_model('trivia_game', 'Movie').objects.create(
+            title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3'
+        )
+        for model_name, fact in [('EasyTrivia', 'Easy'), ('MediumTrivia', 'Medium'), ('HardTrivia', 'Hard')]:
+            apps.get_model('trivia_game', model_name).objects.create(movie_id=movie.id, trivia_fact=fact)
+        created_at = apps.get_model('trivia_game', 'HardTrivia').objects.get().created_at
+
+        self.migrate('0007_delete_easytrivia_hardtrivia_mediumtrivia')
+        self.assertEqual(
+            sorted(Trivia.objects.values_list('difficulty', 'trivia_fact')),
+            [('E', 'Easy'), ('H', 'Hard'), ('M', 'Medium')]
+        )
+        self.assertEqual(Trivia.objects.get(difficulty=Trivia.HARD).created_at, created_at)
+
+    def test_genre_strings_are_split(self):
+        apps = self.migrate('0010_genre')
+        Movie = apps.get_model('trivia_game', 'Movie')
+        heat = Movie.objects.create(title='Heat', release_date=1995, genre='Crime, Drama', imdb_rating='8.3')
+        Movie.objects.create(title='Mystery', release_date=1995, genre='Unknown', imdb_rating='5.0')
+
+        self.migrate('0011_split_genres')
+        self.assertEqual(sorted(Movie.objects.get(pk=heat.pk).genres.values_list('name', flat=True)), ['Crime', 'Drama'])
+        self.assertEqual(Movie.genres.through.objects.count(), 2)
+
+    def test_duplicate_names_are_merged(self):
+        apps = self.migrate('0007_delete_easytrivia_hardtrivia_mediumtrivia')
+        Actor, Director, Movie = (apps.get_model('trivia_game', name) for name in ('Actor', 'Director', 'Movie'))
+        first, second = Director.objects.create(name='Ridley Scott'), Director.objects.create(name='Ridley Scott')
+        alien = Movie.objects.create(title='Alien', release_date=1979, genre='Horror', imdb_rating='8.5', director=second)
+        heat = Movie.objects.create(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+        pacino, de_niro, de_niro_again = (Actor.objects.create(name=name) for name in ('Al Pacino', 'Robert De Niro', 'Robert De Niro'))
+        for actor in (de_niro_again, pacino, de_niro):
+            heat.actors.add(actor)
+        alien.actors.add(de_niro_again)
+
+        self.migrate('0009_unique_names_release_date_index')
+        self.assertEqual(list(Director.objects.values_list('id', flat=True)), [first.id])
+        self.assertEqual(Movie.objects.get(title='Alien').director_id, first.id)
+        self.assertEqual(Actor.objects.filter(name='Robert De Niro').count(), 1)
+        # Heat keeps one De Niro link, still billed before Pacino
+        through = Movie.actors.through
+        self.assertEqual(
+            list(through.objects.filter(movie_id=heat.id).order_by('id').values_list('actor_id', flat=True)),
+            [de_niro.id, pacino.id]
+        )
+        self.assertEqual(list(through.objects.filter(movie_id=alien.id).values_list('actor_id', flat=True)), [de_niro.id])
+
+
+class GenreTests(TestCase):
+    def setUp(self):
+        self.heat = Movie.objects.create(title='Heat', release_date=1995, genre='Crime, Drama', imdb_rating='8.3')
+        self.alien = Movie.objects.create(title='Alien', release_date=1979, genre='Horror, Sci-Fi', imdb_rating='8.5')
+        drama, crime, horror = (Genre.objects.create(name=name) for name in ('Drama', 'Crime', 'Horror'))
+        self.heat.genres.add(crime, drama)
+        self.alien.genres.add(horror)
+
+    def test_split_genres(self):
+        self.assertEqual(split_genres('Crime, Drama,Crime'), ['Crime', 'Drama'])
+        self.assertEqual(split_genres('Unknown'), [])
+
+    def test_search_and_counts_use_the_link_table(self):
+        movies, _ = search_movies(genre='Drama')
+        self.assertEqual([movie['title'] for movie in movies], ['Heat'])
+        self.assertEqual(genre_counts(), [('Crime', 1), ('Drama', 1), ('Horror', 1)])
+        response = self.client.get(reverse('movie_search'), {'genre': 'Horror'})
+        self.assertEqual([movie['title'] for movie in response.json()['results']], ['Alien'])
+
+    def test_edit_movie_relinks_genres(self):
+        self.client.post(reverse('edit_movie', args=[self.heat.id]), {
+            'title': 'Heat', 'release_date': 1995, 'genre': 'Crime, Thriller', 'imdb_rating': '8.3',
+        })
+        self.assertEqual(sorted(self.heat.genres.values_list('name', flat=True)), ['Crime', 'Thriller'])
+
+    @mock.patch('trivia_game.management.commands.fetch_imdb_data.imdb.Cinemagoer', FakeCinemagoer)
+    def test_importer_links_genres(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            call_command('fetch_imdb_data', '--count', '3', '--rate', '0', '--cache-dir', cache_dir, stdout=StringIO())
+        movie = Movie.objects.get(title='Movie 2')
+        self.assertEqual(sorted(movie.genres.values_list('name', flat=True)), ['Crime', 'Drama'])
+        self.assertEqual(Genre.objects.filter(name='Drama').count(), 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RandomPickTests(TestCase):
+    def setUp(self):
+        drama = Genre.objects.create(name='Drama')
+        for title, year, rating in [('Heat', 1995, '8.3'), ('Alien', 1979, '8.5'), ('Cats', 2019, '2.8')]:
+            movie = Movie.objects.create(title=title, release_date=year, genre='Drama', imdb_rating=rating)
+            movie.genres.add(drama)
+        Movie.objects.create(title='Airplane!', release_date=1980, genre='Comedy', imdb_rating='7.7')
+
+    def picked_titles(self, **filters):
+        return {Movie.objects.get(pk=random_movie_id(**filters)).title for _ in range(30)}
+
+    def test_filters(self):
+        self.assertEqual(self.picked_titles(genre='Drama', min_rating=8), {'Heat', 'Alien'})
+        self.assertEqual(self.picked_titles(decade=1970), {'Alien'})
+        self.assertIsNone(random_movie_id(genre='Drama', decade=1980))
+
+    def test_few_matches_are_picked_uniformly(self):
+        # A drama after a long run of comedies would win most picks walking from a random id
+        Movie.objects.bulk_create(
+            Movie(title=f'Comedy {n}', release_date=1990, genre='Comedy', imdb_rating='6.0') for n in range(60)
+        )
+        Movie.objects.create(title='Ran', release_date=1985, genre='Drama', imdb_rating='8.2').genres.add(
+            Genre.objects.get(name='Drama')
+        )
+        picks = Counter(random_movie_id(genre='Drama') for _ in range(400))
+        self.assertEqual(len(picks), 4)
+        self.assertGreater(min(picks.values()), 40)
+
+    def test_many_matches_walk_the_ids(self):
+        with mock.patch('trivia_game.catalog.FEW_MATCHES', 1):
+            self.assertEqual(self.picked_titles(genre='Drama', min_rating=8), {'Heat', 'Alien'})
+            heat = Movie.objects.get(title='Heat').id
+            self.assertEqual(self.picked_titles(min_rating=8, exclude=[heat]), {'Alien'})
+            self.assertIsNone(random_movie_id(genre='Drama', decade=1980))
+
+    def test_recent_movies_are_skipped_until_nothing_else_matches(self):
+        url = reverse('start_game_random')
+        played = []
+        for _ in range(3):
+            self.client.get(url, {'genre': 'Drama'})
+            played.append(current_game(self.client)['movie_id'])
+        self.assertEqual(len(set(played)), 3)
+        self.assertEqual(self.client.session['recent_movies'], played[::-1])
+        # Every drama has been played, so one of them comes up again
+        self.client.get(url, {'genre': 'Drama'})
+        self.assertIn(current_game(self.client)['movie_id'], played)
+
+    def test_invalid_filter_redirects_to_chooser(self):
+        response = self.client.get(reverse('start_game_random'), {'min_rating': 'high'})
+        self.assertRedirects(response, reverse('choose_movie'))
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        catalog_cache.stats.reset()
+        self.movie = Movie.objects.create(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+
+    def catalog_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        # Not counting movie_info's updated_at lookup for its ETag
+        return response, [q['sql'] for q in queries if 'trivia_game_' in q['sql'] and 'updated_at' not in q['sql']]
+
+    def test_repeat_visits_are_served_from_the_cache(self):
+        for url in (reverse('choose_movie'), reverse('manage_movies'), reverse('movie_info', args=[self.movie.id])):
+            _, queries = self.catalog_queries(url)
+            self.assertTrue(queries)
+            response, queries = self.catalog_queries(url)
+            self.assertEqual(queries, [])
+            self.assertContains(response, 'Heat')
+        self.assertEqual(catalog_cache.stats.summary()['choose_movie'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_catalog_changes_invalidate_cached_pages(self):
+        url = reverse('movie_info', args=[self.movie.id])
+        self.client.get(url)
+        self.movie.title = 'Heat (1995)'
+        self.movie.save()
+        self.assertContains(self.client.get(url), 'Heat (1995)')
+        self.movie.actors.add(Actor.objects.create(name='Al Pacino'))
+        self.assertContains(self.client.get(url), 'Al Pacino')
+
+    def test_missing_movie_is_still_a_404(self):
+        self.assertEqual(self.client.get(reverse('movie_info', args=[self.movie.id + 1])).status_code, 404)
+
+    def test_bulk_import_bumps_the_version(self):
+        version = catalog_cache.catalog_version()
+        writer = BulkMovieWriter()
+        writer.add({
+            'imdb_id': 'tt0111161', 'title': 'The Shawshank Redemption', 'release_date': 1994, 'genre': 'Drama',
+            'genres': ['Drama'], 'imdb_rating': 9.3, 'studio': 'Castle Rock', 'director': 'Frank Darabont', 'actors': [],
+        })
+        writer.flush()
+        self.assertGreater(catalog_cache.catalog_version(), version)
+
+    def test_hit_ratio_is_reported_with_request_stats(self):
+        self.client.get(reverse('choose_movie'))
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        stats = self.client.get(reverse('request_stats')).json()['catalog_cache']
+        self.assertEqual(stats['genre_options']['misses'], 1)
+
+
+class CatalogCacheCheckTests(TestCase):
+    def test_warns_about_a_per_process_catalog_cache(self):
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/catalog'}
+        with self.settings(CACHES={**TEST_CACHES, 'catalog': shared}):
+            self.assertEqual(check_catalog_cache(None), [])
+        self.assertEqual([warning.id for warning in check_catalog_cache(None)], ['trivia_game.W001'])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.director = Director.objects.create(name='Michael Mann')
+        self.movie = Movie.objects.create(
+            title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3', director=self.director
+        )
+
+    def revalidate(self, url, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **headers)
+        return response, [q['sql'] for q in queries if 'trivia_game_' in q['sql'] and 'updated_at' not in q['sql']]
+
+    def test_unchanged_catalog_answers_304_without_queries(self):
+        for url in (reverse('choose_movie'), reverse('movie_search')):
+            etag = self.client.get(url)['ETag']
+            response, queries = self.revalidate(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(queries, [])
+            self.assertIn('no-cache', response['Cache-Control'])
+        Movie.objects.create(title='Ronin', release_date=1998, genre='Action', imdb_rating='7.2')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_movie_info_follows_the_movie_and_its_credits(self):
+        Movie.objects.filter(pk=self.movie.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        url = reverse('movie_info', args=[self.movie.id])
+        last_modified = self.client.get(url)['Last-Modified']
+        response, queries = self.revalidate(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(queries, [])
+        self.director.name = 'Michael Kenneth Mann'
+        self.director.save()
+        self.assertContains(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified), 'Michael Kenneth Mann')
+
+    def test_actor_changes_move_updated_at(self):
+        before = Movie.objects.get(pk=self.movie.pk).updated_at
+        self.movie.actors.add(Actor.objects.create(name='Al Pacino'))
+        self.assertGreater(Movie.objects.get(pk=self.movie.pk).updated_at, before)
+
+    def test_missing_movie_is_not_revalidated(self):
+        response = self.client.get(reverse('movie_info', args=[self.movie.id + 1]), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+    def test_pages_with_flash_messages_are_rendered(self):
+        etag = self.client.get(reverse('choose_movie'))['ETag']
+        self.client.get(reverse('start_game_random'), {'genre': 'Western'})  # "No movies match those filters!"
+        response = self.client.get(reverse('choose_movie'), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'No movies match those filters!')
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        for n in range(5):
+            movie = Movie.objects.create(
+                title=f'Movie {n}', release_date=2000 + n, genre='Drama', imdb_rating='7.0',
+                director=Director.objects.create(name=f'Director {n}'),
+            )
+            movie.actors.add(Actor.objects.create(name=f'Actor {n}'))
+            movie.genres.add(Genre.objects.get_or_create(name='Drama')[0])
+            ProductionCompany.objects.create(movie=movie, name=f'Company {n}', founding_year=1990)
+            Trivia.objects.create(movie=movie, difficulty=Trivia.HARD, trivia_fact=f'Hard, "quoted" fact {n}')
+            Trivia.objects.create(movie=movie, difficulty=Trivia.EASY, trivia_fact=f'Easy fact {n}\nover two lines')
+
+    def test_endpoint_streams_ndjson_to_staff(self):
+        url = reverse('export_catalog')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['title'] for record in records], [f'Movie {n}' for n in range(5)])
+        self.assertEqual(records[0]['actors'], ['Actor 0'])
+        self.assertEqual(records[0]['genres'], ['Drama'])
+        self.assertEqual(records[0]['production_companies'][0]['founding_year'], 1990)
+        self.assertEqual([trivia['difficulty'] for trivia in records[0]['trivia']], ['H', 'E'])
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+
+    async def test_endpoint_streams_asynchronously_under_asgi(self):
+        staff = await sync_to_async(User.objects.create_user)('staff', password='x', is_staff=True)
+        await self.async_client.aforce_login(staff)
+        response = await self.async_client.get(reverse('export_catalog'))
+        self.assertTrue(response.is_async)
+        lines = [line async for line in response.streaming_content]
+        self.assertEqual([json.loads(line)['title'] for line in lines], [f'Movie {n}' for n in range(5)])
+
+    def test_queries_per_chunk_do_not_grow_with_the_catalog(self):
+        with CaptureQueriesContext(connection) as queries:
+            lines = list(export_lines('ndjson', chunk_size=2))
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(len(queries), 3 * 5 + 1)  # Three chunks of five queries, then the empty one
+
+    def test_command_writes_csv(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'catalog.csv')
+            call_command('export_catalog', '--format', 'csv', '--output', path, '--chunk-size', '2', stderr=StringIO())
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['hard_trivia'], 'Hard, "quoted" fact 0')
+        self.assertEqual(rows[0]['easy_trivia'], 'Easy fact 0\nover two lines')
+        self.assertEqual(rows[0]['director'], 'Director 0')
+
+
+class CatalogImportTests(TestCase):
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        return path
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.movie = {
+            'imdb_id': 'tt0111161', 'title': 'The Shawshank Redemption', 'release_date': 1994,
+            'genres': ['Drama'], 'imdb_rating': '9.3', 'director': 'Frank Darabont', 'studio': None,
+            'actors': ['Tim Robbins', 'Morgan Freeman'],
+            'production_companies': [{'name': 'Castle Rock Entertainment', 'founding_year': 1987}],
+            'trivia': [{'difficulty': 'H', 'trivia_fact': 'Based on a Stephen King novella.'}],
+        }
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command('import_catalog', *args, '--workers', '1', stdout=out)
+        return out.getvalue()
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        lines = [
+            json.dumps(self.movie),
+            '{not json',
+            json.dumps({**self.movie, 'imdb_id': 'tt0068646', 'imdb_rating': '11'}),
+            json.dumps({**self.movie, 'imdb_id': 'tt0068646', 'title': 'The Godfather', 'trivia': []}),
+            json.dumps({**self.movie, 'imdb_id': 'tt0071562', 'imdb_rating': 'NaN'}),
+        ]
+        path = self.write('movies.jsonl', '\n'.join(lines) + '\n')
+        report = os.path.join(self.tmp.name, 'errors.jsonl')
+        output = self.run_import(path, '--errors', report)
+        self.assertIn('inserted 2, updated 0, 3 rejected', output)
+        with open(report, encoding='utf-8') as f:
+            errors = [json.loads(line) for line in f]
+        self.assertEqual([error['line'] for error in errors], [2, 3, 5])
+        self.assertIn('between 0 and 10', errors[1]['error'])
+        self.assertEqual(errors[2]['error'], "imdb_rating must be a number, not 'NaN'")
+
+        movie = Movie.objects.get(imdb_id='tt0111161')
+        self.assertIsNone(movie.studio)
+        self.assertEqual(movie.genre, 'Drama')
+        billing = Movie.actors.through.objects.filter(movie=movie).order_by('pk').values_list('actor__name', flat=True)
+        self.assertEqual(list(billing), ['Tim Robbins', 'Morgan Freeman'])
+        self.assertEqual(movie.production_companies.get().founding_year, 1987)
+        self.assertEqual(movie.trivia.get().difficulty, Trivia.HARD)
+        self.assertFalse(Trivia.objects.filter(movie__imdb_id='tt0068646').exists())
+
+    def test_insert_reports_existing_movies_and_upsert_replaces_them(self):
+        path = self.write('movies.jsonl', json.dumps(self.movie) + '\n')
+        self.run_import(path)
+        self.assertIn('1 rejected', self.run_import(path))
+
+        changed = {**self.movie, 'imdb_rating': '9.2', 'trivia': [{'difficulty': 'easy', 'trivia_fact': 'Andy escapes.'}]}
+        del changed['production_companies']  # Left as they are
+        path = self.write('movies.jsonl', json.dumps(changed) + '\n')
+        self.assertIn('inserted 0, updated 1, 0 rejected', self.run_import(path, '--upsert'))
+        movie = Movie.objects.get(imdb_id='tt0111161')
+        self.assertEqual(str(movie.imdb_rating), '9.2')
+        self.assertEqual(list(movie.trivia.values_list('trivia_fact', flat=True)), ['Andy escapes.'])
+        self.assertEqual(movie.production_companies.count(), 1)
+
+    def test_upsert_keeps_the_cast_and_genres_a_row_leaves_out(self):
+        self.movie['genres'] = ['Crime', 'Drama']
+        self.run_import(self.write('movies.jsonl', json.dumps(self.movie) + '\n'))
+        partial = {key: self.movie[key] for key in ('imdb_id', 'title', 'release_date', 'imdb_rating')}
+        self.run_import(self.write('movies.jsonl', json.dumps({**partial, 'imdb_rating': '9.2'}) + '\n'), '--upsert')
+        movie = Movie.objects.get(imdb_id='tt0111161')
+        self.assertEqual((str(movie.imdb_rating), movie.genre), ('9.2', 'Crime, Drama'))
+        self.assertEqual(sorted(movie.actors.values_list('name', flat=True)), ['Morgan Freeman', 'Tim Robbins'])
+        self.assertEqual(sorted(movie.genres.values_list('name', flat=True)), ['Crime', 'Drama'])
+
+        # An empty list, or CSV cell, is supplied and does clear them
+        self.run_import(self.write('movies.jsonl', json.dumps({**partial, 'actors': [], 'genre': 'Drama'}) + '\n'), '--upsert')
+        movie.refresh_from_db()
+        self.assertFalse(movie.actors.exists())
+        self.assertEqual((movie.genre, list(movie.genres.values_list('name', flat=True))), ('Drama', ['Drama']))
+
+    def test_upsert_keeps_the_rows_of_unchanged_details(self):
+        self.movie['trivia'].append({'difficulty': 'M', 'trivia_fact': 'Filmed at the Ohio State Reformatory.'})
+        self.run_import(self.write('movies.jsonl', json.dumps(self.movie) + '\n'))
+        movie = Movie.objects.get(imdb_id='tt0111161')
+        hard, medium = movie.trivia.order_by('pk')
+        company = movie.production_companies.get()
+
+        # Games in progress refer to trivia by id
+        with mock.patch.object(hints, 'movie_changed') as changed:
+            self.run_import(self.write('movies.jsonl', json.dumps(self.movie) + '\n'), '--upsert')
+        changed.assert_not_called()
+        self.assertEqual(list(movie.trivia.order_by('pk')), [hard, medium])
+        self.assertEqual(movie.trivia.get(pk=hard.pk).updated_at, hard.updated_at)
+
+        self.movie['trivia'][1]['trivia_fact'] = 'Shot in Mansfield, Ohio.'
+        self.movie['trivia'].append({'difficulty': 'E', 'trivia_fact': 'Andy escapes.'})
+        self.movie['production_companies'] = [
+            {'name': 'Castle Rock Entertainment', 'founding_year': 1987, 'headquarters': 'Beverly Hills'},
+            {'name': 'Columbia Pictures'},
+        ]
+        self.run_import(self.write('movies.jsonl', json.dumps(self.movie) + '\n'), '--upsert')
+        trivia = list(movie.trivia.order_by('pk').values_list('pk', 'trivia_fact'))
+        self.assertEqual(trivia[:2], [(hard.pk, hard.trivia_fact), (medium.pk, 'Shot in Mansfield, Ohio.')])
+        self.assertEqual(trivia[2][1], 'Andy escapes.')
+        self.assertEqual(movie.production_companies.get(name='Castle Rock Entertainment').pk, company.pk)
+        self.assertEqual(movie.production_companies.get(pk=company.pk).headquarters, 'Beverly Hills')
+
+        del self.movie['trivia'][0]
+        self.run_import(self.write('movies.jsonl', json.dumps(self.movie) + '\n'), '--upsert')
+        self.assertFalse(Trivia.objects.filter(pk=hard.pk).exists())
+        self.assertTrue(Trivia.objects.filter(pk=medium.pk).exists())
+
+    def test_export_imports_back(self):
+        path = self.write('movies.jsonl', json.dumps(self.movie) + '\n')
+        self.run_import(path)
+        exported = ''.join(export_lines('csv'))
+        Movie.objects.all().delete()
+        self.assertIn('inserted 1, updated 0, 0 rejected', self.run_import(self.write('catalog.csv', exported)))
+        record = next(export_lines('ndjson'))
+        self.assertEqual(json.loads(record)['trivia'], [{'difficulty': 'H', 'trivia_fact': 'Based on a Stephen King novella.'}])
+
+    def test_trivia_rows_attach_to_existing_movies(self):
+        self.run_import(self.write('movies.jsonl', json.dumps(self.movie) + '\n'))
+        path = self.write('trivia.csv', (
+            'imdb_id,difficulty,trivia_fact\n'
+            '111161,medium,Filmed at the Ohio State Reformatory.\n'
+            'tt0111161,H,Based on a Stephen King novella.\n'
+            'tt9999999,easy,No such movie.\n'
+        ))
+        output = self.run_import(path, '--kind', 'trivia')
+        self.assertIn('inserted 1, updated 0, 1 already present, 1 rejected', output)
+        self.assertIn('trivia.csv:4: no movie with imdb_id tt9999999', output)
+        self.assertEqual(Trivia.objects.filter(movie__imdb_id='tt0111161').count(), 2)
+
+    def test_worker_processes_validate_in_order(self):
+        lines = [json.dumps({**self.movie, 'imdb_id': f'tt{n:07d}', 'title': f'Movie {n}'}) for n in range(1, 8)]
+        path = self.write('movies.jsonl.gz', '')
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write('\n'.join(lines[:3] + ['[]'] + lines[3:]) + '\n')
+        out = StringIO()
+        call_command('import_catalog', path, '--workers', '2', '--chunk-size', '2', stdout=out)
+        self.assertIn('inserted 7, updated 0, 1 rejected', out.getvalue())
+        self.assertIn(':4: expected a JSON object', out.getvalue())
+
+
+    def test_worker_processes_start_with_spawn(self):
+        lines = [json.dumps({**self.movie, 'imdb_id': f'tt{n:07d}', 'title': f'Movie {n}'}) for n in range(1, 5)]
+        path = self.write('movies.jsonl', '\n'.join(lines) + '\n')
+        spawn_pool = functools.partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn'))
+        out = StringIO()
+        with mock.patch('trivia_game.management.commands.import_catalog.ProcessPoolExecutor', spawn_pool):
+            call_command('import_catalog', path, '--workers', '2', '--chunk-size', '2', stdout=out)
+        self.assertIn('inserted 4, updated 0, 0 rejected', out.getvalue())
+
+class CatalogIndexTests(TestCase):
+    def test_importer_reuses_names_created_concurrently(self):
+        writer = BulkMovieWriter()
+        existing = Actor.objects.create(name='Al Pacino')
+        lookups = []
+
+        def racing_load_ids(model, names, ids):
+            # The first lookup runs before the other import's row is visible
+            lookups.append(names)
+            if len(lookups) > 1:
+                load_ids(model, names, ids)
+
+        with mock.patch('trivia_game.importer.load_ids', side_effect=racing_load_ids):
+            writer.resolve(Actor, ['Al Pacino', 'Val Kilmer'])
+        self.assertEqual(writer.name_ids[Actor]['Al Pacino'], existing.pk)
+        self.assertEqual(Actor.objects.filter(name='Al Pacino').count(), 1)
+        self.assertTrue(Actor.objects.filter(name='Val Kilmer').exists())
+
+    def test_refetching_an_unchanged_movie_skips_bulk_update(self):
+        data = {
+            'title': 'Heat', 'year': 1995, 'genres': ['Crime', 'Drama'], 'rating': 8.3,
+            'production companies': ['Warner Bros.'], 'directors': ['Michael Mann'], 'cast': ['Al Pacino'],
+        }
+        for _ in range(2):
+            writer = BulkMovieWriter()
+            writer.add(parse_imdb_movie(data, '113277'))
+            with CaptureQueriesContext(connection) as queries:
+                writer.flush()
+        self.assertEqual((writer.written, writer.updated), (0, 1))
+        # bulk_update() would build a CASE per field; an unchanged row only gets its timestamps moved
+        self.assertFalse([query['sql'] for query in queries if 'CASE' in query['sql']])
+        self.assertEqual(str(Movie.objects.get(imdb_id='tt0113277').imdb_rating), '8.3')
+
+    def test_explain_command(self):
+        out = StringIO()
+        call_command('explain_catalog_queries', stdout=out)
+        self.assertIn('actor by name', out.getvalue())
+
+
+class AutocompleteTests(TestCase):
+    def test_prefix_index(self):
+        index = PrefixIndex([(1, 'The Godfather'), (2, 'Godzilla'), (3, 'Gladiator'), (4, 'The Godfather Part II')])
+        self.assertEqual(index.complete('god'), ['The Godfather', 'The Godfather Part II', 'Godzilla'])
+        self.assertEqual(index.complete('GOD', limit=1), ['The Godfather'])
+        self.assertEqual(index.complete(''), [])
+        index.add(2, 'Godzilla Minus One')
+        index.remove(1)
+        self.assertEqual(index.complete('godz'), ['Godzilla Minus One'])
+        self.assertEqual(index.complete('godfather'), ['The Godfather Part II'])
+
+    def test_suggests_titles_in_any_script(self):
+        index = PrefixIndex([(1, '千と千尋の神隠し'), (2, 'Амели'), (3, 'Ангел'), (4, 'Λόγος')])
+        self.assertEqual(index.complete('千と'), ['千と千尋の神隠し'])
+        self.assertEqual(index.complete('ам'), ['Амели'])
+        self.assertEqual(index.complete('А'), ['Амели', 'Ангел'])
+        self.assertEqual(index.complete('λο'), ['Λόγος'])
+
+    def test_endpoint_follows_catalog_changes(self):
+        reset_index()
+        movie = Movie.objects.create(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+        url = reverse('autocomplete_titles')
+        self.assertEqual(self.client.get(url, {'q': 'he'}).json()['suggestions'], ['Heat'])
+
+        Movie.objects.create(title='Hereditary', release_date=2018, genre='Horror', imdb_rating='7.3')
+        movie.title = 'Heathers'
+        movie.save()
+        self.assertEqual(self.client.get(url, {'q': 'he'}).json()['suggestions'], ['Heathers', 'Hereditary'])
+        # Until the catalog changes again, suggestions never touch the database
+        with self.assertNumQueries(0):
+            self.client.get(url, {'q': 'her'})
+
+        self.client.post(reverse('delete_movie', args=[movie.id]))
+        self.assertEqual(self.client.get(url, {'q': 'he'}).json()['suggestions'], ['Hereditary'])
+
+    def test_index_follows_writes_without_signals(self):
+        reset_index()
+        url = reverse('autocomplete_titles')
+        self.assertEqual(self.client.get(url, {'q': 'he'}).json()['suggestions'], [])
+        # As BulkMovieWriter, or a save in another worker process
+        Movie.objects.bulk_create([Movie(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')])
+        catalog_cache.bump_catalog_version()
+        self.assertEqual(self.client.get(url, {'q': 'he'}).json()['suggestions'], ['Heat'])
+        Movie.objects.filter(title='Heat').update(title='Heathers')
+        catalog_cache.bump_catalog_version()
+        self.assertEqual(self.client.get(url, {'q': 'he'}).json()['suggestions'], ['Heathers'])
+
+
+class QueryBudgetMixin:
+    """Asserts that a view makes the same, bounded number of queries however big the catalog is.
+
+    assertQueryBudget() runs a request against a small catalog, grows the
+    catalog, runs it again, and fails if the count changed (an N+1) or went
+    over the budget.
+    """
+    def add_movies(self, count):
+        start = Movie.objects.count()
+        for i in range(start, start + count):
+            movie = Movie.objects.create(
+                title=f'Movie {i:04d}', release_date=1950 + i % 70, genre='Drama', imdb_rating='7.0',
+                director=Director.objects.create(name=f'Director {i}'),
+                studio=Studio.objects.create(name=f'Studio {i}'),
+            )
+            movie.actors.add(*[Actor.objects.create(name=f'Actor {i}-{n}') for n in range(3)])
+            ProductionCompany.objects.create(movie=movie, name=f'Company {i}')
+            Trivia.objects.bulk_create([
+                Trivia(movie=movie, difficulty=difficulty, trivia_fact=f'{difficulty} fact {i}')
+                for difficulty in (Trivia.HARD, Trivia.MEDIUM, Trivia.EASY)
+            ])
+        return Movie.objects.order_by('id').first()
+
+    def count_queries(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def assertQueryBudget(self, request, budget, small=2, large=20, warm=None):
+        """warm, if given, runs unmeasured after each catalog change, to refill process-wide indexes"""
+        self.add_movies(small)
+        if warm:
+            warm()
+        before = self.count_queries(request)
+        self.add_movies(large - small)
+        if warm:
+            warm()
+        after = self.count_queries(request)
+        self.assertEqual(before, after, f'query count grew with the catalog ({before} -> {after})')
+        self.assertLessEqual(after, budget)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        reset_matcher()
+        reset_index()
+
+    def first_movie_id(self):
+        return Movie.objects.order_by('id').values_list('id', flat=True).first()
+
+    def test_manage_movies(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('manage_movies')), 1)
+
+    def test_choose_movie(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('choose_movie')), 2)
+
+    def test_movie_search(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('movie_search'), {'q': 'movie'}), 1)
+
+    def test_movie_info(self):
+        # first_movie_id(), the updated_at lookup for the ETag, the movie and its actors
+        self.assertQueryBudget(lambda: self.client.get(reverse('movie_info', args=[self.first_movie_id()])), 4)
+
+    def test_edit_movie(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('edit_movie', args=[self.first_movie_id()])), 5)
+
+    def test_edit_movie_save(self):
+        movie = self.add_movies(1)
+        url = reverse('edit_movie', args=[movie.id])
+
+        def save(cast):
+            return self.count_queries(lambda: self.client.post(url, {
+                'title': movie.title, 'release_date': 1999, 'genre': 'Drama', 'imdb_rating': '7.5',
+                'director': 'Director 0', 'studio': 'Studio 0', 'actors': '\r\n'.join(cast),
+                'production_company': 'Company 0', 'easy_trivia': 'New easy fact', 'hard_trivia': 'H fact 0',
+            }))
+
+        kept = Movie.actors.through.objects.get(movie=movie, actor__name='Actor 0-0').pk
+        save(['Actor 0-0'] + [f'First cast {n}' for n in range(3)])
+        # Both replace the rest of the cast with new actors
+        small = save(['Actor 0-0'] + [f'Small cast {n}' for n in range(3)])
+        large = save(['Actor 0-0'] + [f'Large cast {n}' for n in range(30)])
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 16)
+        billing = Movie.actors.through.objects.filter(movie=movie).order_by('pk')
+        self.assertEqual(billing.first().pk, kept)  # Unchanged links are left in place
+        self.assertEqual(billing.count(), 31)
+        self.assertFalse(billing.filter(actor__name__startswith='Small').exists())
+        self.assertEqual(
+            sorted(movie.trivia.values_list('difficulty', 'trivia_fact')),
+            [('E', 'New easy fact'), ('H', 'H fact 0')]
+        )
+
+    def test_start_game(self):
+        self.add_movies(1)
+        start = lambda: self.client.get(reverse('start_game', args=[self.first_movie_id()]))
+        start()  # Creates the session, so both measured runs only update it
+        self.assertQueryBudget(start, 9)
+
+    def test_random_start(self):
+        self.add_movies(1)
+        start = lambda: self.client.get(reverse('start_game_random'), {'decade': '1950s', 'min_rating': '5'})
+        start()
+        # Pin the pivot so the pick never needs its wrap-around query
+        with mock.patch('trivia_game.catalog.random.randint', side_effect=lambda low, high: low):
+            self.assertQueryBudget(start, 11)
+
+    def test_guess(self):
+        self.add_movies(1)
+        self.client.get(reverse('start_game', args=[self.first_movie_id()]))
+        # The matcher is rebuilt on the first guess after a catalog change; budget the steady state
+        guess = lambda: self.client.post(reverse('make_guess'), {'guess': 'Nothing Like It'})
+        self.assertQueryBudget(guess, 2, warm=guess)
+
+
+@override_settings(REQUEST_PROFILING=True)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        request_stats.reset()
+        self.movie = Movie.objects.create(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('manage_movies'))
+        timing = response['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        self.assertIn('desc="1 queries, 0 duplicate"', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_duplicate_queries_are_counted(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for _ in range(3):
+                list(Movie.objects.filter(pk=self.movie.pk))
+            list(Movie.objects.filter(pk=self.movie.pk + 1))
+        self.assertEqual((recorder.count, recorder.duplicates), (4, 2))
+
+    def test_stats_are_grouped_by_endpoint_and_staff_only(self):
+        for _ in range(3):
+            self.client.get(reverse('manage_movies'))
+        self.client.get(reverse('choose_movie'))
+        url = reverse('request_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        User.objects.create_user('admin', password='pw', is_staff=True)
+        self.client.login(username='admin', password='pw')
+        endpoints = self.client.get(url).json()['endpoints']
+        self.assertEqual(endpoints['manage_movies']['requests'], 3)
+        self.assertEqual(endpoints['manage_movies']['queries']['max'], 1)
+        self.assertEqual(sum(endpoints['manage_movies']['wall_ms']['histogram'].values()), 3)
+        self.assertEqual(endpoints['choose_movie']['requests'], 1)
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('manage_movies'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(request_stats.summary(), {})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class GameStateStoreTests(TestCase):
+    def setUp(self):
+        self.store = GameStateStore('game_state', local_size=2)
+
+    def test_reads_are_served_locally_until_another_worker_writes(self):
+        self.store.set('g1', {'attempts_left': 9})
+        state = self.store.get('g1')
+        state['attempts_left'] = 8  # Callers get a private copy
+        self.assertEqual(self.store.get('g1'), {'attempts_left': 9})
+        self.assertEqual((self.store.local_hits, self.store.cache_reads), (2, 0))
+
+        other_worker = GameStateStore('game_state')
+        other_worker.set('g1', {'attempts_left': 7})
+        self.assertEqual(self.store.get('g1'), {'attempts_left': 7})
+        self.assertEqual(self.store.cache_reads, 1)
+
+    def test_unchanged_state_is_not_rewritten(self):
+        self.store.set('g1', {'attempts_left': 9})
+        self.store.set('g1', self.store.get('g1'))
+        self.assertEqual((self.store.writes, self.store.skipped_writes), (1, 1))
+
+    def test_local_lru_is_bounded(self):
+        for game_id in ('g1', 'g2', 'g3'):
+            self.store.set(game_id, {'id': game_id})
+        self.assertEqual(list(self.store.local), ['g2', 'g3'])
+        self.assertEqual(self.store.get('g1'), {'id': 'g1'})
+
+    def test_state_survives_a_restart_with_a_file_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}
+            with override_settings(CACHES={**TEST_CACHES, 'game_state': file_cache}):
+                GameStateStore('game_state').set('g1', {'attempts_left': 4})
+                restarted = GameStateStore('game_state')
+                self.assertEqual(restarted.get('g1'), {'attempts_left': 4})
+
+    def test_guesses_do_not_write_the_session(self):
+        movie = Movie.objects.create(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+        self.client.get(reverse('start_game', args=[movie.id]))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('make_guess'), {'guess': 'Alien'})
+        self.assertFalse([q for q in queries if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT')])
+        self.assertEqual(current_game(self.client)['attempts_left'], 8)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_game_state', '--games', '2', '--guesses', '2', '--cache', 'game_state', stdout=out)
+        self.assertIn('db sessions', out.getvalue())
+        self.assertIn('0.0 queries/guess', out.getvalue())
+
+    def test_game_in_old_session_format_is_moved_to_the_store(self):
+        movie = Movie.objects.create(title='Heat', release_date=1995, genre='Crime', imdb_rating='8.3')
+        session = self.client.session
+        session['game_state'] = {'movie_id': movie.id, 'attempts_left': 3, 'revealed_trivia': [], 'won': False}
+        session.save()
+        response = self.client.post(reverse('make_guess'), {'guess': 'Alien'})
+        self.assertEqual(response.json()['attempts_left'], 2)
+        self.assertNotIn('game_state', self.client.session)
+        self.assertEqual(current_game(self.client)['attempts_left'], 2)
+
+
+
+class SweepingFileCacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_cache(self, **options):
+        return SweepingFileCache(self.tmp.name, {'OPTIONS': options})
+
+    def test_writes_between_sweeps_do_not_list_the_directory(self):
+        cache = self.make_cache(MAX_ENTRIES=10)
+        cache.set('first', 1)  # A fresh directory is swept on its first write
+        with mock.patch.object(SweepingFileCache, '_list_cache_files') as listing:
+            for n in range(20):
+                cache.set(f'key{n}', n)
+        listing.assert_not_called()
+        self.assertEqual(cache.get('key0'), 0)
+
+    def test_sweep_drops_expired_then_oldest_entries(self):
+        cache = self.make_cache(MAX_ENTRIES=10, SWEEP_INTERVAL=3600)
+        cache.set('expired', 'x', timeout=-1)
+        for n in range(12):
+            cache.set(f'key{n}', n)
+            os.utime(cache._key_to_file(f'key{n}'), (n + 1, n + 1))
+        self.assertEqual(cache.sweep(), 1 + 3)  # Down to 90% of MAX_ENTRIES
+        self.assertEqual([n for n in range(12) if cache.has_key(f'key{n}')], list(range(3, 12)))
+
+class TokenBucketTests(TestCase):
+    def test_burst_is_served_without_waiting(self):
+        bucket = TokenBucket(rate=1000, burst=5)
+        self.assertEqual(sum(bucket.acquire() for _ in range(5)), 0)
+
+    def test_waits_once_bucket_is_empty(self):
+        bucket = TokenBucket(rate=200, burst=1)
+        bucket.acquire()
+        self.assertGreater(bucket.acquire(), 0)
+
+    def test_zero_rate_disables_limiting(self):
+        bucket = TokenBucket(rate=0)
+        self.assertEqual(sum(bucket.acquire() for _ in range(100)), 0)
@@ -6,6 +6,11 @@ from . import views
 urlpatterns = [
     path("", views.index, name="index"),
     path('choose/', views.choose_movie, name='choose_movie'),
+    path('api/movies/', views.movie_search, name='movie_search'),
+    path('api/autocomplete/', views.autocomplete_titles, name='autocomplete_titles'),
+    path('api/request-stats/', views.request_stats, name='request_stats'),
+    path('api/export/', views.export_catalog, name='export_catalog'),
+    path('api/movies/bulk-edit/', views.bulk_edit_movies, name='bulk_edit_movies'),
     path('start_game/<int:movie_id>/', views.start_game, name='start_game'),
     path('start_game/', views.start_game, name='start_game_random'),  
     path('play/<int:movie_id>/', views.play_game, name='play_game'),  
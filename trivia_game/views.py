@@ -1,14 +1,72 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
-from django.views.decorators.http import require_POST
+from django.conf import settings
+from django.contrib import messages
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django.views.decorators.csrf import csrf_protect
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.functional import SimpleLazyObject
 from .models import (
     Movie, Director, Studio, ProductionCompany,
-    EasyTrivia, MediumTrivia, HardTrivia, Actor
+    Trivia, Actor, Genre
 )
+from .autocomplete import MAX_SUGGESTIONS, aget_index, get_index
+from .catalog_cache import catalog_modified, catalog_version, stats as catalog_cache_stats
+from .bulk_edit import MAX_PATCHES, apply_patches, write_trivia
+from .catalog import DEFAULT_PAGE_SIZE, asearch_movies, genre_counts, random_movie_id, search_movies
+from . import hints
+from .export import FORMATS as EXPORT_FORMATS, aexport_lines, export_lines
+from .game_store import get_store
+from .importer import resolve_names, split_genres
+from .instrumentation import stats as request_stats_window
+from .matching import aguess_matches, guess_matches
 import random
 import json
-from django.db.models import Avg, Count
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+
+# Fields of the manage page's bulk editor: (patch field, label, input type)
+BULK_EDIT_FIELDS = [
+    ('imdb_rating', 'IMDb rating', 'number'),
+    ('genre', 'Genre', 'text'),
+    ('director', 'Director', 'text'),
+    ('studio', 'Studio', 'text'),
+    ('easy_trivia', 'Easy trivia', 'textarea'),
+    ('medium_trivia', 'Medium trivia', 'textarea'),
+    ('hard_trivia', 'Hard trivia', 'textarea'),
+]
+
+# How many recently played movies a random pick avoids per session
+RECENT_MOVIES = 20
+
+# Trivia form fields and the difficulty each one is stored under
+TRIVIA_FIELDS = [
+    ('easy_trivia', Trivia.EASY),
+    ('medium_trivia', Trivia.MEDIUM),
+    ('hard_trivia', Trivia.HARD),
+]
+
+# Format of the game states in the store; upgrade_game_state converts older ones
+GAME_STATE_VERSION = 2
+
+# Last-resort hint of each type, once all of its sentences have been used
+FALLBACK_FACTS = {
+    'release_year': "The release timing was significant.",
+    'studio': "Created by a notable production house.",
+    'medium_trivia': "The production process was unique.",
+    'production': "Produced with great attention to detail.",
+    'genre': "Represents its genre in a unique way.",
+    'easy_trivia': "Has left its mark on cinema.",
+    'actors': "Features memorable performances.",
+    'director': "Shows strong directorial vision."
+}
+
+# Shown in place of a database trivia hint that was deleted mid-game
+MISSING_TRIVIA_FACT = "Has left its mark on cinema."
 
 class TriviaQuality:
     """Tracks the quality and source of generated trivia facts.
@@ -29,22 +87,28 @@ class TriviaResult:
         fact (str): The actual trivia text
         quality (TriviaQuality): Quality level of the trivia
         source (str): Source of the trivia (database, actor, director, etc.)
+        ref (list): Compact [kind, value] reference the game state stores (see hints.py)
     """
-    def __init__(self, fact, quality, source):
+    def __init__(self, fact, quality, source, ref=None):
         self.fact = fact
         self.quality = quality
         self.source = source
+        self.ref = ref
 
 def index(request):
     # Clear any existing game state
-    if 'game_state' in request.session:
-        del request.session['game_state']
+    clear_game_state(request)
     return render(request, "index.html")
 
 def manage_movies(request):
-    movies = Movie.objects.all().order_by('title')
+    # Join director and studio into the one query and load only the columns the list shows
+    # (evaluated only when the template's cached list fragment is missing)
+    movies = Movie.objects.select_related('director', 'studio').only(
+        'title', 'release_date', 'genre', 'imdb_rating', 'director__name', 'studio__name'
+    ).order_by('title')
     return render(request, "trivia_game/manage_movies.html", {
-        'movies': movies
+        'movies': movies,
+        'bulk_fields': BULK_EDIT_FIELDS,
     })
 
 def add_movie(request):
@@ -73,6 +137,7 @@ def add_movie(request):
                 director=director,
                 studio=studio
             )
+            save_genres(movie)
 
             # Create Production Company if provided
             if request.POST.get('production_company'):
@@ -84,23 +149,11 @@ def add_movie(request):
                 )
 
             # Create trivia entries if provided
-            if request.POST.get('easy_trivia'):
-                EasyTrivia.objects.create(
-                    movie=movie,
-                    trivia_fact=request.POST['easy_trivia']
-                )
-
-            if request.POST.get('medium_trivia'):
-                MediumTrivia.objects.create(
-                    movie=movie,
-                    trivia_fact=request.POST['medium_trivia']
-                )
-
-            if request.POST.get('hard_trivia'):
-                HardTrivia.objects.create(
-                    movie=movie,
-                    trivia_fact=request.POST['hard_trivia']
-                )
+            Trivia.objects.bulk_create([
+                Trivia(movie=movie, difficulty=difficulty, trivia_fact=request.POST[field])
+                for field, difficulty in TRIVIA_FIELDS
+                if request.POST.get(field)
+            ])
             
             return JsonResponse({
                 'success': True,
@@ -127,8 +180,8 @@ def delete_movie(request, movie_id):
         try:
             movie = get_object_or_404(Movie, pk=movie_id)
             # Check if the movie has any active games
-            if 'game_state' in request.session:
-                game_state = request.session['game_state']
+            game_state = load_game_state(request)
+            if game_state:
                 if game_state.get('movie_id') == movie_id:
                     return JsonResponse({
                         'success': False,
@@ -146,132 +199,278 @@ def delete_movie(request, movie_id):
         'error': 'Invalid request method'
     })
 
+@require_POST
+def bulk_edit_movies(request):
+    """Apply a JSON batch of movie patches ({"patches": [{"id": ..., field: value}, ...]}), see bulk_edit.py"""
+    try:
+        patches = json.loads(request.body)['patches']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Expected a JSON object with a "patches" list'}, status=400)
+    if not isinstance(patches, list):
+        return JsonResponse({'success': False, 'error': '"patches" must be a list'}, status=400)
+    if len(patches) > MAX_PATCHES:
+        return JsonResponse({'success': False, 'error': f'At most {MAX_PATCHES} patches per request'}, status=400)
+    results = apply_patches(patches)
+    failed = sum(not result['ok'] for result in results)
+    return JsonResponse({
+        'success': not failed,
+        'updated': sum(bool(result.get('changed')) for result in results),
+        'failed': failed,
+        'results': results,
+    })
+
+def revalidatable(request):
+    """Whether a GET may be answered with a 304: the page holds no one-off flash messages"""
+    return request.method in ('GET', 'HEAD') and not len(messages.get_messages(request))
+
+def catalog_etag(request, *args, **kwargs):
+    """ETag of responses that only change with the catalog, read from the cache without queries"""
+    return f'"catalog-{catalog_version()}"' if revalidatable(request) else None
+
+def catalog_last_modified(request, *args, **kwargs):
+    return catalog_modified() if revalidatable(request) else None
+
+@cache_control(no_cache=True)  # Revalidate every time instead of guessing freshness from Last-Modified
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def choose_movie(request):
     """First phase: Select a movie to guess"""
     if request.method == 'POST':
-        movie_id = request.POST.get('movie_id')
+        movie_id = request.POST.get('movie_id', '')
         if not movie_id:
             return redirect('choose_movie')
-            
-        # Initialize game state
-        game_state = {
-            'movie_id': movie_id,
-            'attempts_left': 9,
-            'revealed_trivia': [],
-            'used_trivia': [],  # Initialize empty list for used trivia
-            'won': False,
-            'game_over': False
-        }
-        request.session['game_state'] = game_state
+        try:
+            if not movie_id.isdigit():
+                raise Movie.DoesNotExist
+            movie = game_movies().get(pk=movie_id)
+        except Movie.DoesNotExist:
+            messages.error(request, "That movie is not in the catalog.")
+            return redirect('choose_movie')
+
+        # Initialize game state; the first hint comes with the first wrong guess
+        save_game_state(request, new_game_state(movie, show_first=False), new=True)
+        remember_played(request.session, movie.id)
         
         return redirect('play_game')
     else:
         sort_by = request.GET.get('sort')
-        if sort_by == 'highest':
-            movies = Movie.objects.all().order_by('-imdb_rating', 'title')
-        elif sort_by == 'lowest':
-            movies = Movie.objects.all().order_by('imdb_rating', 'title')
-        else:
-            movies = Movie.objects.all().order_by('title')
+        if sort_by not in ('highest', 'lowest'):
+            sort_by = 'title'
+        genre = request.GET.get('genre', '')
+        # Only the first page is rendered here; the page fetches the rest from movie_search.
+        # Lazy, so the queries only run when the template's cached fragments are missing
+        page = SimpleLazyObject(lambda: search_movies(sort=sort_by, genre=genre))
             
         return render(request, "trivia_game/choose_movie.html", {
-            'movies': movies,
+            'movies': SimpleLazyObject(lambda: page[0]),
+            'next_cursor': SimpleLazyObject(lambda: page[1]),
+            'sort': sort_by,
+            'genre': genre,
+            'genres': genre_counts,
+            'decades': range(1920, 2030, 10),
             'phase': 'chooser'
         })
 
+def save_genres(movie):
+    """Point the movie's genres relation at the genres named in its genre string"""
+    ids = {}
+    resolve_names(Genre, split_genres(movie.genre), ids)
+    movie.genres.set(ids.values())
+
+def save_actors(movie, names):
+    """Make the movie's cast the given actor names, adding and removing only the links that changed.
+
+    Call it after saving the movie. The queries are the same few whatever the
+    size of the cast: one to look the names up (plus two to create the missing
+    actors), one to read the current links and one each to remove and add links.
+    """
+    names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+    ids = {}
+    resolve_names(Actor, names, ids)
+    wanted = list(dict.fromkeys(ids[name] for name in names))
+    # The link rows are written directly rather than through movie.actors, whose
+    # m2m signals would repeat the updated_at touch and catalog version bump of
+    # the movie's save
+    ActorLink = Movie.actors.through
+    current = set(ActorLink.objects.filter(movie=movie).values_list('actor_id', flat=True))
+    removed = current.difference(wanted)
+    if removed:
+        ActorLink.objects.filter(movie=movie, actor_id__in=removed).delete()
+    ActorLink.objects.bulk_create([
+        ActorLink(movie=movie, actor_id=actor_id) for actor_id in wanted if actor_id not in current
+    ])
+
+def save_production_company(movie, data):
+    """Update the movie's (first) production company from the edit form, or add one"""
+    name = data.get('production_company')
+    if not name:
+        return
+    year = data.get('production_company_year')
+    fields = {
+        'name': name,
+        'founding_year': int(year) if year else None,
+        'headquarters': data.get('production_company_hq', ''),
+    }
+    company = movie.production_companies.order_by('pk').first() or ProductionCompany(movie=movie)
+    if company.pk is None or any(getattr(company, field) != value for field, value in fields.items()):
+        for field, value in fields.items():
+            setattr(company, field, value)
+        company.save()
+
+def save_trivia(movie, data):
+    """Apply the edit form's trivia fields: one fact per difficulty, a blank field deletes that difficulty's facts"""
+    write_trivia({movie.id: {difficulty: data.get(field, '') for field, difficulty in TRIVIA_FIELDS}})
+
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+def movie_search(request):
+    """JSON catalog search, paginated with keyset cursors"""
+    try:
+        movies, next_cursor = search_movies(**search_arguments(request))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return search_results(movies, next_cursor)
+
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+async def amovie_search(request):
+    """movie_search() for requests served over ASGI, through the async ORM"""
+    try:
+        movies, next_cursor = await asearch_movies(**search_arguments(request))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return search_results(movies, next_cursor)
+
+def search_arguments(request):
+    """search_movies() arguments from the query string"""
+    return {
+        'query': request.GET.get('q', '').strip(),
+        'match': request.GET.get('match', 'contains'),
+        'sort': request.GET.get('sort', 'title'),
+        'genre': request.GET.get('genre', ''),
+        'limit': int(request.GET.get('limit', DEFAULT_PAGE_SIZE)),
+        'cursor': request.GET.get('cursor'),
+    }
+
+def search_results(movies, next_cursor):
+    for movie in movies:
+        movie['imdb_rating'] = str(movie['imdb_rating'])
+        movie['url'] = reverse('movie_info', args=[movie['id']])
+    return JsonResponse({
+        'results': movies,
+        'next_cursor': next_cursor
+    })
+
+@staff_member_required
+def export_catalog(request):
+    """Stream the whole catalog as NDJSON (default) or CSV, a chunk of movies at a time"""
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f'Unknown format, use one of: {", ".join(EXPORT_FORMATS)}'}, status=400)
+    _, content_type, extension = EXPORT_FORMATS[export_format]
+    # Under ASGI the response must be fed by an async iterator to keep streaming
+    lines = aexport_lines if isinstance(request, ASGIRequest) else export_lines
+    response = StreamingHttpResponse(lines(export_format), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="catalog.{extension}"'
+    return response
+
+@staff_member_required
+def request_stats(request):
+    """Rolling per-endpoint latency and SQL stats collected by RequestProfilingMiddleware"""
+    if request.method == 'POST':
+        request_stats_window.reset()
+        catalog_cache_stats.reset()
+    return JsonResponse({
+        'enabled': getattr(settings, 'REQUEST_PROFILING', False),
+        'endpoints': request_stats_window.summary(),
+        'catalog_cache': catalog_cache_stats.summary()
+    })
+
+def movie_updated_at(request, movie_id):
+    """The movie's updated_at, looked up once per request by primary key; None if there is no such movie"""
+    if not revalidatable(request):
+        return None
+    if not hasattr(request, 'movie_updated_at'):
+        request.movie_updated_at = Movie.objects.filter(pk=movie_id).order_by().values_list('updated_at', flat=True).first()
+    return request.movie_updated_at
+
+def movie_etag(request, movie_id):
+    updated_at = movie_updated_at(request, movie_id)
+    return f'"movie-{movie_id}-{updated_at.timestamp()}"' if updated_at else None
+
+@cache_control(no_cache=True)
+@condition(etag_func=movie_etag, last_modified_func=movie_updated_at)
 def movie_info(request, movie_id):
-    movie = get_object_or_404(Movie, pk=movie_id)
+    # Loaded (or 404'd) only when the template's cached fragment is missing
+    movie = SimpleLazyObject(lambda: get_object_or_404(
+        Movie.objects.select_related('director', 'studio').prefetch_related('actors'),
+        pk=movie_id
+    ))
     return render(request, "trivia_game/movie_info.html", {
-        'movie': movie
+        'movie': movie,
+        'movie_id': movie_id
+    })
+
+def autocomplete_titles(request):
+    """Title completions for the guess box, served from the in-memory prefix index"""
+    try:
+        limit = min(int(request.GET.get('limit', 8)), MAX_SUGGESTIONS)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    return JsonResponse({
+        'suggestions': get_index().complete(request.GET.get('q', ''), limit)
+    })
+
+async def aautocomplete_titles(request):
+    """autocomplete_titles() for requests served over ASGI"""
+    try:
+        limit = min(int(request.GET.get('limit', 8)), MAX_SUGGESTIONS)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    index = await aget_index()
+    return JsonResponse({
+        'suggestions': index.complete(request.GET.get('q', ''), limit)
     })
 
 def edit_movie(request, movie_id):
     """Edit an existing movie"""
-    movie = get_object_or_404(Movie, pk=movie_id)
-    
     if request.method == 'POST':
-        # Update movie details
-        movie.title = request.POST.get('title')
-        movie.release_date = request.POST.get('release_date')
-        movie.genre = request.POST.get('genre')
-        movie.imdb_rating = request.POST.get('imdb_rating')
-        
-        # Get or create director
-        director_name = request.POST.get('director')
-        if director_name:
-            director, _ = Director.objects.get_or_create(name=director_name)
-            movie.director = director
-        
-        # Get or create studio
-        studio_name = request.POST.get('studio')
-        if studio_name:
-            studio, _ = Studio.objects.get_or_create(name=studio_name)
-            movie.studio = studio
-        
-        movie.save()
-
-        # Update actors
-        actor_names = request.POST.get('actors', '').strip().split('\n')
-        # Clear existing actors
-        movie.actors.clear()
-        # Add new actors
-        for name in actor_names:
-            name = name.strip()
-            if name:
-                actor, _ = Actor.objects.get_or_create(name=name)
-                movie.actors.add(actor)
-        
-        # Update or create production company
-        production_company_name = request.POST.get('production_company')
-        if production_company_name:
-            ProductionCompany.objects.update_or_create(
-                movie=movie,
-                defaults={
-                    'name': production_company_name,
-                    'founding_year': request.POST.get('production_company_year') or None,
-                    'headquarters': request.POST.get('production_company_hq', '')
-                }
-            )
-        
-        # Update trivia facts - Easy
-        easy_trivia = request.POST.get('easy_trivia')
-        if easy_trivia:
-            EasyTrivia.objects.update_or_create(
-                movie=movie,
-                defaults={'trivia_fact': easy_trivia}
-            )
-        else:
-            EasyTrivia.objects.filter(movie=movie).delete()
-        
-        # Update trivia facts - Medium
-        medium_trivia = request.POST.get('medium_trivia')
-        if medium_trivia:
-            MediumTrivia.objects.update_or_create(
-                movie=movie,
-                defaults={'trivia_fact': medium_trivia}
-            )
-        else:
-            MediumTrivia.objects.filter(movie=movie).delete()
-        
-        # Update trivia facts - Hard
-        hard_trivia = request.POST.get('hard_trivia')
-        if hard_trivia:
-            HardTrivia.objects.update_or_create(
-                movie=movie,
-                defaults={'trivia_fact': hard_trivia}
-            )
-        else:
-            HardTrivia.objects.filter(movie=movie).delete()
-        
+        # One transaction, with the movie row locked: concurrent edits of a movie
+        # apply one after the other, and a failed save leaves nothing half-written
+        with transaction.atomic():
+            movie = get_object_or_404(Movie.objects.select_for_update(), pk=movie_id)
+            movie.title = request.POST.get('title')
+            movie.release_date = request.POST.get('release_date')
+            movie.genre = request.POST.get('genre')
+            movie.imdb_rating = request.POST.get('imdb_rating')
+
+            # Get or create director and studio
+            director_name = request.POST.get('director')
+            if director_name:
+                movie.director, _ = Director.objects.get_or_create(name=director_name)
+            studio_name = request.POST.get('studio')
+            if studio_name:
+                movie.studio, _ = Studio.objects.get_or_create(name=studio_name)
+
+            movie.save()
+            save_genres(movie)
+            save_actors(movie, request.POST.get('actors', '').split('\n'))
+            save_production_company(movie, request.POST)
+            save_trivia(movie, request.POST)
         return redirect('manage_movies')
-    
+
+    movie = get_object_or_404(
+        Movie.objects.select_related('director', 'studio').prefetch_related('actors', 'trivia', 'production_companies'),
+        pk=movie_id
+    )
+    # Everything below comes from the prefetched relations
+    production_companies = list(movie.production_companies.all())
     context = {
         'movie': movie,
-        'production_company': ProductionCompany.objects.filter(movie=movie).first(),
-        'easy_trivia': EasyTrivia.objects.filter(movie=movie).first(),
-        'medium_trivia': MediumTrivia.objects.filter(movie=movie).first(),
-        'hard_trivia': HardTrivia.objects.filter(movie=movie).first(),
+        'production_company': production_companies[0] if production_companies else None,
     }
+    for field, difficulty in TRIVIA_FIELDS:
+        trivia = trivia_of(movie, difficulty)
+        context[field] = trivia[0] if trivia else None
     
     return render(request, "trivia_game/edit_movie.html", context)
 
@@ -279,37 +478,22 @@ def start_game(request, movie_id=None):
     """Start a new game with the selected movie or a random one"""
     try:
         if movie_id:
-            movie = get_object_or_404(Movie, pk=movie_id)
+            movie = load_game_movie(movie_id)
         else:
-            # Get all movies
-            all_movies = Movie.objects.all()
-            if not all_movies.exists():
-                messages.error(request, "No movies available to play with!")
-                return redirect('manage_movies')
-            # Select a random movie
-            movie = random.choice(all_movies)
-        
-        # Clear any existing game state
-        if 'game_state' in request.session:
-            del request.session['game_state']
+            try:
+                filters = random_filters(request.GET)
+            except ValueError:
+                messages.error(request, "Invalid random movie filters.")
+                return redirect('choose_movie')
+            # Select a random movie, skipping the ones this session played recently
+            picked_id = random_movie_id(exclude=request.session.get('recent_movies', []), **filters)
+            if picked_id is None:
+                return no_random_movie(request, filters)
+            movie = load_game_movie(picked_id)
         
-        # Get first hard trivia
-        first_trivia = get_first_trivia(movie)
-        
-        # Initialize game state with first trivia already shown
-        game_state = {
-            'movie_id': movie.id,
-            'attempts_left': 9,  # Start with 9 attempts
-            'used_trivia': [first_trivia.fact],
-            'revealed_trivia': [{
-                'trivia_fact': first_trivia.fact,
-                'difficulty': 'H'
-            }],
-            'won': False,
-            'game_over': False,
-            'first_trivia_shown': True  # Flag to track first trivia
-        }
-        request.session['game_state'] = game_state
+        # Replace any existing game
+        save_game_state(request, new_game_state(movie), new=True)
+        remember_played(request.session, movie.id)
         
         # Redirect to play_game with movie_id
         return redirect('play_game', movie_id=movie.id)
@@ -319,235 +503,513 @@ def start_game(request, movie_id=None):
         messages.error(request, "Error starting game. Please try again.")
         return redirect('choose_movie')
 
+async def astart_game(request, movie_id=None):
+    """start_game() for requests served over ASGI, through the async ORM, session and game store"""
+    try:
+        if movie_id:
+            movie = await aload_game_movie(movie_id)
+        else:
+            try:
+                filters = random_filters(request.GET)
+            except ValueError:
+                messages.error(request, "Invalid random movie filters.")
+                return redirect('choose_movie')
+            # A chain of dependent lookups, run as one hop to a worker thread
+            picked_id = await sync_to_async(random_movie_id)(
+                exclude=await request.session.aget('recent_movies', []), **filters
+            )
+            if picked_id is None:
+                return no_random_movie(request, filters)
+            movie = await aload_game_movie(picked_id)
+
+        await asave_game_state(request, new_game_state(movie), new=True)
+        await aremember_played(request.session, movie.id)
+        return redirect('play_game', movie_id=movie.id)
+
+    except Exception as e:
+        print(f"Error in start_game: {str(e)}")
+        messages.error(request, "Error starting game. Please try again.")
+        return redirect('choose_movie')
+
+def no_random_movie(request, filters):
+    """Where to send a player when no movie could be picked at random"""
+    if any(value not in ('', None) for value in filters.values()):
+        messages.error(request, "No movies match those filters!")
+        return redirect('choose_movie')
+    messages.error(request, "No movies available to play with!")
+    return redirect('manage_movies')
+
+def load_game_state(request):
+    """The current game's state from the game store, or None if there is no game"""
+    game_id = request.session.get('game_id')
+    if game_id:
+        game_state = get_store().get(game_id)
+        return upgrade_game_state(game_state) if game_state else game_state
+    # Games started before the store existed kept their state in the session
+    game_state = request.session.pop('game_state', None)
+    if game_state:
+        game_state = upgrade_game_state(game_state)
+        save_game_state(request, game_state, new=True)
+    return game_state
+
+def save_game_state(request, game_state, new=False):
+    """Write the game's state to the store; new=True replaces the session's game with a new one.
+
+    Only starting a game touches the session, so guesses never write django_session.
+    """
+    if new or 'game_id' not in request.session:
+        clear_game_state(request)
+        request.session['game_id'] = get_store().new_id()
+    get_store().set(request.session['game_id'], game_state)
+
+def clear_game_state(request):
+    game_id = request.session.pop('game_id', None)
+    if game_id:
+        get_store().delete(game_id)
+    request.session.pop('game_state', None)
+
+async def aload_game_state(request):
+    """load_game_state() for async views, through the async session and cache APIs"""
+    game_id = await request.session.aget('game_id')
+    if game_id:
+        game_state = await get_store().aget(game_id)
+    else:
+        game_state = await request.session.apop('game_state', None)
+    if game_state and game_state.get('v') != GAME_STATE_VERSION:
+        # Old formats may need the movie to be loaded
+        game_state = await sync_to_async(upgrade_game_state)(game_state)
+    if game_state and not game_id:
+        await asave_game_state(request, game_state, new=True)
+    return game_state
+
+async def asave_game_state(request, game_state, new=False):
+    if new or not await request.session.ahas_key('game_id'):
+        await aclear_game_state(request)
+        await request.session.aset('game_id', get_store().new_id())
+    await get_store().aset(await request.session.aget('game_id'), game_state)
+
+async def aclear_game_state(request):
+    game_id = await request.session.apop('game_id', None)
+    if game_id:
+        await get_store().adelete(game_id)
+    await request.session.apop('game_state', None)
+
+def upgrade_game_state(game_state):
+    """Convert a game state saved in an older format to the current one.
+
+    Version 1 states (no 'v' key) carried every hint as a sentence, twice.
+    Their hints are kept as literal {'trivia_fact', 'difficulty'} deck
+    entries, which deck_texts passes through unchanged.
+    """
+    if game_state.get('v') == GAME_STATE_VERSION:
+        return game_state
+    revealed = game_state.get('revealed_trivia', [])
+    # Games from start_game showed deck[0] right away, games from choose_movie did not
+    first = 0 if game_state.get('first_trivia_shown') else 1
+    deck = game_state.get('hint_deck')
+    if deck is None:
+        # Started before hint decks existed: build the hints not yet shown
+        deck = [hint.ref for hint in build_hint_deck(load_game_movie(game_state['movie_id']))]
+        deck[first:first + len(revealed)] = revealed
+    upgraded = {
+        'v': GAME_STATE_VERSION,
+        'movie_id': game_state['movie_id'],
+        'deck': deck,
+        'shown': list(range(first, first + len(revealed))),
+        'attempts_left': game_state['attempts_left'],
+        'won': game_state.get('won', False),
+        'game_over': game_state.get('game_over', False),
+    }
+    if 'score' in game_state:
+        upgraded['score'] = game_state['score']
+    return upgraded
+
+def random_filters(params):
+    """Genre, decade and minimum rating filters for a random pick; raises ValueError on bad input"""
+    decade = params.get('decade', '').rstrip('s')
+    min_rating = params.get('min_rating', '')
+    try:
+        min_rating = Decimal(min_rating) if min_rating else None
+    except InvalidOperation:
+        raise ValueError('Invalid min_rating')
+    return {
+        'genre': params.get('genre', '').strip(),
+        'decade': int(decade) // 10 * 10 if decade else None,  # 1994 and "1990s" both mean 1990-1999
+        'min_rating': min_rating,
+    }
+
+def remember_played(session, movie_id):
+    """Keep the session's most recently played movie ids, newest first"""
+    recent = [movie_id] + [i for i in session.get('recent_movies', []) if i != movie_id]
+    session['recent_movies'] = recent[:RECENT_MOVIES]
+
+async def aremember_played(session, movie_id):
+    recent = [movie_id] + [i for i in await session.aget('recent_movies', []) if i != movie_id]
+    await session.aset('recent_movies', recent[:RECENT_MOVIES])
+
+def game_movies():
+    """Movies with everything a hint deck needs, in one prefetching query set"""
+    return Movie.objects.select_related('studio', 'director').prefetch_related(
+        'trivia', 'production_companies', 'actors'
+    )
+
+def load_game_movie(movie_id):
+    return get_object_or_404(game_movies(), pk=movie_id)
+
+async def aload_game_movie(movie_id):
+    return await aget_object_or_404(game_movies(), pk=movie_id)
+
+def trivia_of(movie, difficulty):
+    """A movie's trivia of one difficulty, oldest first, read from its prefetched trivia"""
+    return [trivia for trivia in movie.trivia.all() if trivia.difficulty == difficulty]
+
+def hint_difficulty(num_guesses):
+    """Difficulty label of the hint revealed after the given number of wrong guesses"""
+    if num_guesses < 2:  # First 2 guesses - Hard
+        return 'H'
+    elif num_guesses < 5:  # Next 3 guesses - Medium
+        return 'M'
+    else:  # Last 3 guesses - Easy
+        return 'E'
+
+def deck_difficulty(position):
+    """Difficulty label of the hint at a position of the deck"""
+    return 'H' if position == 0 else hint_difficulty(position - 1)
+
+def build_hint_deck(movie):
+    """Build the game's full ordered list of hints up front, as TriviaResults.
+
+    deck[0] is the hard trivia shown when the game starts and deck[n + 1] is
+    revealed after the n-th wrong guess, so make_guess never queries trivia.
+    """
+    deck = [get_first_trivia(movie)]
+    used_trivia = [deck[0].fact]
+    for num_guesses in range(8):
+        trivia_result = generate_trivia(movie, num_guesses, used_trivia)
+        used_trivia.append(trivia_result.fact)
+        deck.append(trivia_result)
+    return deck
+
+def new_game_state(movie, show_first=True):
+    """Game state for a fresh game, with the first trivia already shown unless show_first is False.
+
+    The deck is kept as compact hint references; its texts go to the hint
+    memo so the guesses that follow do not have to rebuild them.
+    """
+    deck = build_hint_deck(movie)
+    refs = [hint.ref for hint in deck]
+    hints.memo.put(movie.id, refs, [hint.fact for hint in deck])
+    return {
+        'v': GAME_STATE_VERSION,
+        'movie_id': movie.id,
+        'deck': refs,
+        'shown': [0] if show_first else [],  # Deck positions revealed so far
+        'attempts_left': 9,  # Start with 9 attempts
+        'won': False,
+        'game_over': False,
+    }
+
+def deck_refs(game_state):
+    # Hints of games saved in the version 1 format are already sentences
+    return [hint for hint in game_state['deck'] if not isinstance(hint, dict)]
+
+def deck_texts(game_state, movie=None):
+    """The sentence of every hint in the game's deck, rebuilt from the movie only when not memoized.
+
+    The movie is loaded here unless it is passed in (from load_game_movie).
+    """
+    refs = deck_refs(game_state)
+    texts = hints.memo.get(game_state['movie_id'], refs) if refs else []
+    if texts is None:
+        texts = rebuild_texts(movie or load_game_movie(game_state['movie_id']), refs)
+    return with_saved_texts(game_state, texts)
+
+async def adeck_texts(game_state):
+    """deck_texts() for async views: a memo miss loads the movie through the async ORM.
+
+    The texts are looked up once: checking the memo and then calling
+    deck_texts() could miss the second time, after another request
+    evicted the movie, and load it with the sync ORM on the event loop.
+    """
+    refs = deck_refs(game_state)
+    texts = hints.memo.get(game_state['movie_id'], refs) if refs else []
+    if texts is None:
+        texts = rebuild_texts(await aload_game_movie(game_state['movie_id']), refs)
+    return with_saved_texts(game_state, texts)
+
+def rebuild_texts(movie, refs):
+    """The texts of refs, rebuilt from a movie from game_movies() and memoized"""
+    trivia_by_id = {trivia.id: trivia.trivia_fact for trivia in movie.trivia.all()}
+    texts = [hint_text(movie, ref, trivia_by_id) for ref in refs]
+    hints.memo.put(movie.id, refs, texts)
+    return texts
+
+def with_saved_texts(game_state, texts):
+    """The deck's texts in order, from the rebuilt texts of its references and the sentences of version 1 hints"""
+    texts = iter(texts)
+    return [hint['trivia_fact'] if isinstance(hint, dict) else next(texts) for hint in game_state['deck']]
+
+def hint_text(movie, ref, trivia_by_id):
+    """The sentence a hint reference stands for"""
+    kind, value = ref
+    if kind == hints.TRIVIA:
+        return trivia_by_id.get(value, MISSING_TRIVIA_FACT)
+    hint_type = hints.HINT_KINDS[kind]
+    templates = hint_templates(movie, hint_type)
+    if 0 <= value < len(templates):
+        return templates[value]
+    return FALLBACK_FACTS.get(hint_type, MISSING_TRIVIA_FACT)
+
+def revealed_hints(game_state, texts):
+    """The hints shown so far, oldest first, as {'trivia_fact', 'difficulty'} dicts, given the deck's texts"""
+    return [
+        {'trivia_fact': texts[position], 'difficulty': deck_difficulty(position)}
+        for position in game_state['shown']
+    ]
+
 def get_first_trivia(movie):
     """Get the first hard trivia for a movie"""
     # Try to get hard trivia from database first
-    hard_trivia = HardTrivia.objects.filter(movie=movie).first()
+    hard_trivia = trivia_of(movie, Trivia.HARD)
     if hard_trivia:
-        return TriviaResult(hard_trivia.trivia_fact, TriviaQuality.HIGH, "database")
+        return TriviaResult(hard_trivia[0].trivia_fact, TriviaQuality.HIGH, "database", [hints.TRIVIA, hard_trivia[0].id])
     
     # Fallback hard trivia options if no database entry
-    hard_fallbacks = [
-        "This film pushed the boundaries of what was possible in cinema.",
-        "The movie was groundbreaking for its time.",
-        "This film set new standards in filmmaking.",
-        "Known for its innovative approach to storytelling.",
-        "The film represents a milestone in cinema history."
-    ]
-    return TriviaResult(random.choice(hard_fallbacks), TriviaQuality.HIGH, "fallback")
+    hard_fallbacks = hint_templates(movie, 'first')
+    index = random.randrange(len(hard_fallbacks))
+    return TriviaResult(hard_fallbacks[index], TriviaQuality.HIGH, "fallback", [hints.HINT_KINDS.index('first'), index])
 
 def play_game(request, movie_id=None):
     """Start or continue a game session"""
     try:
         # Initialize new game if no existing game state
-        if 'game_state' not in request.session:
+        game_state = load_game_state(request)
+        if game_state is None:
             if not movie_id:
                 return redirect('choose_movie')
             
-            movie = get_object_or_404(Movie, pk=movie_id)
-            
-            # Get first hard trivia
-            first_trivia = get_first_trivia(movie)
-            
-            # Initialize game state with first trivia already shown
-            game_state = {
-                'movie_id': movie_id,
-                'attempts_left': 9,  # Start with 9 attempts
-                'used_trivia': [first_trivia.fact],
-                'revealed_trivia': [{
-                    'trivia_fact': first_trivia.fact,
-                    'difficulty': 'H'
-                }],
-                'won': False,
-                'game_over': False,
-                'first_trivia_shown': True  # Flag to track first trivia
-            }
-            
-            request.session['game_state'] = game_state
+            movie = load_game_movie(movie_id)
+            game_state = new_game_state(movie)
+            save_game_state(request, game_state, new=True)
+            remember_played(request.session, movie.id)
         else:
-            game_state = request.session['game_state']
             if not game_state or game_state.get('game_over', False):
                 return redirect('choose_movie')
 
-        return render(request, "trivia_game/play_game.html", {
-            'attempts_left': game_state['attempts_left'],
-            'revealed_trivia': game_state['revealed_trivia'],
-            'game_over': game_state.get('game_over', False),
-            'progress_percentage': int((game_state['attempts_left'] / 9) * 100)
-        })
+        texts = deck_texts(game_state) if game_state['shown'] else []
+        return play_page(request, game_state, texts)
         
     except Exception as e:
         print(f"Error in play_game: {str(e)}")
         return redirect('choose_movie')
 
-def generate_trivia(movie, num_guesses, used_trivia=None):
-    """Generate trivia based on number of guesses and movie data"""
-    if used_trivia is None:
-        used_trivia = []
+async def aplay_game(request, movie_id=None):
+    """play_game() for requests served over ASGI, through the async ORM, session and game store"""
+    try:
+        game_state = await aload_game_state(request)
+        if game_state is None:
+            if not movie_id:
+                return redirect('choose_movie')
 
-    # Define the strict order of trivia types
-    trivia_order = [
-        ('release_year', None, TriviaQuality.HIGH),           # 0: Release Year (Hard)
-        ('studio', None, TriviaQuality.HIGH),                 # 1: Studio (Hard)
-        ('medium_trivia', MediumTrivia, TriviaQuality.MEDIUM), # 2: Medium Trivia
-        ('production', None, TriviaQuality.MEDIUM),           # 3: Production Company
-        ('genre', None, TriviaQuality.MEDIUM),                # 4: Genre
-        ('easy_trivia', EasyTrivia, TriviaQuality.LOW),      # 5: Easy Trivia
-        ('actors', None, TriviaQuality.LOW),                  # 6: Actors
-        ('director', None, TriviaQuality.LOW),                # 7: Director (Last)
-    ]
+            movie = await aload_game_movie(movie_id)
+            game_state = new_game_state(movie)
+            await asave_game_state(request, game_state, new=True)
+            await aremember_played(request.session, movie.id)
+        elif game_state.get('game_over', False):
+            return redirect('choose_movie')
 
-    if num_guesses >= len(trivia_order):
-        return TriviaResult(
-            f"This is your last chance to guess the movie!",
-            TriviaQuality.LOW,
-            "final_hint"
-        )
+        texts = await adeck_texts(game_state) if game_state['shown'] else []
+        return play_page(request, game_state, texts)
 
-    trivia_type, model, quality = trivia_order[num_guesses]
+    except Exception as e:
+        print(f"Error in play_game: {str(e)}")
+        return redirect('choose_movie')
 
-    # Try database trivia first for the appropriate models
-    if model and model.objects.filter(movie=movie).exists():
-        available_trivia = model.objects.filter(
-            movie=movie
-        ).exclude(trivia_fact__in=used_trivia)
-        
-        if available_trivia.exists():
-            trivia = random.choice(list(available_trivia))
-            return TriviaResult(trivia.trivia_fact, quality, "database")
+def play_page(request, game_state, texts):
+    return render(request, "trivia_game/play_game.html", {
+        'attempts_left': game_state['attempts_left'],
+        'revealed_trivia': revealed_hints(game_state, texts),
+        'game_over': game_state.get('game_over', False),
+        'progress_percentage': int((game_state['attempts_left'] / 9) * 100)
+    })
 
-    # Generate dynamic trivia based on the strict order
-    if trivia_type == 'release_year':
+def hint_templates(movie, trivia_type):
+    """The candidate sentences for a generated hint of one type.
+
+    A hint stores only its type and the index of the sentence picked here,
+    so the order of each list must stay stable once games use it.
+    """
+    if trivia_type == 'first':
+        return [
+            "This film pushed the boundaries of what was possible in cinema.",
+            "The movie was groundbreaking for its time.",
+            "This film set new standards in filmmaking.",
+            "Known for its innovative approach to storytelling.",
+            "The film represents a milestone in cinema history."
+        ]
+
+    elif trivia_type == 'final':
+        return ["This is your last chance to guess the movie!"]
+
+    elif trivia_type == 'release_year':
         if movie.release_date:
-            facts = [
+            return [
                 f"Released in {movie.release_date}.",
                 f"Made its debut in {movie.release_date}.",
                 f"Hit theaters in {movie.release_date}."
             ]
-        else:
-            facts = [
-                "This film's release marked a significant moment in cinema.",
-                "The timing of this film's release was carefully chosen.",
-                "The release of this film was highly anticipated."
-            ]
+        return [
+            "This film's release marked a significant moment in cinema.",
+            "The timing of this film's release was carefully chosen.",
+            "The release of this film was highly anticipated."
+        ]
 
     elif trivia_type == 'studio':
         if movie.studio:
-            facts = [
+            return [
                 f"Brought to you by {movie.studio.name}.",
                 f"A {movie.studio.name} production.",
                 f"Created at {movie.studio.name} studios."
             ]
-        else:
-            facts = [
-                "This film was produced by a notable studio.",
-                "The studio behind this film is known for quality productions.",
-                "Made by a studio with a distinctive style."
-            ]
+        return [
+            "This film was produced by a notable studio.",
+            "The studio behind this film is known for quality productions.",
+            "Made by a studio with a distinctive style."
+        ]
 
     elif trivia_type == 'production':
-        production_companies = movie.production_companies.all()
-        if production_companies.exists():
-            company = production_companies.first()
-            facts = [
+        production_companies = list(movie.production_companies.all())
+        if production_companies:
+            company = production_companies[0]
+            return [
                 f"Produced by {company.name}.",
                 f"A {company.name} production.",
                 f"Made under the {company.name} banner."
             ]
-        else:
-            facts = [
-                "The production of this film was a significant undertaking.",
-                "Created through a unique production process.",
-                "This production brought together various talented teams."
-            ]
+        return [
+            "The production of this film was a significant undertaking.",
+            "Created through a unique production process.",
+            "This production brought together various talented teams."
+        ]
 
     elif trivia_type == 'genre':
         if movie.genre:
-            facts = [
+            return [
                 f"This is a {movie.genre} movie.",
                 f"Falls into the {movie.genre} category.",
                 f"A prime example of the {movie.genre} genre."
             ]
-        else:
-            facts = [
-                "This film defies traditional genre classifications.",
-                "Known for its unique blend of styles.",
-                "Creates its own category in filmmaking."
-            ]
+        return [
+            "This film defies traditional genre classifications.",
+            "Known for its unique blend of styles.",
+            "Creates its own category in filmmaking."
+        ]
 
     elif trivia_type == 'actors':
-        actors = movie.actors.all()
-        if actors.exists():
+        actors = list(movie.actors.all())
+        if actors:
             actor_names = [actor.name for actor in actors[:2]]
-            facts = [
+            return [
                 f"Stars {', '.join(actor_names)}.",
                 f"Features performances by {', '.join(actor_names)}.",
                 f"Showcases the talents of {', '.join(actor_names)}."
             ]
-        else:
-            facts = [
-                "Features memorable performances from its cast.",
-                "The cast brings unique energy to their roles.",
-                "Known for its powerful acting performances."
-            ]
+        return [
+            "Features memorable performances from its cast.",
+            "The cast brings unique energy to their roles.",
+            "Known for its powerful acting performances."
+        ]
 
     elif trivia_type == 'director':
         if movie.director:
-            facts = [
+            return [
                 f"Directed by {movie.director.name}.",
                 f"A film from director {movie.director.name}.",
                 f"Helmed by {movie.director.name}."
             ]
-        else:
-            facts = [
-                "Directed with a distinctive visual style.",
-                "The director's vision shines through in every scene.",
-                "Shows masterful direction throughout."
-            ]
+        return [
+            "Directed with a distinctive visual style.",
+            "The director's vision shines through in every scene.",
+            "Shows masterful direction throughout."
+        ]
 
-    else:  # Fallback for medium/easy trivia when no database entries exist
-        quality_facts = {
-            TriviaQuality.MEDIUM: [
-                "The production involved several unique creative choices.",
-                "Notable for its distinctive artistic approach.",
-                "Created with attention to every detail."
-            ],
-            TriviaQuality.LOW: [
-                "This film tells a compelling story.",
-                "Known for its memorable moments.",
-                "A noteworthy addition to cinema."
-            ]
-        }
-        facts = quality_facts[quality]
+    elif trivia_type == 'medium_trivia':  # Fallback when no medium database trivia exists
+        return [
+            "The production involved several unique creative choices.",
+            "Notable for its distinctive artistic approach.",
+            "Created with attention to every detail."
+        ]
+
+    else:  # Fallback when no easy database trivia exists
+        return [
+            "This film tells a compelling story.",
+            "Known for its memorable moments.",
+            "A noteworthy addition to cinema."
+        ]
+
+def generate_trivia(movie, num_guesses, used_trivia=None):
+    """Generate trivia based on number of guesses and movie data"""
+    if used_trivia is None:
+        used_trivia = []
+
+    # Define the strict order of trivia types
+    # (difficulty of the database trivia to use, None for generated facts)
+    trivia_order = [
+        ('release_year', None, TriviaQuality.HIGH),           # 0: Release Year (Hard)
+        ('studio', None, TriviaQuality.HIGH),                 # 1: Studio (Hard)
+        ('medium_trivia', Trivia.MEDIUM, TriviaQuality.MEDIUM), # 2: Medium Trivia
+        ('production', None, TriviaQuality.MEDIUM),           # 3: Production Company
+        ('genre', None, TriviaQuality.MEDIUM),                # 4: Genre
+        ('easy_trivia', Trivia.EASY, TriviaQuality.LOW),     # 5: Easy Trivia
+        ('actors', None, TriviaQuality.LOW),                  # 6: Actors
+        ('director', None, TriviaQuality.LOW),                # 7: Director (Last)
+    ]
+
+    if num_guesses >= len(trivia_order):
+        return TriviaResult(
+            hint_templates(movie, 'final')[0],
+            TriviaQuality.LOW,
+            "final_hint",
+            [hints.HINT_KINDS.index('final'), 0]
+        )
+
+    trivia_type, difficulty, quality = trivia_order[num_guesses]
+    kind = hints.HINT_KINDS.index(trivia_type)
+
+    # Try database trivia first for the appropriate difficulties
+    # (reads from the prefetch cache when the movie came from load_game_movie)
+    if difficulty:
+        available_trivia = [
+            trivia for trivia in trivia_of(movie, difficulty)
+            if trivia.trivia_fact not in used_trivia
+        ]
+        
+        if available_trivia:
+            trivia = random.choice(available_trivia)
+            return TriviaResult(trivia.trivia_fact, quality, "database", [hints.TRIVIA, trivia.id])
+
+    # Generate dynamic trivia based on the strict order
+    facts = hint_templates(movie, trivia_type)
 
     # Filter out used facts
-    unused_facts = [f for f in facts if f not in used_trivia]
-    if unused_facts:
-        return TriviaResult(random.choice(unused_facts), quality, f"{trivia_type}_dynamic")
+    unused = [index for index, fact in enumerate(facts) if fact not in used_trivia]
+    if unused:
+        index = random.choice(unused)
+        return TriviaResult(facts[index], quality, f"{trivia_type}_dynamic", [kind, index])
 
     # Ultimate fallback specific to the trivia type
-    fallback_facts = {
-        'release_year': "The release timing was significant.",
-        'studio': "Created by a notable production house.",
-        'medium_trivia': "The production process was unique.",
-        'production': "Produced with great attention to detail.",
-        'genre': "Represents its genre in a unique way.",
-        'easy_trivia': "Has left its mark on cinema.",
-        'actors': "Features memorable performances.",
-        'director': "Shows strong directorial vision."
-    }
-
     return TriviaResult(
-        fallback_facts[trivia_type],
+        FALLBACK_FACTS[trivia_type],
         quality,
-        f"{trivia_type}_fallback"
+        f"{trivia_type}_fallback",
+        [kind, hints.FALLBACK]
     )
 
 @require_POST
 def make_guess(request):
     """Handle a movie guess"""
     try:
-        game_state = request.session.get('game_state')
+        game_state = load_game_state(request)
         if not game_state:
             return JsonResponse({'error': 'No active game'}, status=400)
 
@@ -555,78 +1017,85 @@ def make_guess(request):
         if not guess:
             return JsonResponse({'error': 'No guess provided'}, status=400)
 
-        movie = get_object_or_404(Movie, pk=game_state['movie_id'])
-        is_correct = guess.lower() == movie.title.lower()
-        
-        if is_correct:
-            game_state['won'] = True
-            game_state['score'] = calculate_score(movie, 9 - game_state['attempts_left'])
-            request.session.modified = True
-            return JsonResponse({
-                'correct': True,
-                'message': f'Congratulations! You correctly guessed the movie: {movie.title}',
-                'movie_title': movie.title,
-                'score': game_state['score']
-            })
-        
-        # Handle incorrect guess
-        game_state['attempts_left'] -= 1
-        
-        # Check if game is over due to no more attempts
-        if game_state['attempts_left'] <= 0:
-            game_state['won'] = False
-            game_state['score'] = 0
-            request.session.modified = True
-            return JsonResponse({
-                'correct': False,
-                'game_over': True,
-                'movie_title': movie.title,
-                'attempts_left': 0,
-                'message': f'Game Over! The movie was: {movie.title}'
-            })
-        
-        # Calculate num_guesses (0-7, since first trivia was shown immediately)
-        num_guesses = 8 - game_state['attempts_left']
-        
-        # Generate new trivia
-        trivia_result = generate_trivia(movie, num_guesses, game_state.get('used_trivia', []))
-        
-        # Update used_trivia
-        if 'used_trivia' not in game_state:
-            game_state['used_trivia'] = []
-        game_state['used_trivia'].append(trivia_result.fact)
-        
-        # Update revealed_trivia with correct difficulty
-        if 'revealed_trivia' not in game_state:
-            game_state['revealed_trivia'] = []
-            
-        # Determine difficulty based on num_guesses
-        if num_guesses < 2:  # First 2 guesses - Hard
-            difficulty = 'H'
-        elif num_guesses < 5:  # Next 3 guesses - Medium
-            difficulty = 'M'
-        else:  # Last 3 guesses - Easy
-            difficulty = 'E'
-            
-        game_state['revealed_trivia'].append({
-            'trivia_fact': trivia_result.fact,
-            'difficulty': difficulty
-        })
-        request.session.modified = True
-        
-        return JsonResponse({
-            'correct': False,
-            'attempts_left': game_state['attempts_left'],
-            'new_trivia': trivia_result.fact
-        })
+        movie = get_object_or_404(Movie.objects.only('id', 'title'), pk=game_state['movie_id'])
+        reply, position = score_guess(game_state, movie, guess_matches(guess, movie))
+        save_game_state(request, game_state)
+        if position is not None:
+            reply['new_trivia'] = deck_texts(game_state)[position]
+        return JsonResponse(reply)
         
     except Exception as e:
         print(f"Error in make_guess: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
 
+@require_POST
+async def amake_guess(request):
+    """make_guess() for requests served over ASGI, through the async ORM, session and game store"""
+    try:
+        game_state = await aload_game_state(request)
+        if not game_state:
+            return JsonResponse({'error': 'No active game'}, status=400)
+
+        guess = request.POST.get('guess', '').strip()
+        if not guess:
+            return JsonResponse({'error': 'No guess provided'}, status=400)
+
+        movie = await aget_object_or_404(Movie.objects.only('id', 'title'), pk=game_state['movie_id'])
+        reply, position = score_guess(game_state, movie, await aguess_matches(guess, movie))
+        await asave_game_state(request, game_state)
+        if position is not None:
+            reply['new_trivia'] = (await adeck_texts(game_state))[position]
+        return JsonResponse(reply)
+
+    except Exception as e:
+        print(f"Error in make_guess: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+def score_guess(game_state, movie, is_correct):
+    """Apply a guess to the game state.
+
+    Returns the JSON reply and, after a wrong guess that leaves attempts,
+    the deck position of the hint it reveals (None otherwise).
+    """
+    if is_correct:
+        game_state['won'] = True
+        game_state['score'] = calculate_score(movie, 9 - game_state['attempts_left'])
+        return {
+            'correct': True,
+            'message': f'Congratulations! You correctly guessed the movie: {movie.title}',
+            'movie_title': movie.title,
+            'score': game_state['score']
+        }, None
+
+    # Handle incorrect guess
+    game_state['attempts_left'] -= 1
+
+    # Check if game is over due to no more attempts
+    if game_state['attempts_left'] <= 0:
+        game_state['won'] = False
+        game_state['score'] = 0
+        return {
+            'correct': False,
+            'game_over': True,
+            'movie_title': movie.title,
+            'attempts_left': 0,
+            'message': f'Game Over! The movie was: {movie.title}'
+        }, None
+
+    # Calculate num_guesses (0-7, since first trivia was shown immediately)
+    num_guesses = 8 - game_state['attempts_left']
+
+    # Reveal the next hint from the deck built when the game started
+    position = num_guesses + 1
+    game_state['shown'].append(position)
+    return {
+        'correct': False,
+        'attempts_left': game_state['attempts_left'],
+    }, position
+
 def game_over(request):
     """Show game results and option to start new game"""
-    game_state = request.session.get('game_state', {})
+    game_state = load_game_state(request) or {}
     
     # If no game state or game not over, redirect to choose movie
     if not game_state:
@@ -642,8 +1111,7 @@ def game_over(request):
     }
     
     # Clear game state after showing results
-    if 'game_state' in request.session:
-        del request.session['game_state']
+    clear_game_state(request)
     
     return render(request, "trivia_game/game_over.html", context)
 